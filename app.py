@@ -3,8 +3,10 @@ import streamlit as st
 
 from utils import db_handler as db
 from utils import github_handler as gh
+from utils import record_queue as rq
 
 from services.state_service import ensure_state
+from services.warmup_service import get_bank_warmup
 from services.auth_service import require_login_or_render
 from components.auth_ui import render_user_panel
 
@@ -18,6 +20,10 @@ def _init_once():
     db.init_db()
     # 指標前綴修正（只做一次）
     gh.migrate_pointer_prefix_if_needed()
+    # 成績寫入佇列 worker（順便把上次未寫入的 spool 補寫）
+    rq.get_record_queue()
+    # 題庫預熱（背景 thread，不阻塞第一次頁面載入）
+    get_bank_warmup()
     return True
 
 
@@ -0,0 +1,254 @@
+"""
+clean_and_normalize_df 向量化版本 vs 舊版 (逐列 apply) 的一致性檢查
+
+用法：
+    python check/check_normalize_parity.py
+
+會逐一讀取 bank/ 與 sorting/ 底下所有 .xlsx 的每個工作表，
+分別丟給舊版與新版清洗函式，比對輸出（含欄位型別）是否完全相同；
+另外也跑幾組人工構造的邊界案例（星號答案、括號答案、缺答案欄等）。
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_loader import clean_and_normalize_df
+
+ROOTS = ["bank", "sorting"]
+
+
+# ==============================================================================
+# 舊版清洗函式 (逐列 apply，原封不動保留作為比對基準)
+# ==============================================================================
+def legacy_clean_and_normalize_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    通用資料清洗函式 (V6 最終強化版)
+    修正：答案欄位強力轉型 (處理 (2), 2.0, B 等雜訊)、補強題目映射
+    """
+    if df is None or df.empty:
+        return df
+
+    # 複製以免影響原始資料
+    df = df.copy()
+
+    try:
+        # 1. 清洗欄位名稱 (去除前後空白、換行)
+        df.columns = [str(c).strip().replace("\n", "").replace(" ", "") for c in df.columns]
+
+        # 2. 統一 ID 欄位
+        if "ID" not in df.columns:
+            for c in ["編號", "題目編號", "題號", "qp_id"]:
+                if c in df.columns:
+                    df.rename(columns={c: "ID"}, inplace=True)
+                    break
+            if "ID" not in df.columns:
+                df["ID"] = range(1, len(df) + 1)
+
+        # 3. 統一 題目 (Question) 欄位
+        if "Question" not in df.columns:
+            for c in ["題目", "題幹", "題目內容", "qp_title", "問題"]:
+                if c in df.columns:
+                    df.rename(columns={c: "Question"}, inplace=True)
+                    break
+
+        # 4. 統一 圖片 (Image) 欄位
+        if "Image" not in df.columns:
+            for c in ["圖片", "圖檔"]:
+                if c in df.columns:
+                    df.rename(columns={c: "Image"}, inplace=True)
+                    break
+
+        # 定義選項映射表 (Label -> 可能的欄位名)
+        option_map_config = [
+            ('A', ['選項一', '選項1', 'OptionA', 'A', 'qp_a1', '答案選項1']),
+            ('B', ['選項二', '選項2', 'OptionB', 'B', 'qp_a2', '答案選項2']),
+            ('C', ['選項三', '選項3', 'OptionC', 'C', 'qp_a3', '答案選項3']),
+            ('D', ['選項四', '選項4', 'OptionD', 'D', 'qp_a4', '答案選項4']),
+            ('E', ['選項五', '選項5', 'OptionE', 'E', 'qp_a5', '答案選項5'])
+        ]
+
+        # 5. 處理正確答案 (Answer) - 混合策略
+        
+        # 5a. 尋找答案欄位
+        ans_col = None
+        for c in ["Answer", "正確選項", "答案", "標準答案", "qp_right", "CorrectAnswer"]:
+            if c in df.columns:
+                ans_col = c
+                break
+        
+        if ans_col:
+            def normalize_answer(val):
+                # 強力標準化：轉字串 -> 去空白 -> 轉大寫
+                s = str(val).strip().upper()
+                # 去除括號 (A) -> A, (1) -> 1
+                s = s.replace("(", "").replace(")", "").replace("（", "").replace("）", "")
+                # 去除小數點 1.0 -> 1
+                if s.endswith(".0"): s = s[:-2]
+                
+                # 映射表
+                mapping = {
+                    '1': 'A', '2': 'B', '3': 'C', '4': 'D', '5': 'E',
+                    '一': 'A', '二': 'B', '三': 'C', '四': 'D', '五': 'E'
+                }
+                # 如果是數字鍵則轉換，否則保留原樣 (如 'A', 'AB')
+                return mapping.get(s, s)
+            
+            df["Answer"] = df[ans_col].apply(normalize_answer)
+        else:
+            df["Answer"] = ""
+
+        # 5b. 掃描選項中的星號 (補強：若答案欄為空或無效，再次掃描選項)
+        def extract_star_answer(row):
+            # 檢查現有答案是否有效 (必須是 A-E 或是組合)
+            current_ans = str(row.get("Answer", "")).strip()
+            # 簡單判斷：如果有內容且不是 nan，就信任它
+            if current_ans and current_ans.lower() != "nan":
+                return current_ans
+            
+            # 否則掃描選項找星號
+            stars = []
+            for label, possible_cols in option_map_config:
+                for col in possible_cols:
+                    if col in row and pd.notna(row[col]):
+                        txt = str(row[col]).strip()
+                        # 支援全形與半形星號
+                        if txt.startswith("*") or txt.startswith("＊"):
+                            stars.append(label)
+            return "".join(stars)
+
+        df["Answer"] = df.apply(extract_star_answer, axis=1)
+
+        # 5c. 移除選項文字中的星號 (保持介面乾淨)
+        all_opt_cols = [col for _, cols in option_map_config for col in cols]
+        for c in all_opt_cols:
+            if c in df.columns:
+                df[c] = df[c].apply(lambda x: str(x).lstrip('*').lstrip('＊').strip() if pd.notna(x) else x)
+
+        # 6. 強力打包選項 (Choices)
+        if "Choices" not in df.columns:
+            def universal_pack(row):
+                choices = []
+                for label, possible_cols in option_map_config:
+                    found_text = None
+                    for col in possible_cols:
+                        if col in row and pd.notna(row[col]):
+                            val = str(row[col]).strip()
+                            if val and val.lower() != "nan":
+                                found_text = val
+                                break 
+                    if found_text:
+                        choices.append((label, found_text))
+                return choices
+
+            df["Choices"] = df.apply(universal_pack, axis=1)
+
+        # 7. 處理詳解
+        if "Explanation" not in df.columns:
+            for c in ["解答說明", "解析", "詳解", "qp_explain"]:
+                if c in df.columns:
+                    df["Explanation"] = df[c]
+                    break
+        
+        # 8. 處理題型 (Type)
+        if "Type" not in df.columns:
+            if "題型" in df.columns:
+                df["Type"] = df["題型"]
+            else:
+                df["Type"] = df["Answer"].apply(lambda x: "MC" if len(str(x)) > 1 else "SC")
+
+        # 9. 處理標籤 (Tag)
+        if "Tag" not in df.columns:
+            for c in ["章節", "分類", "科目", "AI分類章節", "qp_ch"]:
+                if c in df.columns:
+                    df["Tag"] = df[c]
+                    break
+
+        return df
+
+    except Exception as e:
+        print(f"資料格式清洗失敗 (legacy)：{e}")
+        return pd.DataFrame()
+
+
+# ==============================================================================
+# 比對
+# ==============================================================================
+def _compare(label, raw):
+    expected = legacy_clean_and_normalize_df(raw)
+    actual = clean_and_normalize_df(raw)
+    try:
+        pd.testing.assert_frame_equal(actual, expected)
+        return True
+    except AssertionError as e:
+        print(f"❌ {label}\n   {str(e).splitlines()[0]}")
+        return False
+
+
+def _synthetic_cases():
+    nan = np.nan
+    return {
+        "星號答案 (無答案欄)": pd.DataFrame({
+            "題目": ["q1", "q2", "q3"],
+            "選項一": ["*甲", "甲", "＊甲"],
+            "選項二": ["乙", "* 乙", nan],
+            "選項三": ["丙", "*丙", "丙"],
+        }),
+        "答案雜訊 (括號 / 小數 / 國字)": pd.DataFrame({
+            "題幹": ["q1", "q2", "q3", "q4", "q5"],
+            "答案": ["(2)", 3.0, "（A）", "二", " ab "],
+            "A": ["a", "a", "a", "a", "a"],
+            "B": ["b", "b", "b", "b", "b"],
+        }),
+        "答案欄部分空白 -> 改掃星號": pd.DataFrame({
+            "題目": ["q1", "q2"],
+            "正確選項": [nan, 1],
+            "選項1": ["x", "*y"],
+            "選項2": ["*z", "w"],
+        }),
+        "欄名含空白換行 / 數值選項": pd.DataFrame({
+            " 題 目 ": ["q1", "q2"],
+            "選項\n一": [100, 200],
+            "選項二": [1.5, nan],
+            "qp_right": ["1", "2"],
+        }),
+        "重複別名欄位": pd.DataFrame({
+            "題目": ["q1"],
+            "選項一": ["*甲"],
+            "A": ["*甲2"],
+            "選項二": ["乙"],
+        }),
+    }
+
+
+def main():
+    ok = bad = 0
+
+    print("=== 人工邊界案例 ===")
+    for name, raw in _synthetic_cases().items():
+        if _compare(name, raw):
+            ok += 1
+        else:
+            bad += 1
+
+    print("=== 題庫檔案 ===")
+    for root in ROOTS:
+        for dirpath, _, files in os.walk(root):
+            for f in sorted(files):
+                if not f.lower().endswith(".xlsx") or f.startswith("~$"):
+                    continue
+                path = os.path.join(dirpath, f)
+                for sh, raw in pd.read_excel(path, sheet_name=None).items():
+                    if _compare(f"{path} [{sh}]", raw):
+                        ok += 1
+                    else:
+                        bad += 1
+
+    print(f"\n=== 檢查結束：一致 {ok}、不一致 {bad} ===")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import json
 import re
 import streamlit as st
 import pandas as pd
+from utils import db_handler as db
 
 
 def _format_bank_type(s: str) -> str:
@@ -66,6 +67,20 @@ def _parse_wrong_log(wrong_log):
     return []
 
 
+def _load_wrong_items(row) -> list:
+    """
+    錯題只在選取某一列時才讀取：
+    - 列表查詢不再帶 wrong_log，依 record id 從 exam_wrong_answers 讀
+    - 呼叫端若自行帶了 wrong_log（舊資料），就直接用
+    """
+    if row.get("wrong_log") is not None:
+        return _parse_wrong_log(row.get("wrong_log"))
+    rid = row.get("id")
+    if rid is None or pd.isna(rid):
+        return []
+    return db.get_record_wrong_items(int(rid))
+
+
 def _ensure_list(v):
     """把可能的 JSON 字串轉回 list"""
     if v is None:
@@ -211,7 +226,7 @@ def render_history(history_df: pd.DataFrame):
         st.info("請在上方表格點選一筆紀錄以查看詳情。")
         return
 
-    # 取得原始資料列 (包含 wrong_log, fail_reason 等原始資料)
+    # 取得原始資料列 (fail_reason 等原始資料；錯題另外讀取)
     row = df.iloc[selected_idx]
     
     # --- 1. 考試結果詳情 (New!) ---
@@ -253,7 +268,7 @@ def render_history(history_df: pd.DataFrame):
 
     # --- 2. 錯題檢討 (保留原有邏輯) ---
     st.subheader("❌ 錯題檢討")
-    wrong_items = _parse_wrong_log(row.get("wrong_log"))
+    wrong_items = _load_wrong_items(row)
 
     if not wrong_items:
         st.success("🎉 太棒了！本次作答沒有錯題。")
@@ -1,7 +1,6 @@
 import time
 import pandas as pd
 import streamlit as st
-import json
 from io import BytesIO
 
 # 引入模組
@@ -51,7 +50,11 @@ def login_page():
             emp_id = st.text_input("員工編號 / 業務代碼")
             password = st.text_input("密碼", type="password")
             if st.form_submit_button("登入", type="primary"):
-                user = db.login_user(emp_id, password)
+                try:
+                    user = db.login_user(emp_id, password)
+                except db.auth.LoginLocked as e:
+                    st.error(str(e))
+                    st.stop()
                 if user:
                     st.session_state.user_info = user
                     st.toast(f"歡迎回來，{user['name']}！")
@@ -424,9 +427,7 @@ else:
                 st.info(f"您正在檢視：{selected_record['exam_date']} 的錯題紀錄")
                 
                 try:
-                    wrong_log_str = selected_record.get("wrong_log", "[]")
-                    if not wrong_log_str: wrong_log_str = "[]"
-                    wrong_data = json.loads(wrong_log_str)
+                    wrong_data = db.get_record_wrong_items(int(selected_record["id"]))
                     
                     if wrong_data:
                         st.markdown("### ❌ 錯題檢討卡片")
@@ -39,11 +39,24 @@ with st.sidebar:
     base_settings = render_exam_settings(mode="practice")
     
     # 載入與清洗資料
+    load_timings = []
     raw_df = load_bank_df(
         base_settings["bank_type"],
         base_settings["merge_all"],
         base_settings["bank_source"],
+        timings=load_timings,
     )
+
+    if load_timings:
+        with st.expander("⏱️ 題庫載入耗時", expanded=False):
+            st.dataframe(
+                pd.DataFrame(load_timings).rename(columns={
+                    "path": "檔案", "source": "來源", "download_sec": "下載(秒)",
+                    "parse_sec": "解析(秒)", "rows": "題數",
+                }),
+                hide_index=True,
+                use_container_width=True,
+            )
     
     try:
         if raw_df is not None and not raw_df.empty:
@@ -7,11 +7,13 @@ import re
 from services.state_service import ensure_state
 from services.auth_service import require_login_or_render
 from services.bank_service import load_bank_df
-from services.exam_service import grade_paper, persist_exam_record
+from services.exam_service import grade_paper, persist_exam_record, evaluate_mock_result
 from services.exam_rules import CERT_CATALOG
 from components.auth_ui import render_user_panel
 from components.sidebar_exam_settings import render_exam_settings
 from components.question_render import render_question
+from services import mock_session_service as mock_session
+from utils import answer_bits as ab
 
 # ==========================================
 # 🟢 設定區
@@ -184,6 +186,9 @@ if not sections:
     st.error("此證照類別沒有設定模擬考規則（MOCK_SPECS）。")
     st.stop()
 
+# 重新連線 / worker 重啟：還原尚未完成的模擬考進度
+mock_session.restore(user["emp_id"], settings.get("cert_type"))
+
 if "mock_section_idx" not in st.session_state: st.session_state.mock_section_idx = 0
 if "mock_section_results" not in st.session_state: st.session_state.mock_section_results = []
 if "mock_exam_start_ts" not in st.session_state: st.session_state.mock_exam_start_ts = None
@@ -216,72 +221,6 @@ if df is None or df.empty:
     st.warning("尚未載入題庫，請確認題庫檔案是否存在。")
     st.stop()
 
-# ==========================================
-# 🚑 HOTFIX V4: 終極全能資料清洗補丁 (The Universal Cleaner)
-# ==========================================
-try:
-    df.columns = df.columns.str.strip()
-
-    if "ID" not in df.columns:
-        if "編號" in df.columns: df["ID"] = df["編號"]
-        elif "題目編號" in df.columns: df["ID"] = df["題目編號"]
-        else: df["ID"] = range(1, len(df) + 1)
-
-    option_map_config = [
-        ('A', ['選項一', '選項1', 'Option A', 'A']),
-        ('B', ['選項二', '選項2', 'Option B', 'B']),
-        ('C', ['選項三', '選項3', 'Option C', 'C']),
-        ('D', ['選項四', '選項4', 'Option D', 'D']),
-        ('E', ['選項五', '選項5', 'Option E', 'E'])
-    ]
-
-    if "Answer" not in df.columns:
-        if "正確選項" in df.columns:
-            def normalize_answer(val):
-                val_str = str(val).strip()
-                mapping = {'1': 'A', '2': 'B', '3': 'C', '4': 'D', '5': 'E'}
-                return mapping.get(val_str, val_str)
-            df["Answer"] = df["正確選項"].apply(normalize_answer)
-        else:
-            def extract_star_answer(row):
-                for label, possible_cols in option_map_config:
-                    for col in possible_cols:
-                        if col in row and pd.notna(row[col]):
-                            if str(row[col]).strip().startswith("*"):
-                                return label
-                return ""
-            df["Answer"] = df.apply(extract_star_answer, axis=1)
-
-            all_opt_cols = [col for _, cols in option_map_config for col in cols]
-            for c in all_opt_cols:
-                if c in df.columns:
-                    df[c] = df[c].apply(lambda x: str(x).lstrip('*') if pd.notna(x) else x)
-
-    if "Choices" not in df.columns:
-        def universal_pack(row):
-            choices = []
-            for label, possible_cols in option_map_config:
-                found_text = None
-                for col in possible_cols:
-                    if col in row and pd.notna(row[col]):
-                        val = str(row[col]).strip()
-                        if val and val.lower() != "nan":
-                            found_text = val
-                            break
-                if found_text: choices.append((label, found_text))
-            return choices
-        df["Choices"] = df.apply(universal_pack, axis=1)
-
-    if "Explanation" not in df.columns and "解答說明" in df.columns:
-        df["Explanation"] = df["解答說明"]
-
-except Exception as e:
-    st.error(f"資料格式轉換失敗：{e}")
-    st.stop()
-# ==========================================
-# 🚑 補丁結束
-# ==========================================
-
 st.session_state.df = df
 filtered = df
 exam_label = f"{settings.get('cert_type')}｜模擬考"
@@ -313,7 +252,8 @@ st.subheader(f"第 {sec_idx+1} 節：{section_name}")
 colA, colB = st.columns([1, 1])
 
 def _reset_whole_mock_exam():
-    for k in ["paper", "answers", "started", "show_results", "saved_to_db", "start_ts", "time_limit"]:
+    mock_session.clear(user["emp_id"], settings.get("cert_type"))
+    for k in ["paper", "mock_paper_ids", "answers", "started", "show_results", "saved_to_db", "start_ts", "time_limit"]:
         if k in st.session_state: del st.session_state[k]
     st.session_state.mock_section_idx = 0
     st.session_state.mock_section_results = []
@@ -324,14 +264,17 @@ def _reset_whole_mock_exam():
 with colA:
     if st.button("開始本節", type="primary"):
         # 🛠️ 這裡也加上了防呆 .get()
-        st.session_state.paper = build_weighted_paper_v2(
+        new_paper = build_weighted_paper_v2(
             filtered,
             settings.get("cert_type"),
             section_name,
             n_questions,
             shuffle_options=settings.get("shuffle_options", False) # ✅ 防呆修正
         )
+        # session 只保留題目 key（題庫檔 + 工作表 + ID），題目內容每次由題庫依 key 取出
+        st.session_state.mock_paper_ids = [mock_session.qkey(q) for q in new_paper]
         st.session_state.answers = {}
+        mock_session.start_section_clock()
         st.session_state.started = True
         st.session_state.show_results = False
         st.session_state.saved_to_db = False
@@ -339,6 +282,7 @@ with colA:
         if st.session_state.mock_exam_start_ts is None:
             st.session_state.mock_exam_start_ts = st.session_state.start_ts
         st.session_state.time_limit = time_limit_sec
+        mock_session.persist(user["emp_id"], settings.get("cert_type"), force=True)
         st.rerun()
 
 with colB:
@@ -346,11 +290,19 @@ with colB:
         _reset_whole_mock_exam()
         st.rerun()
 
-paper = st.session_state.get("paper")
+paper, missing = mock_session.paper_from_ids(filtered, st.session_state.get("mock_paper_ids"))
+if missing:
+    st.warning(
+        f"⚠️ 題庫在考試期間已更新，有 {len(missing)} 題無法還原（不列入本節計分）："
+        + mock_session.describe_missing(missing)
+    )
 if not paper:
     st.info("請先按「開始本節」。")
     st.stop()
 
+answer_key_fmt = f"mock_s{sec_idx}_ans_{{}}"
+mock_session.restore_widget_answers(paper, st.session_state.answers, answer_key_fmt)
+
 if st.session_state.get("time_limit") and st.session_state.get("start_ts"):
     elapsed = int(time.time() - st.session_state.start_ts)
     remain = max(0, st.session_state.time_limit - elapsed)
@@ -364,15 +316,19 @@ if st.session_state.get("time_limit") and st.session_state.get("start_ts"):
 
 if not st.session_state.get("show_results"):
     st.subheader("作答區")
+    picks = {}
     for idx, q in enumerate(paper, start=1):
         with st.expander(f"第 {idx} 題", expanded=(idx == 1)):
             # 顯示題目，加上 .get() 防呆
             picked = render_question(
                 q,
                 show_image=settings.get("show_image", False), 
-                answer_key=f"mock_s{sec_idx}_ans_{q['ID']}"
+                answer_key=answer_key_fmt.format(q["Key"])
             )
-            st.session_state.answers[q["ID"]] = picked
+            picks[q["Key"]] = ab.labels_to_mask(picked)
+
+    # 只把有變動的題目交給背景 autosave（每幾秒最多寫一次）
+    mock_session.autosave(user["emp_id"], settings.get("cert_type"), sec_idx, picks)
 
     if st.button("交卷（本節）", type="primary"):
         st.session_state.show_results = True
@@ -388,8 +344,11 @@ st.session_state.mock_section_results.append({
     "score": int(score),
     "correct": int(correct),
     "total": int(total),
-    "results_df": results_df,
-    "wrong_df": wrong_df,
+    # 只留題目 key 與作答；交卷後的完整結果再依題庫重建
+    "bank_path": bank_path,
+    "paper_ids": [q["Key"] for q in paper],
+    "answers": dict(st.session_state.answers),
+    "dwell_ms": dict(st.session_state.get("mock_dwell_ms") or {}),
 })
 
 st.session_state.mock_section_idx += 1
@@ -397,37 +356,31 @@ st.session_state.mock_section_idx += 1
 if st.session_state.mock_section_idx < len(sections):
     st.success(f"已完成第 {sec_idx+1} 節：{section_name}（{score} 分）。")
     st.session_state.paper = None
+    st.session_state.mock_paper_ids = []
     st.session_state.answers = {}
     st.session_state.started = False
     st.session_state.show_results = False
     st.session_state.saved_to_db = False
     st.session_state.start_ts = None
     st.session_state.time_limit = None
+    mock_session.persist(user["emp_id"], settings.get("cert_type"), force=True)
     if st.button("前往下一節", type="primary"): st.rerun()
     st.stop()
 
 section_results = st.session_state.mock_section_results
 section_scores = {s["section"]: int(s["score"]) for s in section_results}
-total_score = int(sum(s["score"] for s in section_results))
-min_each = int(min(s["score"] for s in section_results)) if section_results else 0
-
-passed = True
-fail_reason = None
-if spec.get("mode") == "single":
-    pass_score = int(spec.get("pass_score", 0))
-    passed = total_score >= pass_score
-    if not passed: fail_reason = "分數未達及格標準"
-else:
-    pass_total = int(spec.get("pass_total", 0))
-    pass_min_each = int(spec.get("pass_min_each", 0))
-    passed = (total_score >= pass_total) and (min_each >= pass_min_each)
-    if not passed:
-        if total_score < pass_total: fail_reason = "總分不足"
-        elif min_each < pass_min_each: fail_reason = "單科未達最低標準"
+total_score, passed, fail_reason = evaluate_mock_result(spec, section_scores)
 
 passed_db = 1 if passed else 0
-all_wrong_df = pd.concat([s["wrong_df"] for s in section_results], ignore_index=True) if section_results else pd.DataFrame()
-all_results_df = pd.concat([s["results_df"] for s in section_results], ignore_index=True) if section_results else pd.DataFrame()
+frames = [mock_session.section_frames(settings.get("cert_type"), s) for s in section_results]
+for s, (_, _, missing) in zip(section_results, frames):
+    if missing:
+        st.warning(
+            f"⚠️ {s['section']}：題庫已更新，{len(missing)} 題無法重建作答明細（分數仍以交卷時為準）："
+            + mock_session.describe_missing(missing)
+        )
+all_wrong_df = pd.concat([w for _, w, _ in frames], ignore_index=True) if frames else pd.DataFrame()
+all_results_df = pd.concat([r for r, _, _ in frames], ignore_index=True) if frames else pd.DataFrame()
 
 st.session_state.mock_summary = {
     "cert_type": settings.get("cert_type"),
@@ -453,11 +406,13 @@ if not st.session_state.get("saved_to_db") and st.session_state.get("mock_exam_s
             section_scores=section_scores, total_score=total_score, passed=passed_db, fail_reason=fail_reason
         )
         st.session_state.saved_to_db = True
+        mock_session.clear(user["emp_id"], settings.get("cert_type"))
     except Exception as e:
         st.error(f"寫入成績失敗：{e}")
         st.stop()
 
 st.session_state.paper = None
+st.session_state.mock_paper_ids = []
 st.session_state.answers = {}
 st.session_state.started = False
 st.session_state.show_results = False
@@ -1,9 +1,20 @@
+import pandas as pd
 import streamlit as st
 from services.state_service import ensure_state
 from services.auth_service import require_login_or_render
 from components.auth_ui import render_user_panel
 # from components.admin_render import render_upload_bank  <-- 移除：不再需要舊的上傳元件
 from utils import db_handler as db
+from utils import record_queue as rq
+from utils import auth_store as auth
+from utils import gh_blob_cache
+from utils.bank_catalog import get_bank_catalog
+from utils import github_handler as gh
+from utils.exam_session_store import get_answer_autosaver
+from services import report_service as report
+from services import user_import_service as user_import
+from services import regrade_service as regrade
+from services.warmup_service import get_bank_warmup
 
 ensure_state()
 
@@ -33,30 +44,262 @@ st.divider()
 # ==========================================
 st.subheader("全體員工成績報表")
 
+# ---- 篩選條件（在 DB 端過濾）----
 try:
-    # 直接讀取並顯示資料，不需要再切換 Tab
-    all_hist = db.get_all_history()
-    
-    if not all_hist.empty:
-        # 可以加上簡單的篩選器或排序功能（選配）
+    opts = db.get_history_filter_options()
+except Exception as e:
+    st.error(f"讀取篩選選項失敗：{e}")
+    opts = {"departments": [], "bank_types": []}
+
+f1, f2 = st.columns(2)
+with f1:
+    sel_deps = st.multiselect("部門", options=opts["departments"])
+    sel_dates = st.date_input("考試日期區間", value=(), key="report_dates")
+with f2:
+    sel_banks = st.multiselect("題庫/證照", options=opts["bank_types"])
+    sel_passed = st.selectbox("合格狀態", options=["全部", "合格", "不合格"])
+
+date_from = date_to = None
+if isinstance(sel_dates, (list, tuple)) and len(sel_dates) >= 1:
+    date_from = sel_dates[0]
+    date_to = sel_dates[1] if len(sel_dates) > 1 else sel_dates[0]
+
+filters = {
+    "departments": sel_deps,
+    "bank_types": sel_banks,
+    "date_from": date_from,
+    "date_to": date_to,
+    "passed": {"全部": None, "合格": 1, "不合格": 0}[sel_passed],
+}
+
+# 篩選條件改變就回到第一頁
+filters_key = repr(sorted(filters.items()))
+if st.session_state.get("report_filters_key") != filters_key:
+    st.session_state.report_filters_key = filters_key
+    st.session_state.report_cursors = [None]   # 每一頁起點的 keyset cursor
+
+cursors = st.session_state.report_cursors
+page_no = len(cursors)
+
+try:
+    page_df, next_after = db.get_history_page(filters, after=cursors[-1], limit=db.HISTORY_PAGE_SIZE)
+    total = db.count_history(filters)
+
+    if not page_df.empty:
+        st.caption(f"共 {total} 筆｜第 {page_no} 頁（每頁 {db.HISTORY_PAGE_SIZE} 筆）")
         st.dataframe(
-            all_hist, 
+            report.to_report_frame(page_df),
             use_container_width=True,
-            hide_index=True  # 隱藏 pandas 的 index 讓表格更乾淨
-        )
-        
-        # 額外功能：讓管理員可以下載報表 (Excel)
-        # 這是一個很實用的加分功能
-        csv = all_hist.to_csv(index=False).encode('utf-8-sig')
-        st.download_button(
-            "📥 下載成績報表 (CSV)",
-            csv,
-            "exam_history_report.csv",
-            "text/csv",
-            key='download-csv'
+            hide_index=True,  # 隱藏 pandas 的 index 讓表格更乾淨
         )
+
+        p1, p2, _ = st.columns([1, 1, 4])
+        with p1:
+            if st.button("⬅️ 上一頁", disabled=page_no <= 1, use_container_width=True):
+                cursors.pop()
+                st.rerun()
+        with p2:
+            if st.button("下一頁 ➡️", disabled=next_after is None, use_container_width=True):
+                cursors.append(next_after)
+                st.rerun()
+
+        # 匯出：按下才分塊寫出 CSV（資料庫端分塊讀取，不會把全部資料讀成一個 DataFrame）
+        # 注意：st.download_button 會把整個檔案讀進記憶體交給前端，峰值約等於 CSV 檔案大小
+        if st.button("📄 產生成績報表 (CSV)"):
+            with st.spinner("匯出中..."):
+                csv_file, n_rows = report.export_history_csv(filters)
+            st.download_button(
+                f"📥 下載成績報表 (CSV，{n_rows} 筆)",
+                csv_file,
+                "exam_history_report.csv",
+                "text/csv",
+                key='download-csv'
+            )
+    else:
+        st.warning("目前尚無符合條件的考試紀錄。")
+
+except Exception as e:
+    st.error(f"讀取全體成績失敗：{e}")
+
+st.divider()
+
+# ==========================================
+# 合格率儀表板（只讀每日彙總表，不掃 records）
+# ==========================================
+st.subheader("📈 部門 / 題庫合格率")
+st.caption("沿用上方的部門、題庫與日期篩選條件。")
+
+try:
+    stats_args = dict(
+        date_from=date_from, date_to=date_to,
+        departments=sel_deps, bank_types=sel_banks,
+    )
+    summary = db.get_pass_rate_summary(**stats_args)
+    if summary.empty:
+        st.info("目前尚無彙總資料。")
     else:
-        st.warning("目前尚無任何考試紀錄。")
+        for c in ["n_exams", "n_passed"]:
+            summary[c] = summary[c].astype(int)
+        summary["pass_rate"] = (summary["pass_rate"].astype(float) * 100).round(1)
+        summary["avg_score"] = summary["avg_score"].astype(float).round(1)
+
+        n_exams, n_passed = int(summary["n_exams"].sum()), int(summary["n_passed"].sum())
+        m1, m2, m3 = st.columns(3)
+        m1.metric("考試次數", f"{n_exams}")
+        m2.metric("合格人次", f"{n_passed}")
+        m3.metric("整體合格率", f"{(n_passed / n_exams * 100) if n_exams else 0:.1f}%")
+
+        st.dataframe(
+            summary.rename(columns={
+                "department": "部門", "bank_type": "題庫/證照", "n_exams": "考試次數",
+                "n_passed": "合格人次", "pass_rate": "合格率(%)", "avg_score": "平均分數",
+            }),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        sec_avg, sec_hist = db.get_section_summary(**stats_args)
+        if not sec_avg.empty:
+            st.write("**分節平均分數**")
+            sec_avg["avg_score"] = sec_avg["avg_score"].round(1)
+            st.dataframe(
+                sec_avg.rename(columns={"section": "科目", "n": "人次", "avg_score": "平均分數"}),
+                use_container_width=True,
+                hide_index=True,
+            )
+            st.write("**分節分數分佈**")
+            st.bar_chart(sec_hist.pivot(index="bucket", columns="section", values="n").fillna(0))
+
+    if st.button("🔄 由成績紀錄重建彙總表"):
+        with st.spinner("重建中..."):
+            db.refresh_daily_stats()
+        st.success("彙總表已重建")
 
 except Exception as e:
-    st.error(f"讀取全體成績失敗：{e}")
\ No newline at end of file
+    st.error(f"讀取彙總資料失敗：{e}")
+
+st.divider()
+
+# ==========================================
+# 員工帳號批次匯入
+# ==========================================
+st.subheader("👥 員工帳號批次匯入")
+st.caption("上傳 Excel / CSV，欄位：emp_id（員編）、name（姓名）、department（部門），可選 password（密碼）；新帳號未提供密碼時由系統產生隨機初始密碼。")
+
+up_users = st.file_uploader("選擇員工名單", type=["xlsx", "csv"], key="user_import_file")
+overwrite = st.checkbox("員編已存在但姓名不同時，仍以檔案內容覆蓋", value=False)
+
+if up_users is not None:
+    try:
+        users_df = user_import.read_user_file(up_users.name, up_users.getvalue())
+        plan = user_import.plan_import(users_df, overwrite=overwrite)
+    except Exception as e:
+        st.error(f"讀取員工名單失敗：{e}")
+        plan = None
+
+    if plan is not None:
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("新增", len(plan["insert"]))
+        c2.metric("更新", len(plan["update"]))
+        c3.metric("衝突（略過）", len(plan["conflicts"]))
+        c4.metric("格式錯誤（略過）", len(plan["invalid"]))
+
+        if plan["conflicts"]:
+            with st.expander(f"⚠️ 衝突 {len(plan['conflicts'])} 筆：員編已存在但姓名不同"):
+                st.dataframe(pd.DataFrame(plan["conflicts"]).drop(columns=["password"], errors="ignore"),
+                             hide_index=True, use_container_width=True)
+        if plan["invalid"]:
+            with st.expander(f"❌ 格式錯誤 {len(plan['invalid'])} 筆"):
+                st.dataframe(pd.DataFrame(plan["invalid"]).drop(columns=["password"], errors="ignore"),
+                             hide_index=True, use_container_width=True)
+        if plan["duplicates"]:
+            st.caption(f"檔案內重複的員編 {len(plan['duplicates'])} 筆，以最後一列為準。")
+
+        if st.button("✅ 確認匯入", type="primary", disabled=not (plan["insert"] or plan["update"])):
+            bar = st.progress(0.0)
+            try:
+                result = user_import.apply_import(plan, progress_cb=lambda d, n: bar.progress(d / n))
+                st.success(f"匯入完成：新增 {result['inserted']} 筆、更新 {result['updated']} 筆")
+                if result["generated"]:
+                    st.warning(
+                        f"{len(result['generated'])} 個新帳號未提供密碼，已產生隨機初始密碼。"
+                        "此清單只會顯示這一次，請立即下載並個別發放。"
+                    )
+                    st.download_button(
+                        "📥 下載初始密碼清單 (CSV)",
+                        pd.DataFrame(result["generated"]).to_csv(index=False).encode("utf-8-sig"),
+                        "initial_passwords.csv",
+                        "text/csv",
+                        key="download-initial-passwords",
+                    )
+            except Exception as e:
+                st.error(f"匯入失敗：{e}")
+
+st.divider()
+
+# ==========================================
+# 題庫答案修正後重新計分（可中斷續跑）
+# ==========================================
+st.subheader("🧮 題庫修正後重新計分")
+st.caption(
+    "依修正後的題庫重新計算歷史模擬考成績。中斷後再按一次，會從同一版本題庫未完成的工作續跑；"
+    "工作已完成後再執行，會建立新工作並重新掃描全部紀錄。"
+)
+
+mock_banks = regrade.mock_bank_paths()
+sel_bank = st.selectbox(
+    "題庫",
+    options=[b["path"] for b in mock_banks],
+    format_func=lambda p: next(f"{b['cert']}｜{b['subject']}（{p}）" for b in mock_banks if b["path"] == p),
+    key="regrade_bank",
+)
+if st.button("▶️ 開始 / 續跑重新計分", disabled=not sel_bank):
+    max_id = db.get_max_record_id(regrade.mock_bank_type(sel_bank))
+    bar = st.progress(0.0, text="載入題庫...")
+
+    def _regrade_progress(job):
+        bar.progress(
+            regrade.job_progress(job, max_id),
+            text=f"job {job['id']}：已處理 {job['processed']} 筆、改分 {job['updated']} 筆",
+        )
+
+    try:
+        job = regrade.run_regrade(sel_bank, progress_cb=_regrade_progress)
+        bar.progress(1.0, text=f"job {job['id']}：{job['status']}")
+        st.success(f"重新計分完成（job {job['id']}）：處理 {job['processed']} 筆、改分 {job['updated']} 筆")
+    except Exception as e:
+        st.error(f"重新計分失敗：{e}（再按一次會從中斷處續跑）")
+
+st.divider()
+
+with st.expander("🔌 資料庫連線池狀態"):
+    st.json(db.get_pool_stats())
+
+with st.expander("🔑 登入快取狀態"):
+    limiter = auth.get_attempt_limiter()
+    st.json({
+        **auth.get_user_cache().stats(),
+        "locked_accounts": limiter.locked_count(),
+        "tracked_accounts": limiter.tracked_count(),
+    })
+
+with st.expander("📮 成績寫入佇列狀態"):
+    queue_stats = rq.get_record_queue().stats()
+    if queue_stats["dead_letters"]:
+        st.warning(f"有 {queue_stats['dead_letters']} 筆成績無法寫入資料庫，已移到 {queue_stats['dead_letter_file']}，請人工處理")
+    st.json(queue_stats)
+
+with st.expander("💾 模擬考作答自動儲存狀態"):
+    st.json(get_answer_autosaver().stats())
+
+with st.expander("📦 GitHub 連線 / 下載快取狀態"):
+    st.json({
+        "client": gh.get_gh_client().stats(),
+        "catalog": get_bank_catalog().stats(),
+        "blobs": gh_blob_cache.stats(),
+    })
+
+with st.expander("🔥 題庫預熱狀態"):
+    warmup = get_bank_warmup().status()
+    st.caption(f"{warmup['state']}：{warmup['ready']} / {warmup['total']} 份題庫就緒（{warmup['elapsed_sec']} 秒）")
+    st.dataframe(pd.DataFrame(warmup["banks"]), use_container_width=True, hide_index=True)
@@ -223,6 +223,7 @@ def _reset_exam_state():
         "df", "current_bank_name",
         # ✅ 兩節連考新增 keys
         "mock_section_idx", "mock_section_results", "mock_exam_start_ts", "mock_summary",
+        "mock_paper_ids", "mock_saved_sig", "mock_dwell_ms", "mock_last_event_ts",
         # ✅ 四欄（若你有另存）
         "section_scores", "total_score", "passed", "fail_reason",
     ]
@@ -1,6 +1,7 @@
 import time
 import streamlit as st
 from utils import db_handler as db
+from utils import auth_store as auth
 from components.auth_ui import render_login_form
 
 def login(emp_id: str, password: str):
@@ -19,7 +20,11 @@ def require_login_or_render():
         return None
 
     emp_id, password = result
-    user = login(emp_id, password)
+    try:
+        user = login(emp_id, password)
+    except auth.LoginLocked as e:
+        st.error(str(e))
+        return None
     if user:
         st.session_state.user_info = user
         st.toast(f"歡迎回來，{user['name']}！")
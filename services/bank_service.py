@@ -1,18 +1,21 @@
-from io import BytesIO
 import pandas as pd
 from utils import github_handler as gh
 from utils import data_loader as dl
 
-def load_bank_df(bank_type: str, merge_all: bool, bank_source_path: str | None) -> pd.DataFrame | None:
+def load_bank_df(bank_type: str, merge_all: bool, bank_source_path: str | None, timings: list | None = None) -> pd.DataFrame | None:
     """
-    - merge_all=True：合併該類型下所有題庫
+    - merge_all=True：合併該類型下所有題庫（並行下載與解析）
     - merge_all=False：載入 bank_source_path 指定的題庫
+    - timings：若傳入 list，合併模式下會附加每個檔案的載入耗時
     """
     if merge_all:
         paths = gh.list_bank_files(bank_type)
         if not paths:
             return None
-        return dl.load_banks_from_github(paths)
+        df, file_timings = dl.load_banks_from_github_timed(paths)
+        if timings is not None:
+            timings.extend(file_timings)
+        return df
 
     if not bank_source_path:
         return None
@@ -20,13 +23,7 @@ def load_bank_df(bank_type: str, merge_all: bool, bank_source_path: str | None)
     data = gh.gh_download_bytes(bank_source_path)
     if not data:
         return None
-
-    bio = BytesIO(data)
-    try:
-        bio.name = bank_source_path
-    except Exception:
-        pass
-    return dl.load_bank(bio)
+    return dl.load_bank_bytes(data, bank_source_path)
 
 
 def get_all_tags(df) -> list[str]:
@@ -1,43 +1,114 @@
+import numpy as np
 import pandas as pd
 from utils import data_loader as dl
 from utils import db_handler as db
+from utils import record_queue as rq
+from utils import answer_bits as ab
 
 def build_paper(df, n_questions: int, random_order=True, shuffle_options=True):
     return dl.sample_paper(df, n_questions, random_order=random_order, shuffle_options=shuffle_options)
 
+# ==========================================
+# 批改（答案以 bitmask 表示：A=1, B=2, C=4 ...）
+# ==========================================
+RESULT_COLUMNS = [
+    "ID", "Tag", "Question", "Type", "Choices",
+    "YourAnswer", "CorrectAnswer", "Explanation", "Result",
+]
+
+
+def _gold_mask(q) -> int:
+    m = q.get("AnswerMask")
+    if m is not None:
+        return int(m)
+    return ab.labels_to_mask(q.get("Answer", []))
+
+
+def encode_paper(paper) -> np.ndarray:
+    """考卷的正解 bitmask"""
+    return np.fromiter((_gold_mask(q) for q in paper), dtype=np.uint32, count=len(paper))
+
+
+def encode_answers(paper, answers: dict) -> np.ndarray:
+    """作答的 bitmask（未作答為 0）；題目帶 "Key"（模擬考）時 answers 以 Key 為 key，否則以 ID"""
+    return np.fromiter(
+        (ab.labels_to_mask(answers.get(q.get("Key", q["ID"]), [])) for q in paper),
+        dtype=np.uint32, count=len(paper),
+    )
+
+
+def _results_frame(paper, gold: np.ndarray, pred: np.ndarray, ok: np.ndarray) -> pd.DataFrame:
+    # 一次以欄為單位建立 DataFrame（欄位對齊 page5/history/db_handler）
+    data = {
+        "ID": [q["ID"] for q in paper],
+        "Tag": [q.get("Tag", "") for q in paper],
+        "Question": [q.get("Question", "") for q in paper],
+        "Type": [q.get("Type", "") for q in paper],
+        "Choices": [q.get("Choices", []) for q in paper],
+        "YourAnswer": [ab.mask_to_labels(m) for m in pred.tolist()],
+        "CorrectAnswer": [ab.mask_to_labels(m) for m in gold.tolist()],
+        "Explanation": [q.get("Explanation", "") for q in paper],
+        "Result": np.where(ok, "✅", "❌").tolist(),
+    }
+    return pd.DataFrame(data, columns=RESULT_COLUMNS)
+
+
+def _score_tuple(n_correct: int, total: int) -> tuple[int, int, int]:
+    score = int(round((n_correct / total) * 100)) if total else 0
+    return int(n_correct), int(total), score
+
+
 def grade_paper(paper, answers: dict) -> tuple[pd.DataFrame, tuple[int, int, int], pd.DataFrame]:
-    rows = []
-    correct = 0
-
-    for q in paper:
-        qid = q["ID"]
-        gold = set(q.get("Answer", []))
-        pred = set(answers.get(qid, []))
-
-        ok = (pred == gold)
-        if ok:
-            correct += 1
-
-        rows.append({
-            "ID": qid,
-            "Tag": q.get("Tag", ""),
-            "Question": q.get("Question", ""),
-            "Type": q.get("Type", ""),
-            "Choices": q.get("Choices", []),
-
-            # ✅ 改成新版欄位（對齊 page5/history/db_handler）
-            "YourAnswer": sorted(list(pred)),
-            "CorrectAnswer": sorted(list(gold)),
-
-            "Explanation": q.get("Explanation", ""),
-            "Result": "✅" if ok else "❌",
-        })
-
-    results_df = pd.DataFrame(rows)
-    total = len(paper)
-    score = int(round((correct / total) * 100)) if total else 0
-    wrong_df = results_df[results_df["Result"] == "❌"].copy()
-    return results_df, (correct, total, score), wrong_df
+    return grade_papers([(paper, answers)])[0]
+
+
+def grade_papers(submissions) -> list[tuple[pd.DataFrame, tuple[int, int, int], pd.DataFrame]]:
+    """
+    批次批改多份考卷：submissions = [(paper, answers), ...]
+    所有題目的 bitmask 串成一個陣列一次比對，再依每份考卷的長度切回去
+    """
+    submissions = list(submissions)
+    if not submissions:
+        return []
+
+    golds = [encode_paper(paper) for paper, _ in submissions]
+    preds = [encode_answers(paper, answers) for paper, answers in submissions]
+    ok_all = np.concatenate(golds) == np.concatenate(preds)
+    bounds = np.cumsum([0] + [len(g) for g in golds])
+
+    out = []
+    for i, (paper, _) in enumerate(submissions):
+        ok = ok_all[bounds[i]:bounds[i + 1]]
+        results_df = _results_frame(paper, golds[i], preds[i], ok)
+        wrong_df = results_df[~ok].copy()
+        # 錯題另外帶出處（題庫檔 / 工作表），db_handler 以此 + ID + 題幹辨識同一題
+        for col in ("SourceFile", "SourceSheet"):
+            wrong_df[col] = [q.get(col, "") for q, bad in zip(paper, ~ok) if bad]
+        out.append((results_df, _score_tuple(int(ok.sum()), len(paper)), wrong_df))
+    return out
+
+
+def evaluate_mock_result(spec: dict, section_scores: dict) -> tuple[int, bool, str | None]:
+    """依 MOCK_SPECS 判定模擬考是否及格，回傳 (total_score, passed, fail_reason)"""
+    scores = [int(v) for v in section_scores.values()]
+    total_score = int(sum(scores))
+    min_each = int(min(scores)) if scores else 0
+
+    passed = True
+    fail_reason = None
+    if spec.get("mode") == "single":
+        pass_score = int(spec.get("pass_score", 0))
+        passed = total_score >= pass_score
+        if not passed: fail_reason = "分數未達及格標準"
+    else:
+        pass_total = int(spec.get("pass_total", 0))
+        pass_min_each = int(spec.get("pass_min_each", 0))
+        passed = (total_score >= pass_total) and (min_each >= pass_min_each)
+        if not passed:
+            if total_score < pass_total: fail_reason = "總分不足"
+            elif min_each < pass_min_each: fail_reason = "單科未達最低標準"
+    return total_score, passed, fail_reason
+
 
 def persist_exam_record(
     user,
@@ -52,14 +123,15 @@ def persist_exam_record(
 ):
     correct, total, score = score_tuple
 
-    db.save_exam_record(
-        user["emp_id"],
-        bank_type,
-        score,                 # DB records.score（你目前用 total_score 當 score 也可）
-        duration_sec,
-        wrong_df,
-        section_scores=section_scores,
-        total_score=total_score,
-        passed=passed,
-        fail_reason=fail_reason
-    )
\ No newline at end of file
+    # 只寫入本機 spool 就返回，由背景 worker 批次寫進 MySQL
+    rq.get_record_queue().enqueue({
+        "emp_id": user["emp_id"],
+        "bank_type": bank_type,
+        "score": score,                 # DB records.score（你目前用 total_score 當 score 也可）
+        "duration": int(duration_sec),
+        "section_scores": section_scores,
+        "total_score": total_score,
+        "passed": passed,
+        "fail_reason": fail_reason,
+        "wrong_items": db.wrong_items_from_df(wrong_df),
+    })
@@ -0,0 +1,216 @@
+# services/mock_session_service.py
+"""
+模擬考 session 狀態的精簡化與還原
+
+st.session_state 只保留題目 key 與作答 bitmask：
+- 題目 key：qkey()，JSON 字串 [SourceFile, SourceSheet, ID]
+  （沒有 ID 欄的題庫每個工作表都從 1 編號，只用 ID 會對錯題）
+- mock_paper_ids：本節考卷的題目 key（題目內容每次由題庫 DataFrame 依 key 取出）
+- answers：{題目 key: 作答 bitmask}
+- mock_section_results：已完成各節的分數 + 題目 key + 作答（不再存 results_df / wrong_df）
+題庫在考試中途更新、找不到的題目不會默默略過，而是回報給頁面顯示
+狀態同步寫到 utils.exam_session_store，worker 重啟或重新連線後可還原：
+- 考卷 / 各節結果：開始或結束一節時整份寫入
+- 作答：autosave() 只把有變動的題目交給背景 autosaver（每 N 秒最多寫一次）
+"""
+import json
+import time
+import hashlib
+import pandas as pd
+import streamlit as st
+
+from utils import answer_bits as ab
+from utils.exam_session_store import get_exam_session_store, get_answer_autosaver
+from services.bank_service import load_bank_df
+from services.exam_service import grade_paper
+
+STATE_VERSION = 2
+
+
+# =========================
+# 考卷 <-> 題目 key
+# =========================
+def qkey(q: dict) -> str:
+    """題目在題庫中的穩定 key（題庫檔 + 工作表 + ID）"""
+    return json.dumps(
+        [str(q.get("SourceFile") or ""), str(q.get("SourceSheet") or ""), str(q.get("ID"))],
+        ensure_ascii=False,
+    )
+
+
+def paper_from_ids(df: pd.DataFrame, keys: list) -> tuple[list[dict], list[str]]:
+    """
+    依 key 順序從題庫取出題目，回傳 (考卷, 找不到的 key)；
+    每題另帶 "Key" 欄位，作答 / widget / 批改都以它為準
+    """
+    if not keys:
+        return [], []
+    if df is None or df.empty:
+        return [], list(keys)
+    wanted_ids = {json.loads(k)[2] for k in keys}
+    sub = df[df["ID"].astype(str).isin(wanted_ids)]
+    by_key = {}
+    for r in sub.to_dict("records"):
+        by_key.setdefault(qkey(r), {**r, "Key": qkey(r)})
+    paper = [by_key[k] for k in keys if k in by_key]
+    missing = [k for k in keys if k not in by_key]
+    return paper, missing
+
+
+def describe_missing(keys: list[str]) -> str:
+    """找不到的題目，給頁面顯示用：「檔案 / 工作表 #ID」"""
+    out = []
+    for k in keys:
+        src, sheet, qid = json.loads(k)
+        out.append(f"{src or '?'} / {sheet or '?'} #{qid}")
+    return "、".join(out)
+
+
+def _pairs(answers: dict) -> list:
+    # JSON 物件的 key 只能是字串；改存成 [ID, mask] 保留 ID 原本的型別
+    return [[k, int(v)] for k, v in answers.items()]
+
+
+def _unpairs(pairs) -> dict:
+    return {k: int(v) for k, v in (pairs or [])}
+
+
+# =========================
+# session_state <-> 精簡狀態
+# =========================
+def snapshot() -> dict:
+    ss = st.session_state
+    return {
+        "v": STATE_VERSION,
+        "section_idx": int(ss.get("mock_section_idx") or 0),
+        "exam_start_ts": ss.get("mock_exam_start_ts"),
+        "start_ts": ss.get("start_ts"),
+        "time_limit": ss.get("time_limit"),
+        "show_results": bool(ss.get("show_results")),
+        "paper_ids": list(ss.get("mock_paper_ids") or []),
+        "answers": _pairs(ss.get("answers") or {}),
+        "dwell_ms": _pairs(ss.get("mock_dwell_ms") or {}),
+        "sections_done": [
+            {
+                **{k: v for k, v in s.items() if k not in ("answers", "dwell_ms")},
+                "answers": _pairs(s.get("answers") or {}),
+                "dwell_ms": _pairs(s.get("dwell_ms") or {}),
+            }
+            for s in (ss.get("mock_section_results") or [])
+        ],
+    }
+
+
+def persist(emp_id: str, cert_type: str, force: bool = False) -> bool:
+    """整份狀態有變動才寫入（開始 / 結束一節時呼叫），回傳是否寫入"""
+    state = snapshot()
+    if not state["paper_ids"] and not state["sections_done"]:
+        return False
+    sig = hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    if not force and st.session_state.get("mock_saved_sig") == sig:
+        return False
+    get_exam_session_store().save(emp_id, cert_type, state)
+    st.session_state.mock_saved_sig = sig
+    return True
+
+
+def restore(emp_id: str, cert_type: str) -> bool:
+    """
+    每個 session、每個證照類別只嘗試一次：
+    記憶體中沒有進行中的模擬考，而 store 有未完成的進度時還原
+    """
+    marker = (emp_id, cert_type)
+    if st.session_state.get("mock_restore_checked") == marker:
+        return False
+    st.session_state.mock_restore_checked = marker
+
+    ss = st.session_state
+    if ss.get("mock_paper_ids") or ss.get("mock_section_results"):
+        return False
+    state = get_exam_session_store().load(emp_id, cert_type)
+    if not state or state.get("v") != STATE_VERSION:
+        return False
+
+    ss.mock_section_idx = int(state.get("section_idx") or 0)
+    ss.mock_exam_start_ts = state.get("exam_start_ts")
+    ss.start_ts = state.get("start_ts")
+    ss.time_limit = state.get("time_limit")
+    ss.show_results = bool(state.get("show_results"))
+    ss.mock_paper_ids = list(state.get("paper_ids") or [])
+    ss.answers = _unpairs(state.get("answers"))
+    ss.mock_dwell_ms = _unpairs(state.get("dwell_ms"))
+    # 整份狀態之後的作答由 autosaver 逐題寫入，以那份為準
+    answers, dwell = get_exam_session_store().load_answers(emp_id, cert_type, ss.mock_section_idx)
+    ss.answers.update(answers)
+    ss.mock_dwell_ms.update(dwell)
+    ss.mock_last_event_ts = time.time()
+    ss.started = bool(ss.mock_paper_ids)
+    ss.saved_to_db = False
+    ss.mock_section_results = [
+        {**s, "answers": _unpairs(s.get("answers")), "dwell_ms": _unpairs(s.get("dwell_ms"))}
+        for s in (state.get("sections_done") or [])
+    ]
+    return True
+
+
+def clear(emp_id: str, cert_type: str | None = None):
+    get_answer_autosaver().clear(emp_id, cert_type)
+    st.session_state.pop("mock_saved_sig", None)
+
+
+def start_section_clock():
+    st.session_state.mock_dwell_ms = {}
+    st.session_state.mock_last_event_ts = time.time()
+
+
+def autosave(emp_id: str, cert_type: str, section_idx: int, picks: dict) -> int:
+    """
+    picks：本次 rerun 各題的作答 bitmask
+    只有和上次不同的題目會標成 dirty 交給 autosaver；回傳變動的題數
+    （尚未作答視為 0：一節剛開始、全部未作答的第一次 rerun 不算變動）
+    停留時間：距離上一次作答變動的時間，平均分給這次變動的題目
+    """
+    ss = st.session_state
+    answers = ss.answers
+    changed = [qid for qid, mask in picks.items() if answers.get(qid, 0) != mask]
+    if not changed:
+        return 0
+
+    now = time.time()
+    dwell = ss.setdefault("mock_dwell_ms", {})
+    last = ss.get("mock_last_event_ts") or now
+    share = int((now - last) * 1000 / len(changed))
+    ss.mock_last_event_ts = now
+
+    out = {}
+    for qid in changed:
+        answers[qid] = picks[qid]
+        dwell[qid] = int(dwell.get(qid, 0)) + share
+        out[qid] = (picks[qid], dwell[qid])
+    get_answer_autosaver().put(emp_id, cert_type, section_idx, out)
+    return len(changed)
+
+
+def restore_widget_answers(paper: list[dict], answers: dict, key_fmt: str):
+    """把還原的作答寫回 widget 的 key，讓選項顯示為上次的選擇"""
+    for q in paper:
+        key = key_fmt.format(q["Key"])
+        mask = answers.get(q["Key"])
+        if key in st.session_state or not mask:
+            continue
+        labels = set(ab.mask_to_labels(mask))
+        display = [f"{lab}. {txt}" for lab, txt in q["Choices"] if lab in labels]
+        if not display:
+            continue
+        st.session_state[key] = display if q["Type"] == "MC" else display[0]
+
+
+# =========================
+# 交卷後重建完整結果
+# =========================
+def section_frames(cert_type: str, section_result: dict) -> tuple[pd.DataFrame, pd.DataFrame, list[str]]:
+    """依精簡狀態重新批改一節，回傳 (results_df, wrong_df, 題庫中已找不到的題目 key)"""
+    df = load_bank_df(cert_type, merge_all=False, bank_source_path=section_result.get("bank_path"))
+    paper, missing = paper_from_ids(df, section_result.get("paper_ids") or [])
+    results_df, _, wrong_df = grade_paper(paper, section_result.get("answers") or {})
+    return results_df, wrong_df, missing
@@ -0,0 +1,267 @@
+# services/regrade_service.py
+"""
+題庫答案修正後，批次重新計分歷史模擬考紀錄
+
+流程：
+1. 載入修正後的題庫（一個題庫檔 = 模擬考的一節，見 CERT_CATALOG）
+2. 以 id keyset 分塊讀取該類別的 records（每塊 chunk_size 筆，不一次載入全部）
+   與其錯題（exam_wrong_answers；尚未搬移的舊資料讀 records.wrong_log）
+3. 把每筆錯題中屬於此題庫的題目，依「選項文字」對回題庫中的選項位置，
+   以 bitmask 一次比對整塊的作答與新答案
+4. executemany 寫回，並在同一個 transaction 推進 regrade_jobs 的進度（可中斷續跑）
+
+限制：records 只保存錯題，因此只能把「原本判錯、依新答案其實答對」的題目改判為對；
+原本答對、但新答案下變成錯的題目無從得知，不會扣分。
+
+執行方式：管理員後台「題庫修正後重新計分」，或
+    python -m services.regrade_service bank/人身/人身_保險法規.xlsx
+續跑只針對「同一份題庫內容 (sha) 尚未完成」的工作；工作完成後再執行一次，
+會建立新工作、從頭重新掃描所有紀錄（已改判的題目不會再改一次，但仍要讀過全部紀錄）。
+"""
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+from utils import data_loader as dl
+from utils import db_handler as db
+from utils import github_handler as gh
+from utils import bank_snapshot
+from utils.question_store import get_question_store
+from services.exam_rules import CERT_CATALOG, MOCK_SPECS
+from services.exam_service import evaluate_mock_result
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+# ==========================================
+# 題庫修正版本
+# ==========================================
+class BankRevision:
+    """修正後的題庫：以 (ID, 題幹) 對回題目，正解以原始選項位置 bitmask 表示"""
+
+    def __init__(self, bank_path: str, df: pd.DataFrame, sha: str = ""):
+        self.bank_path = bank_path
+        self.sha = sha
+        self.store = get_question_store(df)
+
+        self.index = {}
+        for pos, (qid, question) in enumerate(zip(self.store.fields["ID"], self.store.question)):
+            self.index.setdefault(_question_key(qid, question), pos)
+
+        # 找出此題庫屬於哪個類別的哪一節
+        self.cert_type, self.section = None, None
+        for cert, conf in CERT_CATALOG.items():
+            for subject, path in conf.get("subjects", {}).items():
+                if path == bank_path:
+                    self.cert_type, self.section = cert, subject
+
+    @property
+    def bank_type(self) -> str:
+        # 與模擬考頁面寫入 records.bank_type 的格式相同
+        return f"{self.cert_type}｜模擬考"
+
+    def lookup(self, item: dict):
+        return self.index.get(_question_key(item.get("ID"), item.get("Question")))
+
+    def labels_to_pos_mask(self, pos: int, choices, labels) -> int:
+        """把「考卷上的 label」經由選項文字換算成題庫中的選項位置 bitmask（考卷可能洗過選項）"""
+        label_to_text = {str(c[0]): c[1] for c in (choices or []) if len(c) >= 2}
+        nc = int(self.store.n_choices[pos])
+        text_to_pos = {}
+        for j in range(nc):
+            text_to_pos.setdefault(self.store.texts[pos, j], j)
+        mask = 0
+        for lab in labels or []:
+            j = text_to_pos.get(label_to_text.get(str(lab)))
+            mask |= (1 << j) if j is not None else (1 << 31)
+        return mask
+
+    def pos_mask_to_labels(self, pos: int, choices, mask: int) -> list[str]:
+        """題庫選項位置 bitmask -> 該考卷上的 label"""
+        texts = {self.store.texts[pos, j] for j in range(int(self.store.n_choices[pos])) if mask & (1 << j)}
+        return sorted(str(c[0]) for c in (choices or []) if len(c) >= 2 and c[1] in texts)
+
+
+def _question_key(qid, question) -> tuple[str, str]:
+    return str(qid).strip(), str(question).strip()
+
+
+def load_revision(bank_path: str) -> BankRevision | None:
+    data = gh.gh_download_bytes(bank_path)
+    if not data:
+        return None
+    df = dl.load_bank_bytes(data, bank_path)
+    if df is None or df.empty:
+        return None
+    return BankRevision(bank_path, df, sha=bank_snapshot.content_sha(data))
+
+
+# ==========================================
+# 分塊重新計分
+# ==========================================
+def regrade_records(rev: BankRevision, rows: list[dict]) -> tuple[list[tuple], dict]:
+    """
+    重新計分一塊 records（row 需含 id / section_scores / wrong_items），
+    回傳 (UPDATE 參數, {record_id: 新的錯題清單})，只包含有變動的紀錄
+    """
+    spec = MOCK_SPECS.get(rev.cert_type, {})
+    section_total = {s["name"]: int(s.get("n_questions", 0)) for s in spec.get("sections", [])}
+    total = section_total.get(rev.section, 0)
+
+    # 1) 攤平所有屬於此題庫的錯題
+    logs, item_rec, item_idx, item_pos = [], [], [], []
+    old_gold, pred = [], []
+    for r_i, row in enumerate(rows):
+        log = list(row.get("wrong_items") or [])
+        logs.append(log)
+        for i_i, item in enumerate(log):
+            pos = rev.lookup(item)
+            if pos is None:
+                continue
+            choices = item.get("Choices")
+            item_rec.append(r_i)
+            item_idx.append(i_i)
+            item_pos.append(pos)
+            old_gold.append(rev.labels_to_pos_mask(pos, choices, item.get("CorrectAnswer")))
+            pred.append(rev.labels_to_pos_mask(pos, choices, item.get("YourAnswer")))
+
+    if not item_rec:
+        return [], {}
+
+    # 2) 向量化比對
+    item_rec = np.asarray(item_rec)
+    new_gold = rev.store.answer_pos_mask[np.asarray(item_pos)].astype(np.int64)
+    old_gold = np.asarray(old_gold, dtype=np.int64)
+    pred = np.asarray(pred, dtype=np.int64)
+    affected = old_gold != new_gold
+    flipped = affected & (pred == new_gold)
+    flips_per_rec = np.bincount(item_rec[flipped], minlength=len(rows))
+    touched = np.zeros(len(rows), dtype=bool)
+    touched[item_rec[affected]] = True
+
+    # 3) 組出要寫回的紀錄
+    drop = {}
+    for k in np.flatnonzero(affected):
+        r_i, i_i = int(item_rec[k]), item_idx[k]
+        if flipped[k]:
+            drop.setdefault(r_i, set()).add(i_i)
+        else:
+            item = logs[r_i][i_i]
+            item["CorrectAnswer"] = rev.pos_mask_to_labels(item_pos[k], item.get("Choices"), int(new_gold[k]))
+
+    updates, new_items = [], {}
+    for r_i in np.flatnonzero(touched):
+        row = rows[r_i]
+        log = [it for i, it in enumerate(logs[r_i]) if i not in drop.get(r_i, ())]
+        try:
+            section_scores = json.loads(row.get("section_scores") or "{}")
+        except (TypeError, ValueError):
+            section_scores = {}
+
+        flips = int(flips_per_rec[r_i])
+        if flips and total and rev.section in section_scores:
+            old_correct = int(round(float(section_scores[rev.section]) * total / 100))
+            new_correct = min(total, old_correct + flips)
+            section_scores[rev.section] = int(round(new_correct / total * 100))
+
+        total_score, passed, fail_reason = evaluate_mock_result(spec, section_scores)
+        updates.append((
+            total_score,
+            json.dumps(section_scores, ensure_ascii=False),
+            total_score,
+            1 if passed else 0,
+            fail_reason,
+            int(row["id"]),
+        ))
+        new_items[int(row["id"])] = log
+    return updates, new_items
+
+
+def mock_bank_paths() -> list[dict]:
+    """可重新計分的題庫：屬於模擬考某一節的題庫檔 [{cert, subject, path}]"""
+    return [
+        {"cert": cert, "subject": subject, "path": path}
+        for cert, conf in CERT_CATALOG.items() if cert in MOCK_SPECS
+        for subject, path in conf.get("subjects", {}).items()
+    ]
+
+
+def mock_bank_type(bank_path: str) -> str | None:
+    """題庫檔對應的 records.bank_type（與 BankRevision.bank_type 相同）"""
+    for b in mock_bank_paths():
+        if b["path"] == bank_path:
+            return f"{b['cert']}｜模擬考"
+    return None
+
+
+def job_progress(job: dict, max_id: int) -> float:
+    """以 id keyset 的位置估計進度（0~1）"""
+    if job.get("status") == "done":
+        return 1.0
+    return min(1.0, int(job.get("last_record_id") or 0) / max_id) if max_id else 0.0
+
+
+def run_regrade(bank_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, progress_cb=None, max_chunks=None):
+    """
+    重新計分使用 bank_path 這份題庫的所有模擬考紀錄
+    - 以題庫內容 sha 為單位建立 / 續跑 regrade_jobs：只有同一個 sha 尚未完成的工作會續跑，
+      已完成後再呼叫會建立新工作並重新掃描全部紀錄
+    - progress_cb(job_dict) 每處理完一塊呼叫一次
+    - max_chunks：只跑幾塊就先停（之後再呼叫會從上次位置續跑）
+    回傳最新的 job 狀態
+    """
+    rev = load_revision(bank_path)
+    if rev is None or rev.section is None:
+        raise ValueError(f"找不到題庫或此題庫未對應到模擬考：{bank_path}")
+
+    job = db.create_regrade_job(bank_path, rev.sha, rev.bank_type)
+    if job is None:
+        raise RuntimeError("無法建立重新計分工作")
+
+    last_id = int(job["last_record_id"])
+    n_chunks = 0
+    while max_chunks is None or n_chunks < max_chunks:
+        rows = db.fetch_records_after(rev.bank_type, last_id, chunk_size)
+        if not rows:
+            db.apply_regrade_chunk(job["id"], [], {}, last_id, 0, done=True)
+            break
+        updates, wrong_items = regrade_records(rev, rows)
+        last_id = int(rows[-1]["id"])
+        db.apply_regrade_chunk(job["id"], updates, wrong_items, last_id, len(rows), done=len(rows) < chunk_size)
+        n_chunks += 1
+        job = db.get_regrade_job(job["id"])
+        if progress_cb is not None:
+            progress_cb(job)
+        if job and job["status"] == "done":
+            break
+    job = db.get_regrade_job(job["id"])
+    if job and job["status"] == "done" and int(job["updated"]) > 0:
+        # 分數有變動：每日彙總表依 records 重建
+        db.refresh_daily_stats()
+    return job
+
+
+def main(argv: list[str]) -> None:
+    if not argv:
+        print("用法：python -m services.regrade_service <題庫路徑> [...]")
+        for b in mock_bank_paths():
+            print(f"  {b['path']}（{b['cert']}｜{b['subject']}）")
+        sys.exit(2)
+
+    db.init_db()
+    for bank_path in argv:
+        bank_type = mock_bank_type(bank_path)
+        max_id = db.get_max_record_id(bank_type) if bank_type else 0
+
+        def _report(job):
+            pct = job_progress(job, max_id) * 100
+            print(f"  job {job['id']}：{pct:.0f}%，已處理 {job['processed']} 筆、改分 {job['updated']} 筆")
+
+        print(f"{bank_path}：開始重新計分（同一版本題庫有未完成的工作會從中斷處續跑）")
+        job = run_regrade(bank_path, progress_cb=_report)
+        print(f"{bank_path}：job {job['id']} {job['status']}，共處理 {job['processed']} 筆、改分 {job['updated']} 筆")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
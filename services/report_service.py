@@ -0,0 +1,59 @@
+# services/report_service.py
+"""
+管理員成績報表：分頁查詢與分塊匯出 CSV
+
+資料一律由 db_handler 以 (exam_date, id) keyset 分頁讀取，
+匯出時每讀一塊就寫一塊到暫存檔，記憶體用量只跟 chunk_size 有關，不隨歷史筆數成長。
+"""
+import tempfile
+from utils import db_handler as db
+
+EXPORT_CHUNK_SIZE = 2000
+
+REPORT_COLUMNS = {
+    "id": "紀錄ID",
+    "emp_id": "員編",
+    "name": "姓名",
+    "department": "部門",
+    "bank_type": "題庫/證照",
+    "score": "分數",
+    "total_score": "總分",
+    "passed": "合格",
+    "fail_reason": "不合格原因",
+    "duration_seconds": "耗時(秒)",
+    "exam_date": "考試時間",
+}
+
+
+def to_report_frame(df):
+    """DB 欄位 -> 報表顯示欄位"""
+    if df.empty:
+        return df
+    cols = [c for c in REPORT_COLUMNS if c in df.columns]
+    return df[cols].rename(columns=REPORT_COLUMNS)
+
+
+def write_history_csv(fileobj, filters=None, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """
+    依篩選條件分塊寫出 CSV（utf-8-sig，Excel 可直接開啟），回傳寫出的筆數
+    fileobj 需以二進位模式開啟
+    """
+    n_rows = 0
+    fileobj.write(b"\xef\xbb\xbf")  # BOM
+    for chunk in db.iter_history_chunks(filters, chunk_size=chunk_size):
+        out = to_report_frame(chunk)
+        fileobj.write(out.to_csv(index=False, header=(n_rows == 0)).encode("utf-8"))
+        n_rows += len(out)
+    if n_rows == 0:
+        fileobj.write(",".join(REPORT_COLUMNS.values()).encode("utf-8") + b"\n")
+    return n_rows
+
+
+def export_history_csv(filters=None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    匯出到暫存檔（超過 8MB 才落地到磁碟），回傳 (已 seek(0) 的檔案物件, 筆數)
+    """
+    f = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+b")
+    n_rows = write_history_csv(f, filters, chunk_size=chunk_size)
+    f.seek(0)
+    return f, n_rows
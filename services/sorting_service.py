@@ -9,6 +9,8 @@ from google import genai
 from google.genai import types
 import streamlit as st
 from utils import github_handler as gh
+from utils import xlsx_stream
+from utils import gh_blob_cache
 
 # ==========================================
 # 設定區
@@ -211,28 +213,56 @@ def process_uploaded_file(exam_type, uploaded_file):
     mgr = get_cached_manager(exam_type, tuple(all_chapters))
     classifier = SmartClassifier(mgr, config['default_chapter'])
 
+    # 串流讀取：不把整本活頁簿讀成 DataFrame，逐列送進分類批次
+    # 與原本 pd.read_excel(sheet_name=None) 相同，所有工作表都讀（不套用題庫的略過規則）
     try:
-        dfs = pd.read_excel(uploaded_file, sheet_name=None)
+        uploaded_file.seek(0)
+        est_rows = xlsx_stream.estimate_data_rows(uploaded_file, skip_sheet=None)
     except Exception as e:
         st.error(f"Excel 讀取失敗: {e}")
         return None
 
     final_results = []
     progress_bar = st.progress(0, text="準備開始分類...")
-    
-    total_rows = sum(len(df) for df in dfs.values() if not df.empty and COL_Q in df.columns)
+
+    total_rows = max(1, sum(est_rows.values()))
     processed_count = 0
     BATCH_SIZE = 10 
 
-    for name, df in dfs.items():
-        if df.empty or COL_Q not in df.columns: continue
-        
-        valid_opts = [c for c in config['col_opts'] if c in df.columns]
-        
-        batch_buffer = [] 
-        rows_map = {}
-        
-        for idx, row in df.iterrows():
+    batch_buffer = []
+    rows_map = {}
+
+    def _flush_batch():
+        nonlocal processed_count, batch_buffer
+        if not batch_buffer:
+            return
+        batch_results = classifier.classify_batch(batch_buffer)
+        for item in batch_buffer:
+            res = batch_results.get(item['id'], (config['default_chapter'], "預設"))
+            r = rows_map.pop(item['id'])
+            r["AI分類章節"] = res[0]
+            r["分類來源"] = res[1]
+            final_results.append(r)
+
+        processed_count += len(batch_buffer)
+        progress = min(processed_count / total_rows, 1.0)
+        progress_bar.progress(progress, text=f"🔥 高速分類中：{processed_count}/{total_rows} 題")
+
+        batch_buffer = []
+        time.sleep(2)
+
+    current_sheet = None
+    valid_opts = []
+    try:
+        uploaded_file.seek(0)
+        for name, idx, row in xlsx_stream.iter_sheet_records(uploaded_file, skip_sheet=None):
+            if name != current_sheet:
+                # 換工作表：先送出上一張表剩下的題目
+                _flush_batch()
+                current_sheet = name
+                valid_opts = [c for c in config['col_opts'] if c in row]
+            if COL_Q not in row: continue
+
             q = str(row.get(COL_Q, "")).strip()
             if not q or q.lower() == "nan": continue
             
@@ -242,32 +272,27 @@ def process_uploaded_file(exam_type, uploaded_file):
             item = {'id': unique_id, 'q': q, 'opts': opts_txt}
             
             batch_buffer.append(item)
-            rows_map[unique_id] = row.to_dict()
+            rows_map[unique_id] = row
             
-            if len(batch_buffer) >= BATCH_SIZE or idx == len(df) - 1:
-                batch_results = classifier.classify_batch(batch_buffer)
-                for item in batch_buffer:
-                    res = batch_results.get(item['id'], (config['default_chapter'], "預設"))
-                    r = rows_map[item['id']]
-                    r["AI分類章節"] = res[0]
-                    r["分類來源"] = res[1]
-                    final_results.append(r)
-                
-                processed_count += len(batch_buffer)
-                progress = min(processed_count / total_rows, 1.0)
-                progress_bar.progress(progress, text=f"🔥 高速分類中：{processed_count}/{total_rows} 題")
-                
-                batch_buffer = []
-                time.sleep(2)
+            if len(batch_buffer) >= BATCH_SIZE:
+                _flush_batch()
+        _flush_batch()
+    except Exception as e:
+        st.error(f"Excel 讀取失敗: {e}")
+        progress_bar.empty()
+        return None
 
     progress_bar.empty()
     return pd.DataFrame(final_results)
 
 # 👇 【核心修正】：加入上傳狀態檢查與錯誤攔截
+# 所有輸出檔先在記憶體組好，再以 gh.gh_commit_files 一次提交（同一個 commit，全部成功或全部不變）
 def save_merged_results(exam_type, new_classified_df):
     config = EXAM_CONFIGS.get(exam_type)
     base_gh_path = f"{BASE_BANK_DIR}/{config['folder']}"
     logs = []
+    pending = {}   # GitHub 路徑 -> (檔名, 內容, 題數)
+    base_shas = {}  # GitHub 路徑 -> 合併時讀到的舊檔 blob sha（新檔為 None）
 
     for out_conf in config['outputs']:
         filename = out_conf['filename']
@@ -279,6 +304,7 @@ def save_merged_results(exam_type, new_classified_df):
 
         existing_df = pd.DataFrame()
         old_file_bytes = gh.gh_download_bytes(target_gh_path)
+        base_shas[target_gh_path] = gh_blob_cache.git_blob_sha(old_file_bytes) if old_file_bytes else None
         if old_file_bytes:
             try:
                 xls = pd.read_excel(BytesIO(old_file_bytes), sheet_name=None)
@@ -311,16 +337,33 @@ def save_merged_results(exam_type, new_classified_df):
                     safe = ch.replace("/", "_")[:30]
                     ch_df.drop(columns=["Sort"], errors="ignore").to_excel(writer, sheet_name=safe, index=False)
         
-        # 👇 這裡改了：嘗試上傳，並根據結果寫 log
-        try:
-            result = gh.gh_put_file(target_gh_path, output.getvalue(), f"Auto-Merge: {filename}")
-            
-            # 如果上傳成功 (result 不是 False)
-            if result is not False:
-                logs.append(f"✅ **{filename}**：成功上傳！更新後共 {after} 題。")
-            else:
-                logs.append(f"❌ **{filename}**：上傳失敗 (GitHub Token 權限不足或無效)。")
-        except Exception as e:
-            logs.append(f"❌ **{filename}**：上傳發生嚴重錯誤！原因：{str(e)}")
+        pending[target_gh_path] = (filename, output.getvalue(), after)
 
-    return logs
\ No newline at end of file
+    if not pending:
+        return logs
+
+    names = "、".join(name for name, _, _ in pending.values())
+    try:
+        result = gh.gh_commit_files(
+            {path: data for path, (_, data, _) in pending.items()},
+            f"Auto-Merge: {names}",
+            base_shas={path: base_shas.get(path) for path in pending},
+        )
+    except gh.GitHubConflict as e:
+        files = "、".join(pending[p][0] for p in e.paths if p in pending)
+        logs.append(f"❌ {files} 在合併期間已被其他人更新，為避免覆蓋，所有檔案皆未更新！請重新執行合併。")
+        return logs
+    except Exception as e:
+        logs.append(f"❌ 上傳發生嚴重錯誤，所有檔案皆未更新！原因：{str(e)}")
+        return logs
+
+    if not result:
+        logs.append("❌ 上傳失敗 (本機模式或 GitHub 設定不完整)。")
+        return logs
+    changed = set(result["paths"])
+    for path, (filename, _, after) in pending.items():
+        if path in changed:
+            logs.append(f"✅ **{filename}**：成功上傳！更新後共 {after} 題。")
+        else:
+            logs.append(f"ℹ️ **{filename}**：內容無變動，略過上傳（共 {after} 題）。")
+    return logs
@@ -11,7 +11,8 @@ DEFAULTS = {
     # mock exam
     "start_ts": None,
     "time_limit": 0,
-    "answers": {},
+    "answers": {},              # {題目 ID: 作答 bitmask}
+    "mock_paper_ids": [],
     "started": False,
     "show_results": False,
     "results_df": None,
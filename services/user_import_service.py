@@ -0,0 +1,142 @@
+# services/user_import_service.py
+"""
+批次匯入 / 更新員工帳號
+
+上傳 Excel 或 CSV（欄位：emp_id / name / department，可選 password；也接受中文欄名），
+先在記憶體檢查，再以 executemany 的 INSERT ... ON DUPLICATE KEY UPDATE 分批寫入。
+- 檔案內重複的 emp_id：以最後一列為準，並列入報告
+- 資料庫已有此 emp_id 但姓名不同：視為衝突，預設不覆蓋（overwrite=True 才覆蓋）
+- 未提供密碼的新帳號：逐一產生隨機初始密碼（只存雜湊），明碼清單回傳給管理員下載發放
+"""
+import secrets
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from utils import db_handler as db
+from utils import auth_store as auth
+
+BATCH_SIZE = 500
+GENERATED_PASSWORD_LEN = 10
+# 去掉容易看錯的字元（0/O、1/l/I）
+_PASSWORD_ALPHABET = "abcdefghijkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+COLUMN_ALIASES = {
+    "emp_id": ["emp_id", "員編", "員工編號", "業代", "員工業代", "帳號"],
+    "name": ["name", "姓名"],
+    "department": ["department", "部門", "單位"],
+    "password": ["password", "密碼", "初始密碼"],
+}
+
+
+def _norm_header(c) -> str:
+    return str(c).strip().lower()
+
+
+def read_user_file(filename: str, data: bytes) -> pd.DataFrame:
+    """Excel / CSV -> DataFrame[emp_id, name, department, password?]（全部轉成字串）"""
+    if filename.lower().endswith(".csv"):
+        df = pd.read_csv(BytesIO(data), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    else:
+        df = pd.read_excel(BytesIO(data), dtype=str, keep_default_na=False)
+
+    headers = {_norm_header(c): c for c in df.columns}
+    rename = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        for a in aliases:
+            if _norm_header(a) in headers:
+                rename[headers[_norm_header(a)]] = target
+                break
+    df = df.rename(columns=rename)
+    missing = [c for c in ("emp_id", "name") if c not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必要欄位：{', '.join(missing)}")
+
+    cols = [c for c in ("emp_id", "name", "department", "password") if c in df.columns]
+    df = df[cols].copy()
+    for c in cols:
+        df[c] = df[c].astype(str).str.strip()
+    return df
+
+
+def plan_import(df: pd.DataFrame, overwrite: bool = False) -> dict:
+    """
+    比對檔案與資料庫現況，回傳：
+    {"insert": [...], "update": [...], "conflicts": [...], "invalid": [...], "duplicates": [...]}
+    每一項都是 dict（conflicts 另含 existing_name）
+    """
+    invalid, rows = [], {}
+    duplicates = []
+    for i, r in enumerate(df.to_dict("records"), start=2):   # 第 1 列是標題
+        r = {k: (v or None) for k, v in r.items()}
+        if not r.get("emp_id") or not r.get("name"):
+            invalid.append({**r, "row": i, "reason": "員編或姓名空白"})
+            continue
+        if r["emp_id"] in rows:
+            duplicates.append({**r, "row": i})
+        rows[r["emp_id"]] = {**r, "row": i}
+
+    existing = db.get_users_by_ids(list(rows))
+    insert, update, conflicts = [], [], []
+    for emp_id, r in rows.items():
+        cur = existing.get(emp_id)
+        if cur is None:
+            insert.append(r)
+        elif cur["name"] != r["name"] and not overwrite:
+            conflicts.append({**r, "existing_name": cur["name"]})
+        else:
+            update.append(r)
+    return {
+        "insert": insert,
+        "update": update,
+        "conflicts": conflicts,
+        "invalid": invalid,
+        "duplicates": duplicates,
+    }
+
+
+def generate_password(length: int = GENERATED_PASSWORD_LEN) -> str:
+    return "".join(secrets.choice(_PASSWORD_ALPHABET) for _ in range(length))
+
+
+def _assign_initial_passwords(rows: list[dict]) -> list[dict]:
+    """新帳號沒有提供密碼時產生隨機密碼，回傳 [{emp_id, name, department, password}] 供管理員發放"""
+    generated = []
+    for r in rows:
+        if not r.get("password"):
+            r["password"] = generate_password()
+            generated.append({k: r.get(k) for k in ("emp_id", "name", "department", "password")})
+    return generated
+
+
+def _hash_passwords(rows: list[dict]) -> list[dict]:
+    """有提供密碼的列先算雜湊（PBKDF2 會釋放 GIL，用 thread pool 平行計算）"""
+    need = [r for r in rows if r.get("password")]
+    if not need:
+        return rows
+    with ThreadPoolExecutor() as pool:
+        hashes = list(pool.map(lambda r: auth.hash_password(r["password"]), need))
+    for r, h in zip(need, hashes):
+        r["password_hash"] = h
+    return rows
+
+
+def apply_import(plan: dict, batch_size: int = BATCH_SIZE, progress_cb=None) -> dict:
+    """
+    依 plan_import 的結果寫入（insert + update），回傳統計；
+    generated 為系統產生的初始密碼明碼清單（只在這裡出現一次，資料庫只存雜湊）
+    """
+    inserts = [dict(r) for r in plan["insert"]]
+    generated = _assign_initial_passwords(inserts)
+    rows = _hash_passwords(inserts + [dict(r) for r in plan["update"]])
+    for r in rows:
+        r.pop("password", None)
+    n_written = db.upsert_users(rows, batch_size=batch_size, progress_cb=progress_cb)
+    return {
+        "inserted": len(plan["insert"]),
+        "updated": len(plan["update"]),
+        "written": n_written,
+        "conflicts": len(plan["conflicts"]),
+        "invalid": len(plan["invalid"]),
+        "duplicates": len(plan["duplicates"]),
+        "generated": generated,
+    }
@@ -0,0 +1,111 @@
+# services/warmup_service.py
+"""
+題庫預熱 (Bank Warmup)
+
+行程啟動時（app._init_once）開一條背景 thread，
+把 services/exam_rules.CERT_CATALOG 列出的每一份題庫先下載、清洗好放進共用快取
+（utils/bank_cache + 本機快照），早上第一位學員開考時就不必等下載與解析。
+- 逐檔依序處理：背景工作不佔用 process pool，不拖慢同時間真正在等題庫的 session
+- status() 回報整體與各題庫的狀態，管理員後台可查看
+"""
+import time
+import threading
+import streamlit as st
+
+from utils import data_loader as dl
+from utils import github_handler as gh
+from services.exam_rules import CERT_CATALOG
+
+WARMUP_ENABLED = bool(st.secrets.get("BANK_WARMUP", True))
+
+
+def catalog_banks() -> list[dict]:
+    """[{cert, subject, path}]，同一路徑只列一次"""
+    seen, out = set(), []
+    for cert, conf in CERT_CATALOG.items():
+        for subject, path in conf["subjects"].items():
+            if path not in seen:
+                seen.add(path)
+                out.append({"cert": cert, "subject": subject, "path": path})
+    return out
+
+
+class BankWarmup:
+    def __init__(self, banks: list[dict]):
+        self._lock = threading.Lock()
+        self._banks = [{**b, "status": "pending"} for b in banks]
+        self.state = "idle"             # idle / running / ready / partial
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = "running"
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="bank-warmup", daemon=True)
+        self._thread.start()
+
+    def _update(self, i: int, **fields):
+        with self._lock:
+            self._banks[i].update(fields)
+
+    def _run(self):
+        try:
+            # 先取題庫目錄（一次 tree listing），之後的下載都能直接比對 sha
+            if not gh.LOCAL_MODE:
+                gh.list_bank_files()
+            for i, bank in enumerate(self._banks):
+                self._update(i, status="loading")
+                t0 = time.perf_counter()
+                try:
+                    df, timings = dl.load_banks_from_github_timed([bank["path"]])
+                except Exception as e:
+                    self._update(i, status="error", error=f"{type(e).__name__}: {e}")
+                    continue
+                t = timings[0] if timings else {}
+                self._update(
+                    i,
+                    status="ready" if df is not None else "error",
+                    source=t.get("source"),
+                    rows=t.get("rows", 0),
+                    sec=round(time.perf_counter() - t0, 3),
+                )
+        finally:
+            with self._lock:
+                ok = all(b["status"] == "ready" for b in self._banks)
+                self.state = "ready" if ok else "partial"
+                self.finished_at = time.time()
+            self._done.set()
+
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """等預熱結束（不論成功與否）；逾時回傳 False"""
+        return self._done.wait(timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            banks = [dict(b) for b in self._banks]
+            elapsed = None
+            if self.started_at:
+                elapsed = round((self.finished_at or time.time()) - self.started_at, 1)
+            return {
+                "state": self.state,
+                "ready": sum(b["status"] == "ready" for b in banks),
+                "total": len(banks),
+                "elapsed_sec": elapsed,
+                "banks": banks,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_bank_warmup() -> BankWarmup:
+    warmup = BankWarmup(catalog_banks())
+    if WARMUP_ENABLED:
+        warmup.start()
+    return warmup
@@ -0,0 +1,45 @@
+# utils/answer_bits.py
+"""
+答案的 bitmask 表示法：A=1, B=2, C=4, D=8 ...（A~Z 對應 bit 0~25）
+
+答案字串中若有非字母的雜訊（例如 "0.02"），會另外設定 INVALID_BIT，
+確保這類答案不會因為「未作答 = 空集合」而被判為答對。
+"""
+from functools import lru_cache
+import numpy as np
+
+INVALID_BIT = 1 << 31
+LETTERS = [chr(ord("A") + i) for i in range(26)]
+
+
+def labels_to_mask(labels) -> int:
+    """'AC' / ['A', 'C'] / {'A', 'C'} -> 5"""
+    if labels is None:
+        return 0
+    if isinstance(labels, float) and labels != labels:  # NaN
+        return 0
+    if isinstance(labels, (int, np.integer)) and not isinstance(labels, bool):
+        return int(labels)
+    mask = 0
+    for ch in ("".join(map(str, labels)) if not isinstance(labels, str) else labels):
+        ch = ch.upper()
+        if "A" <= ch <= "Z":
+            mask |= 1 << (ord(ch) - ord("A"))
+        elif not ch.isspace():
+            mask |= INVALID_BIT
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def _labels_tuple(mask: int) -> tuple:
+    return tuple(LETTERS[i] for i in range(26) if mask & (1 << i))
+
+
+def mask_to_labels(mask) -> list[str]:
+    """5 -> ['A', 'C']（忽略 INVALID_BIT）"""
+    return list(_labels_tuple(int(mask) & ~INVALID_BIT))
+
+
+def encode_many(values) -> np.ndarray:
+    """一次把多個答案轉成 uint32 陣列"""
+    return np.fromiter((labels_to_mask(v) for v in values), dtype=np.uint32, count=len(values))
@@ -0,0 +1,275 @@
+# utils/auth_store.py
+"""
+登入驗證 (密碼雜湊 / 使用者快取 / 登入失敗計數)
+
+- users.password 存 PBKDF2-SHA256 加鹽雜湊：pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+  尚未轉換的明文密碼登入成功時會自動改存雜湊（migration 也會一次全部轉換）
+- 使用者資料（含密碼雜湊）以 emp_id 為 key 快取在行程記憶體，TTL 到期或資料異動時失效
+- 短時間內 cache miss 太多（例如整班同時登入），改成一次 SELECT 載入全部使用者，
+  避免每個人各自打一次 MySQL；整批載入每 BULK_MIN_INTERVAL 秒最多一次
+- 不存在的 emp_id 也會短暫快取（NEGATIVE_TTL），亂猜帳號不會每次都查資料庫
+- 同一帳號連續失敗太多次會暫時鎖定；失敗紀錄會過期，總數有上限
+"""
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+import streamlit as st
+
+# =========================
+# 設定
+# =========================
+HASH_SCHEME = "pbkdf2_sha256"
+HASH_ITERATIONS = 120_000
+SALT_BYTES = 16
+
+USER_CACHE_MAX = 5000
+USER_CACHE_TTL = 600           # 秒
+BURST_MISSES = 5               # BURST_WINDOW 秒內 miss 超過此數就整批載入
+BURST_WINDOW = 2.0
+BULK_MIN_INTERVAL = 60.0       # 兩次整批載入的最短間隔（秒）
+NEGATIVE_TTL = 30.0            # 查無此帳號的結果快取幾秒
+NEGATIVE_MAX = 10000
+
+MAX_FAILED_ATTEMPTS = 5
+LOCKOUT_SEC = 300
+FAILURE_WINDOW = 900           # 最後一次失敗後多久沒再失敗就清掉計數（秒）
+MAX_TRACKED_ACCOUNTS = 10000
+
+MISSING = object()             # UserCache.get()：已知查無此帳號
+
+
+class LoginLocked(Exception):
+    """帳號因連續登入失敗而暫時鎖定"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"登入失敗次數過多，請 {int(retry_after) + 1} 秒後再試")
+        self.retry_after = retry_after
+
+
+# =========================
+# 密碼雜湊
+# =========================
+def hash_password(password: str, iterations: int = HASH_ITERATIONS) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{HASH_SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def is_hashed(stored: str | None) -> bool:
+    return isinstance(stored, str) and stored.startswith(HASH_SCHEME + "$")
+
+
+def verify_password(password: str, stored: str | None) -> bool:
+    """stored 可能是雜湊或尚未轉換的明文；NULL / 空字串（未設定密碼）一律拒絕"""
+    if not stored or password is None:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        _, iterations, salt_hex, hash_hex = stored.split("$")
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), int(iterations))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(digest.hex(), hash_hex)
+
+
+def needs_rehash(stored: str | None) -> bool:
+    if not is_hashed(stored):
+        return True
+    try:
+        return int(stored.split("$")[1]) < HASH_ITERATIONS
+    except (IndexError, ValueError):
+        return True
+
+
+# =========================
+# 使用者快取
+# =========================
+class UserCache:
+    """emp_id -> users 資料列，容量上限 + TTL 的 LRU（thread-safe）"""
+
+    def __init__(self, max_entries: int = USER_CACHE_MAX, ttl: float = USER_CACHE_TTL):
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self._items: OrderedDict = OrderedDict()   # emp_id -> (row, expires_at)
+        self._missing: OrderedDict = OrderedDict() # emp_id -> expires_at（查無此帳號）
+        self._lock = threading.Lock()
+        self._recent_misses: deque = deque()
+        self._last_bulk = None
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.bulk_loads = 0
+
+    def get(self, emp_id):
+        """回傳使用者資料列；已知不存在回傳 MISSING；快取沒有回傳 None"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(emp_id)
+            if item is not None and item[1] > now:
+                self._items.move_to_end(emp_id)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._items[emp_id]
+            expires = self._missing.get(emp_id)
+            if expires is not None:
+                if expires > now:
+                    self.negative_hits += 1
+                    return MISSING
+                del self._missing[emp_id]
+            self.misses += 1
+            self._recent_misses.append(now)
+            while self._recent_misses and self._recent_misses[0] < now - BURST_WINDOW:
+                self._recent_misses.popleft()
+            return None
+
+    def in_burst(self) -> bool:
+        """最近 BURST_WINDOW 秒內的 miss 數是否超過門檻"""
+        with self._lock:
+            return len(self._recent_misses) >= BURST_MISSES
+
+    def claim_bulk_load(self) -> bool:
+        """尖峰中且距上次整批載入超過 BULK_MIN_INTERVAL 秒才回傳 True（同時只讓一個呼叫端載入）"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._recent_misses) < BURST_MISSES:
+                return False
+            if self._last_bulk is not None and now - self._last_bulk < BULK_MIN_INTERVAL:
+                return False
+            self._last_bulk = now
+            return True
+
+    def put_missing(self, emp_id):
+        with self._lock:
+            self._missing[emp_id] = time.monotonic() + NEGATIVE_TTL
+            self._missing.move_to_end(emp_id)
+            while len(self._missing) > NEGATIVE_MAX:
+                self._missing.popitem(last=False)
+
+    def put(self, emp_id, row: dict):
+        with self._lock:
+            self._missing.pop(emp_id, None)
+            self._items[emp_id] = (row, time.monotonic() + self.ttl)
+            self._items.move_to_end(emp_id)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def put_many(self, rows: list[dict]):
+        with self._lock:
+            expires = time.monotonic() + self.ttl
+            for row in rows:
+                self._missing.pop(row["emp_id"], None)
+                self._items[row["emp_id"]] = (row, expires)
+                self._items.move_to_end(row["emp_id"])
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            self._recent_misses.clear()
+            self.bulk_loads += 1
+
+    def invalidate(self, emp_id=None):
+        """emp_id=None 表示全部失效"""
+        with self._lock:
+            if emp_id is None:
+                self._items.clear()
+                self._missing.clear()
+            else:
+                self._items.pop(emp_id, None)
+                self._missing.pop(emp_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "max_entries": self.max_entries,
+                "negative_entries": len(self._missing),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "bulk_loads": self.bulk_loads,
+            }
+
+
+# =========================
+# 登入失敗計數
+# =========================
+class AttemptLimiter:
+    """
+    每個帳號的連續失敗次數；超過上限就鎖定 LOCKOUT_SEC 秒（thread-safe）
+    最後一次失敗超過 FAILURE_WINDOW 秒的計數會清掉；追蹤的帳號數超過上限時
+    先丟已過期的，再丟最舊的未鎖定帳號（亂猜帳號灌爆表格也解不開已鎖定的帳號）
+    """
+
+    def __init__(self, max_failed: int = MAX_FAILED_ATTEMPTS, lockout_sec: float = LOCKOUT_SEC,
+                 max_tracked: int = MAX_TRACKED_ACCOUNTS):
+        self.max_failed = int(max_failed)
+        self.lockout_sec = float(lockout_sec)
+        self.max_tracked = int(max_tracked)
+        self._lock = threading.Lock()
+        self._state: OrderedDict = OrderedDict()   # emp_id -> (n_failed, locked_until, last_failed_at)
+
+    def check(self, emp_id):
+        """鎖定中就拋 LoginLocked"""
+        with self._lock:
+            _, locked_until, _ = self._state.get(emp_id, (0, 0.0, 0.0))
+            remaining = locked_until - time.monotonic()
+            if remaining > 0:
+                raise LoginLocked(remaining)
+
+    def _expired(self, entry, now) -> bool:
+        _, locked_until, last_failed = entry
+        return locked_until <= now and now - last_failed > FAILURE_WINDOW
+
+    def _prune(self, now):
+        for k in [k for k, v in self._state.items() if self._expired(v, now)]:
+            del self._state[k]
+        if len(self._state) <= self.max_tracked:
+            return
+        for k in [k for k, v in self._state.items() if v[1] <= now]:
+            if len(self._state) <= self.max_tracked:
+                return
+            del self._state[k]
+        while len(self._state) > self.max_tracked:
+            self._state.popitem(last=False)
+
+    def record(self, emp_id, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if ok:
+                self._state.pop(emp_id, None)
+                return
+            n_failed, _, last_failed = self._state.pop(emp_id, (0, 0.0, now))
+            if now - last_failed > FAILURE_WINDOW:
+                n_failed = 0
+            n_failed += 1
+            if n_failed >= self.max_failed:
+                self._state[emp_id] = (0, now + self.lockout_sec, now)
+            else:
+                self._state[emp_id] = (n_failed, 0.0, now)
+            if len(self._state) > self.max_tracked:
+                self._prune(now)
+
+    def locked_count(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for _, until, _ in self._state.values() if until > now)
+
+    def tracked_count(self) -> int:
+        with self._lock:
+            return len(self._state)
+
+
+@st.cache_resource(show_spinner=False)
+def get_user_cache() -> UserCache:
+    return UserCache(
+        int(st.secrets.get("USER_CACHE_MAX", USER_CACHE_MAX)),
+        float(st.secrets.get("USER_CACHE_TTL", USER_CACHE_TTL)),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_attempt_limiter() -> AttemptLimiter:
+    return AttemptLimiter()
@@ -0,0 +1,89 @@
+# utils/bank_cache.py
+"""
+題庫記憶體快取 (整個 Streamlit 行程共用)
+
+key = (題庫路徑, 內容 sha256, 清洗版本)
+所有 session 讀到的是同一份 DataFrame，請視為唯讀：
+需要修改時請先 .copy()，不要原地改欄位。
+"""
+import threading
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+
+DEFAULT_BUDGET_MB = 512
+
+
+def _frame_nbytes(df: pd.DataFrame) -> int:
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+class BankCache:
+    """以記憶體上限做 LRU 淘汰的題庫快取（thread-safe）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._items: OrderedDict = OrderedDict()  # key -> (df, nbytes)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        放入快取並回傳「快取中的那一份」：
+        若其他 session 已搶先放入同 key，就沿用既有物件，確保全行程只有一份。
+        """
+        if df is None:
+            return df
+        nbytes = _frame_nbytes(df)
+        with self._lock:
+            existing = self._items.get(key)
+            if existing is not None:
+                self._items.move_to_end(key)
+                return existing[0]
+
+            self._items[key] = (df, nbytes)
+            self._bytes += nbytes
+            # 超過上限：從最久沒用的開始淘汰（剛放入的不淘汰）
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, old_bytes) = self._items.popitem(last=False)
+                self._bytes -= old_bytes
+                self.evictions += 1
+            return df
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_bank_cache() -> BankCache:
+    budget_mb = st.secrets.get("BANK_CACHE_MB", DEFAULT_BUDGET_MB)
+    return BankCache(int(float(budget_mb) * 1024 * 1024))
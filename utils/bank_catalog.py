@@ -0,0 +1,133 @@
+# utils/bank_catalog.py
+"""
+題庫目錄 (Bank Catalog)
+
+一次 git/trees/{branch}?recursive=1 取得整個 repo 的檔案清單與 blob sha，
+以短 TTL 快取在行程內，供以下用途共用同一份快照：
+- list_files()：各類型的題庫檔清單（原本每個類型各打一次 contents API）
+- read_pointer()：bank_pointer.json（依 sha 記憶，內容沒變就不重新下載 / 解析）
+- blob_sha() / version：判斷題庫是否有變動；sha 已在本機 blob 快取時下載可以完全不發 request
+tree 請求本身也走 ETag 條件式 GET，TTL 到期但 repo 沒變時只花一個 304。
+"""
+import copy
+import json
+import time
+import threading
+import streamlit as st
+
+from . import gh_blob_cache as blob_cache
+
+CATALOG_TTL = float(st.secrets.get("BANK_CATALOG_TTL", 60))
+
+
+class BankCatalog:
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._files: dict = {}          # path -> blob sha
+        self._tree_sha = None
+        self._fetched_at = 0.0
+        self._pointer = (None, {})      # (sha, 解析後的 dict)
+        self.refreshes = 0
+        self.changes = 0
+        self.last_error = None
+
+    # =========================
+    # 快照
+    # =========================
+    def _fetch(self) -> tuple[str, dict]:
+        from . import github_handler as gh
+
+        tree = json.loads(gh._gh_get_cached(f"git/trees/{gh.GH_BRANCH}", params={"recursive": 1}))
+        files = {it["path"]: it["sha"] for it in tree.get("tree", []) if it.get("type") == "blob"}
+        return tree.get("sha"), files
+
+    def _ensure(self, force: bool = False):
+        with self._lock:
+            if not force and self._fetched_at and time.time() - self._fetched_at < self.ttl:
+                return
+            try:
+                tree_sha, files = self._fetch()
+            except Exception as e:
+                # 取不到新快照：沿用舊的（若有），稍後再試
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._fetched_at = time.time() if self._files else 0.0
+                return
+            changed = self._tree_sha is not None and tree_sha != self._tree_sha
+            self._tree_sha, self._files = tree_sha, files
+            self._fetched_at = time.time()
+            self.refreshes += 1
+            self.last_error = None
+        if changed:
+            self.changes += 1
+            self._on_change()
+
+    def _on_change(self):
+        # repo 有變動：清掉以路徑為 key 的下載快取，下次讀取改依新的 sha 取內容
+        from . import github_handler as gh
+
+        gh.gh_download_bytes.clear()
+
+    def invalidate(self):
+        """本行程寫入 GitHub 後呼叫，下次讀取時重新取 tree"""
+        with self._lock:
+            self._fetched_at = 0.0
+
+    @property
+    def version(self) -> str | None:
+        self._ensure()
+        return self._tree_sha
+
+    # =========================
+    # 查詢
+    # =========================
+    def blob_sha(self, path: str) -> str | None:
+        self._ensure()
+        return self._files.get(path)
+
+    def list_files(self, folder: str, suffix: str = ".xlsx") -> list[str]:
+        """folder 底下（不含子資料夾）的檔案，與原本 contents API 的結果相同"""
+        self._ensure()
+        prefix = folder.rstrip("/") + "/"
+        out = []
+        for path in self._files:
+            if not path.startswith(prefix) or "/" in path[len(prefix):]:
+                continue
+            name = path[len(prefix):]
+            if name.lower().endswith(suffix) and not name.startswith("~$"):
+                out.append(path)
+        return sorted(out)
+
+    def read_cached(self, path: str) -> bytes | None:
+        """sha 已在本機 blob 快取時直接回傳內容（不發任何 request），否則 None"""
+        return blob_cache.get_blob(self.blob_sha(path))
+
+    def read_pointer(self, path: str) -> dict:
+        sha = self.blob_sha(path)
+        if sha is None:
+            return {}
+        if self._pointer[0] == sha:
+            return copy.deepcopy(self._pointer[1])
+        from . import github_handler as gh
+
+        data = blob_cache.get_blob(sha) or gh._gh_get_cached(f"contents/{path}", raw=True)
+        conf = json.loads(data.decode("utf-8"))
+        self._pointer = (sha, conf)
+        return copy.deepcopy(conf)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tree_sha": self._tree_sha,
+                "files": len(self._files),
+                "age_sec": round(time.time() - self._fetched_at, 1) if self._fetched_at else None,
+                "ttl_sec": self.ttl,
+                "refreshes": self.refreshes,
+                "changes": self.changes,
+                "last_error": self.last_error,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_bank_catalog() -> BankCatalog:
+    return BankCatalog()
@@ -0,0 +1,130 @@
+# utils/bank_snapshot.py
+"""
+題庫快照 (Bank Snapshot)
+
+把「Excel 解析 + 清洗」後的題庫 DataFrame 以 pickle 存到本機磁碟，
+以「檔案內容 sha256 + 來源檔名 + 清洗版本」作為 key。
+同一份 .xlsx 之後再載入時直接 mmap 快照檔還原，不再經過 openpyxl。
+
+手動預先編譯（例如部署後、上傳新題庫後）：
+    python -m utils.bank_snapshot                # 編譯 bank/ 底下所有 .xlsx
+    python -m utils.bank_snapshot a.xlsx b.xlsx  # 只編譯指定檔案
+"""
+import os
+import sys
+import mmap
+import pickle
+import hashlib
+import tempfile
+import pandas as pd
+import streamlit as st
+
+# =========================
+# 設定
+# =========================
+SNAPSHOT_DIR = st.secrets.get("BANK_SNAPSHOT_DIR", ".bank_cache")
+
+
+def content_sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def snapshot_key(sha: str, source_file: str, version: int) -> str:
+    """
+    快照 key：內容雜湊 (content_sha) + 來源檔名（會寫入 SourceFile 欄位）+ 清洗版本
+    """
+    h = hashlib.sha256()
+    h.update(sha.encode("ascii"))
+    h.update(b"|")
+    h.update((source_file or "").encode("utf-8"))
+    return f"v{int(version)}_{h.hexdigest()}"
+
+
+def _snapshot_path(key: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{key}.pkl")
+
+
+# =========================
+# 讀 / 寫
+# =========================
+def load_snapshot(key: str) -> pd.DataFrame | None:
+    """找不到或快照損毀時回傳 None（呼叫端改走 Excel 解析）"""
+    path = _snapshot_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                df = pickle.loads(mm)
+        return df if isinstance(df, pd.DataFrame) else None
+    except Exception:
+        return None
+
+
+def save_snapshot(key: str, df: pd.DataFrame) -> bool:
+    """
+    先寫暫存檔再 os.replace，避免多個 worker 同時寫入時讀到半個檔案。
+    快照只是加速用，寫入失敗（例如唯讀磁碟）不影響正常流程。
+    """
+    if df is None:
+        return False
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, _snapshot_path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return True
+    except Exception:
+        return False
+
+
+def prune_snapshots(version: int) -> int:
+    """刪除非目前清洗版本的舊快照，回傳刪除數量"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return 0
+    removed = 0
+    prefix = f"v{int(version)}_"
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.endswith(".pkl") and not name.startswith(prefix):
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+# =========================
+# CLI：預先編譯
+# =========================
+def _iter_xlsx(root: str):
+    for dirpath, _, files in os.walk(root):
+        for f in sorted(files):
+            if f.lower().endswith(".xlsx") and not f.startswith("~$"):
+                yield os.path.join(dirpath, f).replace("\\", "/")
+
+
+def main(argv: list[str]) -> None:
+    from utils import data_loader as dl
+    from utils import github_handler as gh
+
+    paths = argv or list(_iter_xlsx(gh.LOCAL_BANKS_DIR))
+    for p in paths:
+        with open(p, "rb") as f:
+            data = f.read()
+        df = dl.load_bank_bytes(data, p)
+        n = 0 if df is None else len(df)
+        print(f"{p}: {n} 題")
+
+    removed = prune_snapshots(dl.NORMALIZER_VERSION)
+    if removed:
+        print(f"已清除 {removed} 個舊版本快照")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
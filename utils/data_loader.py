@@ -1,19 +1,134 @@
+import numpy as np
 import pandas as pd
-import random
 import streamlit as st
 import re
+import time
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from io import BytesIO
 from .github_handler import gh_download_bytes
+from . import xlsx_stream
+from . import bank_snapshot
+from .bank_cache import get_bank_cache
+from .question_store import get_question_store
+
+# 清洗規則 (clean_and_normalize_df / normalize_bank_df) 的版本號
+# 規則有任何輸出上的變動時請遞增，舊的題庫快照會自動失效
+NORMALIZER_VERSION = 6
+
+# 清洗完成的 DataFrame 會在 df.attrs 標記版本，再次清洗時直接略過
+NORMALIZED_ATTR = "normalizer_version"
+
+
+def is_normalized(df) -> bool:
+    return isinstance(df, pd.DataFrame) and df.attrs.get(NORMALIZED_ATTR) == NORMALIZER_VERSION
+
+
+def mark_normalized(df):
+    if isinstance(df, pd.DataFrame):
+        df.attrs[NORMALIZED_ATTR] = NORMALIZER_VERSION
+    return df
 
 # ==============================================================================
-# 核心資料清洗邏輯 (Universal Cleaner V6)
+# 核心資料清洗邏輯 (Universal Cleaner V6 - 向量化版)
 # ==============================================================================
+
+# 欄位別名（依優先順序）
+ID_ALIASES = ["編號", "題目編號", "題號", "qp_id"]
+QUESTION_ALIASES = ["題目", "題幹", "題目內容", "qp_title", "問題"]
+IMAGE_ALIASES = ["圖片", "圖檔"]
+ANSWER_ALIASES = ["Answer", "正確選項", "答案", "標準答案", "qp_right", "CorrectAnswer"]
+EXPLANATION_ALIASES = ["解答說明", "解析", "詳解", "qp_explain"]
+TAG_ALIASES = ["章節", "分類", "科目", "AI分類章節", "qp_ch"]
+
+# 選項映射表 (Label -> 可能的欄位名)
+OPTION_MAP_CONFIG = [
+    ('A', ['選項一', '選項1', 'OptionA', 'A', 'qp_a1', '答案選項1']),
+    ('B', ['選項二', '選項2', 'OptionB', 'B', 'qp_a2', '答案選項2']),
+    ('C', ['選項三', '選項3', 'OptionC', 'C', 'qp_a3', '答案選項3']),
+    ('D', ['選項四', '選項4', 'OptionD', 'D', 'qp_a4', '答案選項4']),
+    ('E', ['選項五', '選項5', 'OptionE', 'E', 'qp_a5', '答案選項5'])
+]
+
+# 數字 / 國字答案 -> 字母
+ANSWER_MAPPING = {
+    '1': 'A', '2': 'B', '3': 'C', '4': 'D', '5': 'E',
+    '一': 'A', '二': 'B', '三': 'C', '四': 'D', '五': 'E'
+}
+
+
+def _clean_col_name(c) -> str:
+    return str(c).strip().replace("\n", "").replace(" ", "")
+
+def _first_present(columns, aliases):
+    for c in aliases:
+        if c in columns:
+            return c
+    return None
+
+
+def _as_text(col: pd.Series) -> pd.Series:
+    """逐格 str()，與舊版 str(val) 行為一致（NaN -> 'nan'）"""
+    return pd.Series(np.asarray(col, dtype=object).astype(str), index=col.index, dtype=object)
+
+
+def _normalize_answer_col(col: pd.Series) -> pd.Series:
+    """強力標準化：轉字串 -> 去空白 -> 轉大寫 -> 去括號 -> 去 .0 -> 數字/國字轉字母"""
+    s = _as_text(col).str.strip().str.upper()
+    # 去除括號 (A) -> A, (1) -> 1
+    s = s.str.replace(r"[()（）]", "", regex=True)
+    # 去除小數點 1.0 -> 1
+    s = s.where(~s.str.endswith(".0"), s.str[:-2])
+    mapped = s.map(ANSWER_MAPPING)
+    return mapped.where(mapped.notna(), s).astype(object)
+
+
+def _star_answer_col(df: pd.DataFrame, option_cols: list) -> pd.Series:
+    """掃描選項開頭的星號（全形/半形）組出答案，例如 A、AC"""
+    parts = []
+    for label, cols in option_cols:
+        count = np.zeros(len(df), dtype=np.int64)
+        for col in cols:
+            raw = df[col]
+            starred = raw.notna().to_numpy() & _as_text(raw).str.strip().str.startswith(("*", "＊")).to_numpy(dtype=bool)
+            count += starred
+        parts.append(pd.Series(np.char.multiply(label, count), index=df.index, dtype=object))
+    if not parts:
+        return pd.Series("", index=df.index, dtype=object)
+    out = parts[0]
+    for p in parts[1:]:
+        out = out + p
+    return out
+
+
+def _pack_choices(df: pd.DataFrame, option_cols: list) -> list:
+    """每個 Label 取第一個有內容的別名欄位，打包成 [(Label, 文字), ...]"""
+    labels, texts = [], []
+    for label, cols in option_cols:
+        found = pd.Series(None, index=df.index, dtype=object)
+        for col in cols:
+            raw = df[col]
+            val = _as_text(raw).str.strip()
+            ok = raw.notna() & (val != "") & (val.str.lower() != "nan")
+            found = found.where(found.notna() | ~ok, val)
+        labels.append(label)
+        texts.append(found.to_numpy(dtype=object))
+
+    if not labels:
+        return [[] for _ in range(len(df))]
+    return [
+        [(lab, txt) for lab, txt in zip(labels, row) if isinstance(txt, str)]
+        for row in zip(*texts)
+    ]
+
+
 def clean_and_normalize_df(df: pd.DataFrame) -> pd.DataFrame:
     """
-    通用資料清洗函式 (V6 最終強化版)
+    通用資料清洗函式 (V6 最終強化版，整欄向量化運算)
     修正：答案欄位強力轉型 (處理 (2), 2.0, B 等雜訊)、補強題目映射
+    已清洗過 (帶有 NORMALIZED_ATTR 標記) 的 DataFrame 會原樣回傳，可重複呼叫。
     """
-    if df is None or df.empty:
+    if df is None or df.empty or is_normalized(df):
         return df
 
     # 複製以免影響原始資料
@@ -21,137 +136,68 @@ def clean_and_normalize_df(df: pd.DataFrame) -> pd.DataFrame:
 
     try:
         # 1. 清洗欄位名稱 (去除前後空白、換行)
-        df.columns = [str(c).strip().replace("\n", "").replace(" ", "") for c in df.columns]
-
-        # 2. 統一 ID 欄位
+        df.columns = [_clean_col_name(c) for c in df.columns]
+
+        # 2~4. 統一 ID / 題目 / 圖片 欄位 (別名只解析一次)
+        renames = {}
+        for target, aliases in [("ID", ID_ALIASES), ("Question", QUESTION_ALIASES), ("Image", IMAGE_ALIASES)]:
+            if target not in df.columns:
+                src = _first_present(df.columns, aliases)
+                if src:
+                    renames[src] = target
+        if renames:
+            df.rename(columns=renames, inplace=True)
         if "ID" not in df.columns:
-            for c in ["編號", "題目編號", "題號", "qp_id"]:
-                if c in df.columns:
-                    df.rename(columns={c: "ID"}, inplace=True)
-                    break
-            if "ID" not in df.columns:
-                df["ID"] = range(1, len(df) + 1)
-
-        # 3. 統一 題目 (Question) 欄位
-        if "Question" not in df.columns:
-            for c in ["題目", "題幹", "題目內容", "qp_title", "問題"]:
-                if c in df.columns:
-                    df.rename(columns={c: "Question"}, inplace=True)
-                    break
-
-        # 4. 統一 圖片 (Image) 欄位
-        if "Image" not in df.columns:
-            for c in ["圖片", "圖檔"]:
-                if c in df.columns:
-                    df.rename(columns={c: "Image"}, inplace=True)
-                    break
-
-        # 定義選項映射表 (Label -> 可能的欄位名)
-        option_map_config = [
-            ('A', ['選項一', '選項1', 'OptionA', 'A', 'qp_a1', '答案選項1']),
-            ('B', ['選項二', '選項2', 'OptionB', 'B', 'qp_a2', '答案選項2']),
-            ('C', ['選項三', '選項3', 'OptionC', 'C', 'qp_a3', '答案選項3']),
-            ('D', ['選項四', '選項4', 'OptionD', 'D', 'qp_a4', '答案選項4']),
-            ('E', ['選項五', '選項5', 'OptionE', 'E', 'qp_a5', '答案選項5'])
-        ]
-
-        # 5. 處理正確答案 (Answer) - 混合策略
-        
-        # 5a. 尋找答案欄位
-        ans_col = None
-        for c in ["Answer", "正確選項", "答案", "標準答案", "qp_right", "CorrectAnswer"]:
-            if c in df.columns:
-                ans_col = c
-                break
-        
+            df["ID"] = range(1, len(df) + 1)
+
+        # 實際存在的選項欄位 (Label -> 欄位名)
+        option_cols = [(label, [c for c in cols if c in df.columns]) for label, cols in OPTION_MAP_CONFIG]
+
+        # 5a. 處理正確答案 (Answer)
+        ans_col = _first_present(df.columns, ANSWER_ALIASES)
         if ans_col:
-            def normalize_answer(val):
-                # 強力標準化：轉字串 -> 去空白 -> 轉大寫
-                s = str(val).strip().upper()
-                # 去除括號 (A) -> A, (1) -> 1
-                s = s.replace("(", "").replace(")", "").replace("（", "").replace("）", "")
-                # 去除小數點 1.0 -> 1
-                if s.endswith(".0"): s = s[:-2]
-                
-                # 映射表
-                mapping = {
-                    '1': 'A', '2': 'B', '3': 'C', '4': 'D', '5': 'E',
-                    '一': 'A', '二': 'B', '三': 'C', '四': 'D', '五': 'E'
-                }
-                # 如果是數字鍵則轉換，否則保留原樣 (如 'A', 'AB')
-                return mapping.get(s, s)
-            
-            df["Answer"] = df[ans_col].apply(normalize_answer)
+            df["Answer"] = _normalize_answer_col(df[ans_col])
         else:
             df["Answer"] = ""
 
-        # 5b. 掃描選項中的星號 (補強：若答案欄為空或無效，再次掃描選項)
-        def extract_star_answer(row):
-            # 檢查現有答案是否有效 (必須是 A-E 或是組合)
-            current_ans = str(row.get("Answer", "")).strip()
-            # 簡單判斷：如果有內容且不是 nan，就信任它
-            if current_ans and current_ans.lower() != "nan":
-                return current_ans
-            
-            # 否則掃描選項找星號
-            stars = []
-            for label, possible_cols in option_map_config:
-                for col in possible_cols:
-                    if col in row and pd.notna(row[col]):
-                        txt = str(row[col]).strip()
-                        # 支援全形與半形星號
-                        if txt.startswith("*") or txt.startswith("＊"):
-                            stars.append(label)
-            return "".join(stars)
-
-        df["Answer"] = df.apply(extract_star_answer, axis=1)
+        # 5b. 答案欄為空或無效時，改用選項中的星號
+        current = _as_text(df["Answer"]).str.strip()
+        valid = (current != "") & (current.str.lower() != "nan")
+        if not valid.all():
+            current = current.where(valid, _star_answer_col(df, option_cols))
+        df["Answer"] = current.infer_objects()
 
         # 5c. 移除選項文字中的星號 (保持介面乾淨)
-        all_opt_cols = [col for _, cols in option_map_config for col in cols]
-        for c in all_opt_cols:
-            if c in df.columns:
-                df[c] = df[c].apply(lambda x: str(x).lstrip('*').lstrip('＊').strip() if pd.notna(x) else x)
+        for _, cols in option_cols:
+            for c in cols:
+                raw = df[c]
+                stripped = _as_text(raw).str.lstrip('*').str.lstrip('＊').str.strip()
+                df[c] = stripped.where(raw.notna(), raw).infer_objects()
 
         # 6. 強力打包選項 (Choices)
         if "Choices" not in df.columns:
-            def universal_pack(row):
-                choices = []
-                for label, possible_cols in option_map_config:
-                    found_text = None
-                    for col in possible_cols:
-                        if col in row and pd.notna(row[col]):
-                            val = str(row[col]).strip()
-                            if val and val.lower() != "nan":
-                                found_text = val
-                                break 
-                    if found_text:
-                        choices.append((label, found_text))
-                return choices
-
-            df["Choices"] = df.apply(universal_pack, axis=1)
+            df["Choices"] = _pack_choices(df, option_cols)
 
         # 7. 處理詳解
         if "Explanation" not in df.columns:
-            for c in ["解答說明", "解析", "詳解", "qp_explain"]:
-                if c in df.columns:
-                    df["Explanation"] = df[c]
-                    break
-        
+            src = _first_present(df.columns, EXPLANATION_ALIASES)
+            if src:
+                df["Explanation"] = df[src]
+
         # 8. 處理題型 (Type)
         if "Type" not in df.columns:
             if "題型" in df.columns:
                 df["Type"] = df["題型"]
             else:
-                df["Type"] = df["Answer"].apply(lambda x: "MC" if len(str(x)) > 1 else "SC")
+                df["Type"] = np.where(_as_text(df["Answer"]).str.len() > 1, "MC", "SC")
 
         # 9. 處理標籤 (Tag)
         if "Tag" not in df.columns:
-            for c in ["章節", "分類", "科目", "AI分類章節", "qp_ch"]:
-                if c in df.columns:
-                    df["Tag"] = df[c]
-                    break
+            src = _first_present(df.columns, TAG_ALIASES)
+            if src:
+                df["Tag"] = df[src]
 
-        return df
+        return mark_normalized(df)
 
     except Exception as e:
         st.error(f"資料格式清洗失敗 (clean_and_normalize_df)：{e}")
@@ -162,6 +208,8 @@ def clean_and_normalize_df(df: pd.DataFrame) -> pd.DataFrame:
 # ==============================================================================
 
 def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_file: str | None = None) -> pd.DataFrame:
+    if is_normalized(df):
+        return df
     df = clean_and_normalize_df(df)
     if not df.empty:
         if "Tag" not in df.columns or df["Tag"].all() == "":
@@ -175,7 +223,7 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
             if col not in df.columns: df[col] = ""
 
         if "Choices" in df.columns:
-            df = df[df["Choices"].apply(lambda x: len(x) >= 2)].reset_index(drop=True)
+            df = df[df["Choices"].str.len() >= 2].reset_index(drop=True)
 
     return df
 
@@ -183,118 +231,247 @@ def normalize_bank_df(df: pd.DataFrame, sheet_name: str | None = None, source_fi
 # 檔案讀取區
 # ==============================================================================
 
+def _source_file_name(file_like) -> str:
+    try:
+        source_file = getattr(file_like, "name", None) or ""
+        return source_file.replace("\\", "/").split("/")[-1]
+    except Exception:
+        return ""
+
+def _read_file_bytes(file_like) -> bytes | None:
+    """取出檔案內容 (BytesIO / UploadedFile / 路徑)，無法取得時回傳 None"""
+    try:
+        if isinstance(file_like, (bytes, bytearray)):
+            return bytes(file_like)
+        if isinstance(file_like, str):
+            with open(file_like, "rb") as f:
+                return f.read()
+        if hasattr(file_like, "getvalue"):
+            return file_like.getvalue()
+    except Exception:
+        pass
+    return None
+
+def _parse_bank(file_like, source_file: str, chunk_rows: int = xlsx_stream.DEFAULT_CHUNK_ROWS):
+    """
+    實際的 Excel 解析 + 清洗：以 openpyxl read_only 串流讀取，
+    每 chunk_rows 列清洗一次，不建立整張工作表的中間 DataFrame。
+    """
+    dfs = []
+    sheet_name, sheet_parts = None, []
+
+    def _flush_sheet():
+        if len(sheet_parts) == 1:
+            dfs.append(sheet_parts[0])
+        elif sheet_parts:
+            # 各區塊各自推斷型別，同一張表合併後再推斷一次（與整張表一次讀入的結果一致）
+            dfs.append(pd.concat(sheet_parts, ignore_index=True).infer_objects())
+
+    for sh, chunk, offset in xlsx_stream.iter_sheet_chunks(file_like, chunk_rows=chunk_rows):
+        if sh != sheet_name:
+            _flush_sheet()
+            sheet_name, sheet_parts = sh, []
+        # 沒有 ID 欄位時由清洗函式補流水號；分塊時要接續整張表的列號
+        cleaned = {_clean_col_name(c) for c in chunk.columns}
+        if "ID" not in cleaned and not any(c in cleaned for c in ID_ALIASES):
+            chunk["ID"] = range(offset + 1, offset + len(chunk) + 1)
+        norm = normalize_bank_df(chunk, sheet_name=sh, source_file=source_file)
+        if norm is not None and not norm.empty:
+            sheet_parts.append(norm)
+    _flush_sheet()
+
+    if not dfs: return None
+    return mark_normalized(pd.concat(dfs, ignore_index=True))
+
+def _parse_bank_bytes(data: bytes, source_file: str):
+    """Process pool 的工作函式（須為模組頂層函式才能被 pickle）"""
+    return _parse_bank(BytesIO(data), source_file)
+
+class _BankKeys:
+    """同一份題庫內容在記憶體快取 / 本機快照中的 key"""
+    def __init__(self, data: bytes, name: str):
+        self.name = name or ""
+        self.sha = bank_snapshot.content_sha(data)
+        self.source_file = self.name.replace("\\", "/").split("/")[-1]
+        self.cache_key = (self.name, self.sha, NORMALIZER_VERSION)
+        self.snapshot_key = bank_snapshot.snapshot_key(self.sha, self.source_file, NORMALIZER_VERSION)
+
+def _lookup_loaded(keys: _BankKeys):
+    """只查快取與快照，不解析 Excel。回傳 (df, 來源)；都沒有時 df 為 None"""
+    cache = get_bank_cache()
+    df = cache.get(keys.cache_key)
+    if df is not None:
+        return df, "cache"
+    df = bank_snapshot.load_snapshot(keys.snapshot_key)
+    if df is not None:
+        return cache.put(keys.cache_key, mark_normalized(df)), "snapshot"
+    return None, None
+
+def _store_parsed(keys: _BankKeys, df):
+    if df is None:
+        return None
+    bank_snapshot.save_snapshot(keys.snapshot_key, df)
+    return get_bank_cache().put(keys.cache_key, mark_normalized(df))
+
+def load_bank_bytes(data: bytes, name: str = ""):
+    """
+    以檔案內容載入題庫，依序查找：
+    1. 行程共用記憶體快取 (utils/bank_cache)
+    2. 本機快照 (utils/bank_snapshot)
+    3. 解析 Excel，並寫回上面兩層
+    回傳的 DataFrame 由所有 session 共用，請勿原地修改。
+    """
+    keys = _BankKeys(data, name)
+    df, _ = _lookup_loaded(keys)
+    if df is not None:
+        return df
+    try:
+        df = _parse_bank(BytesIO(data), keys.source_file)
+    except Exception as e:
+        st.error(f"讀取 Excel 發生錯誤: {e}")
+        return None
+    return _store_parsed(keys, df)
+
 def load_bank(file_like):
+    data = _read_file_bytes(file_like)
+    if data is not None:
+        name = file_like if isinstance(file_like, str) else getattr(file_like, "name", None)
+        return load_bank_bytes(data, name or "")
+
     try:
-        xls = pd.ExcelFile(file_like)
-        dfs = []
-        try:
-            source_file = getattr(file_like, "name", None) or ""
-            source_file = source_file.replace("\\", "/").split("/")[-1]
-        except: 
-            source_file = ""
-            
-        for sh in xls.sheet_names:
-            if any(x in sh for x in ["修改紀錄", "空白", "附錄", "Sheet", "工作表"]):
-                if "空白" in sh or "附錄" in sh or "修改" in sh:
-                    continue
-            raw = pd.read_excel(xls, sheet_name=sh)
-            norm = normalize_bank_df(raw, sheet_name=sh, source_file=source_file)
-            if not norm.empty:
-                dfs.append(norm)
-
-        if not dfs: return None
-        return pd.concat(dfs, ignore_index=True)
+        return _parse_bank(file_like, _source_file_name(file_like))
     except Exception as e:
         st.error(f"讀取 Excel 發生錯誤: {e}")
         return None
 
-def load_banks_from_github(paths: list[str]) -> pd.DataFrame | None:
-    dfs = []
-    for p in paths:
+# ==============================================================================
+# 多檔合併載入 (下載：thread pool；Excel 解析：process pool)
+# ==============================================================================
+
+BANK_LOAD_WORKERS = max(1, int(st.secrets.get("BANK_LOAD_WORKERS", 4)))
+
+@st.cache_resource(show_spinner=False)
+def _get_parse_pool() -> ProcessPoolExecutor:
+    # spawn：Streamlit 行程本身有多條 thread，避免 fork 帶來的鎖狀態問題
+    return ProcessPoolExecutor(max_workers=BANK_LOAD_WORKERS, mp_context=mp.get_context("spawn"))
+
+def _download_timed(path: str):
+    t0 = time.perf_counter()
+    try:
+        data = gh_download_bytes(path)
+    except Exception:
+        data = b""
+    return data, time.perf_counter() - t0
+
+def _parse_bank_bytes_timed(data: bytes, source_file: str):
+    """Process pool 工作函式：回傳 (df, 解析秒數)，解析失敗時 df 為 None"""
+    t0 = time.perf_counter()
+    try:
+        df = _parse_bank_bytes(data, source_file)
+    except Exception:
+        df = None
+    return df, time.perf_counter() - t0
+
+def _parse_misses(misses: list) -> dict:
+    """
+    misses: [(index, data, keys)]，回傳 {index: (df, 解析秒數)}
+    只有一個檔案需要解析時直接在本行程處理，省去跨行程傳輸
+    """
+    if len(misses) == 1:
+        i, data, keys = misses[0]
+        return {i: _parse_bank_bytes_timed(data, keys.source_file)}
+
+    futures = {}
+    try:
+        pool = _get_parse_pool()
+        for i, data, keys in misses:
+            futures[i] = pool.submit(_parse_bank_bytes_timed, data, keys.source_file)
+    except Exception:
+        # process pool 無法使用（例如受限環境），其餘檔案退回本行程解析
+        pass
+
+    results = {}
+    for i, data, keys in misses:
         try:
-            data = gh_download_bytes(p)
-            if not data: continue
-            bio = BytesIO(data)
-            try: bio.name = p
-            except: pass
-            df = load_bank(bio)
-            if df is None or df.empty: continue
-            dfs.append(df)
-        except: continue
-    if not dfs: return None
-    return pd.concat(dfs, ignore_index=True)
+            if i in futures:
+                results[i] = futures[i].result()
+                continue
+        except Exception:
+            pass
+        results[i] = _parse_bank_bytes_timed(data, keys.source_file)
+    return results
+
+def load_banks_from_github_timed(paths: list[str]) -> tuple[pd.DataFrame | None, list[dict]]:
+    """
+    並行下載 + 並行解析多個題庫，依 paths 順序合併。
+    另回傳每個檔案的耗時：[{path, source, download_sec, parse_sec, rows}]
+    source：cache（記憶體快取）/ snapshot（本機快照）/ parse（解析 Excel）/ error
+    """
+    paths = list(paths or [])
+    if not paths:
+        return None, []
+
+    # 1. 下載（I/O bound -> threads）
+    with ThreadPoolExecutor(max_workers=min(len(paths), BANK_LOAD_WORKERS)) as ex:
+        downloads = list(ex.map(_download_timed, paths))
+
+    timings = [
+        {"path": p, "source": "error", "download_sec": round(sec, 3), "parse_sec": 0.0, "rows": 0}
+        for p, (_, sec) in zip(paths, downloads)
+    ]
+
+    # 2. 查快取 / 快照，剩下的才送去解析（CPU bound -> processes）
+    frames = [None] * len(paths)
+    shas = [None] * len(paths)
+    misses = []
+    for i, (p, (data, _)) in enumerate(zip(paths, downloads)):
+        if not data:
+            continue
+        keys = _BankKeys(data, p)
+        shas[i] = keys.sha
+        df, source = _lookup_loaded(keys)
+        if df is not None:
+            frames[i] = df
+            timings[i]["source"] = source
+        else:
+            misses.append((i, data, keys))
+
+    miss_keys = {i: keys for i, _, keys in misses}
+    for i, (df, sec) in _parse_misses(misses).items():
+        frames[i] = _store_parsed(miss_keys[i], df)
+        timings[i]["parse_sec"] = round(sec, 3)
+        if frames[i] is not None:
+            timings[i]["source"] = "parse"
+
+    for i, df in enumerate(frames):
+        timings[i]["rows"] = 0 if df is None else len(df)
+
+    loaded = [(p, sha, df) for p, sha, df in zip(paths, shas, frames) if df is not None and not df.empty]
+    if not loaded:
+        return None, timings
+
+    # 3. 合併結果也放進共用快取，避免每個 session 各自 concat 一份
+    cache = get_bank_cache()
+    cache_key = (
+        "|".join(p for p, _, _ in loaded),
+        "+".join(sha for _, sha, _ in loaded),
+        NORMALIZER_VERSION,
+    )
+    merged = cache.get(cache_key)
+    if merged is None:
+        merged = mark_normalized(pd.concat([df for _, _, df in loaded], ignore_index=True))
+        merged = cache.put(cache_key, merged)
+    return merged, timings
+
+def load_banks_from_github(paths: list[str]) -> pd.DataFrame | None:
+    df, _ = load_banks_from_github_timed(paths)
+    return df
 
 def sample_paper(df, n, random_order=True, shuffle_options=True):
     """
     從題庫中抽選題目並生成考卷
+    （題庫索引只建一次，之後抽題為 numpy 抽索引 + 向量化洗牌選項）
     """
-    n = min(n, len(df))
-    if n <= 0: return []
-
-    # 1. 直接抽題
-    rows = df.sample(n=n, replace=False)
-    if random_order: rows = rows.sample(frac=1)
-
-    questions = []
-    for _, r in rows.iterrows():
-        # 確保 Question 欄位存在
-        q_text = r.get("Question")
-        if not q_text or pd.isna(q_text):
-            q_text = r.get("題目", "")
-            
-        choices = r.get("Choices", [])
-        if not choices: continue
-
-        # 複製一份以免影響原始參照
-        current_choices = list(choices)
-
-        # 舊答案 (字串集合)
-        raw_ans_str = str(r.get("Answer", "")).upper().strip() 
-        # 防止 nan 跑出來
-        if raw_ans_str == "NAN": raw_ans_str = ""
-
-        # 建立舊 Label 對映表
-        label_to_text = {lab: txt for lab, txt in current_choices}
-
-        # 若需要洗牌選項
-        if shuffle_options:
-            items = [txt for _, txt in current_choices]
-            random.shuffle(items)
-            
-            new_choices = []
-            new_ans_set = set()
-            
-            # 重新分配 A, B, C...
-            for idx, txt in enumerate(items):
-                new_lab = chr(ord('A') + idx)
-                new_choices.append((new_lab, txt))
-                
-                # 反查舊 Label
-                orig_label = None
-                for ol, ot in label_to_text.items():
-                    if ot == txt:
-                        orig_label = ol
-                        break
-                
-                if orig_label and orig_label in raw_ans_str:
-                    new_ans_set.add(new_lab)
-            
-            final_choices = new_choices
-            final_ans = new_ans_set
-        else:
-            final_choices = current_choices
-            final_ans = set(raw_ans_str) 
-
-        questions.append({
-            "ID": r.get("ID"),
-            "Question": q_text,
-            "Type": str(r.get("Type", "SC")).upper(),
-            "Choices": final_choices,
-            "Answer": final_ans, 
-            "Explanation": r.get("Explanation", ""),
-            "Image": r.get("Image", ""),
-            "Tag": r.get("Tag", ""),
-            "SourceFile": r.get("SourceFile", ""),
-            "SourceSheet": r.get("SourceSheet", ""),
-        })
-    return questions
+    if df is None or n <= 0 or len(df) == 0:
+        return []
+    return get_question_store(df).build_paper(n, random_order=random_order, shuffle_options=shuffle_options)
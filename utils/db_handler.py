@@ -1,27 +1,149 @@
 # utils/db_handler.py
-import mysql.connector
-from mysql.connector import Error
+import time
+import threading
+from contextlib import contextmanager
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
 import pandas as pd
 import streamlit as st
 from datetime import datetime
 import json
+import hashlib
+from . import db_migrations
+from . import auth_store as auth
+from . import sqlite_backend
 
 # =========================
-# DB Connection
+# 後端選擇：DB_BACKEND = "mysql"（預設）| "sqlite"
 # =========================
+def get_backend() -> str:
+    return str(st.secrets.get("DB_BACKEND", "mysql")).lower()
+
+
+def _sqlite_path() -> str:
+    return st.secrets.get("SQLITE_PATH", "exam.db")
+
+
+# =========================
+# DB Connection Pool（整個行程共用）
+# =========================
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 10      # 借不到連線時最多等幾秒
+_POOL_RETRY_INTERVAL = 0.05
+
+
+class _PoolStats:
+    """連線池借用統計（thread-safe）"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self.borrows = 0
+        self.waited = 0            # 需要排隊才借到的次數
+        self.total_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+        self.timeouts = 0
+        self.reconnects = 0
+
+    def record_borrow(self, wait_sec: float):
+        with self._lock:
+            self.borrows += 1
+            self.total_wait_sec += wait_sec
+            self.max_wait_sec = max(self.max_wait_sec, wait_sec)
+            if wait_sec > _POOL_RETRY_INTERVAL / 2:
+                self.waited += 1
+
+    def incr(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "borrows": self.borrows,
+                "waited": self.waited,
+                "avg_wait_ms": round(self.total_wait_sec / self.borrows * 1000, 2) if self.borrows else 0.0,
+                "max_wait_ms": round(self.max_wait_sec * 1000, 2),
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def _get_pool():
+    conf = st.secrets["mysql"]
+    pool_size = max(1, min(int(conf.get("pool_size", DEFAULT_POOL_SIZE)), pooling.CNX_POOL_MAXSIZE))
+    pool = pooling.MySQLConnectionPool(
+        pool_name="exam_pool",
+        pool_size=pool_size,
+        pool_reset_session=True,
+        host=conf["host"],
+        database=conf["database"],
+        user=conf["user"],
+        password=conf["password"],
+        port=conf.get("port", 3306),
+    )
+    return pool, _PoolStats(pool_size)
+
+
+def get_pool_stats() -> dict:
+    """連線池等待 / 重連統計（供管理頁面顯示）"""
+    if get_backend() == "sqlite":
+        return {"backend": "sqlite", "path": _sqlite_path()}
+    try:
+        _, stats = _get_pool()
+    except Exception:
+        return {}
+    return stats.snapshot()
+
+
 def get_connection():
+    """
+    從連線池借一條連線；用完照舊呼叫 conn.close() 即歸還連線池。
+    - 池子滿了會排隊等待，最多 pool_timeout 秒
+    - 借到後先檢查連線是否仍有效（MySQL wait_timeout 斷線等），失效就自動重連
+    - DB_BACKEND="sqlite" 時改開本機 SQLite（WAL 模式）連線，介面相同
+    """
+    if get_backend() == "sqlite":
+        try:
+            return sqlite_backend.connect(_sqlite_path())
+        except Exception as e:
+            st.error(f"無法開啟 SQLite 資料庫: {e}")
+            return None
+
     try:
-        conf = st.secrets["mysql"]
-        return mysql.connector.connect(
-            host=conf["host"],
-            database=conf["database"],
-            user=conf["user"],
-            password=conf["password"],
-            port=conf.get("port", 3306),
-        )
+        pool, stats = _get_pool()
+    except Error as e:
+        st.error(f"無法連接到 MySQL 資料庫: {e}")
+        return None
+
+    timeout = float(st.secrets["mysql"].get("pool_timeout", DEFAULT_POOL_TIMEOUT))
+    start = time.perf_counter()
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError:
+            if time.perf_counter() - start >= timeout:
+                stats.incr("timeouts")
+                st.error("資料庫連線忙碌中，請稍後再試。")
+                return None
+            time.sleep(_POOL_RETRY_INTERVAL)
+        except Error as e:
+            st.error(f"無法連接到 MySQL 資料庫: {e}")
+            return None
+    stats.record_borrow(time.perf_counter() - start)
+
+    try:
+        if not conn.is_connected():
+            conn.reconnect(attempts=2, delay=0)
+            stats.incr("reconnects")
     except Error as e:
+        conn.close()
         st.error(f"無法連接到 MySQL 資料庫: {e}")
         return None
+    return conn
 
 
 # =========================
@@ -31,13 +153,19 @@ def init_db():
     conn = get_connection()
     if conn is None:
         return
+    if get_backend() == "sqlite":
+        # SQLite 直接以最新 schema 建表，不走 MySQL migration
+        sqlite_backend.init_schema(conn)
+        _seed_users(conn)
+        conn.close()
+        return
     cursor = conn.cursor()
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             emp_id VARCHAR(50) PRIMARY KEY,
             name VARCHAR(50) NOT NULL,
-            password VARCHAR(100) DEFAULT '0000',
+            password VARCHAR(255) NULL DEFAULT NULL,
             department VARCHAR(50)
         )
     """)
@@ -59,43 +187,432 @@ def init_db():
         )
     """)
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS regrade_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            bank_path VARCHAR(255) NOT NULL,
+            bank_sha CHAR(64) NOT NULL,
+            bank_type VARCHAR(100) NOT NULL,
+            last_record_id INT NOT NULL DEFAULT 0,
+            processed INT NOT NULL DEFAULT 0,
+            updated INT NOT NULL DEFAULT 0,
+            status VARCHAR(20) NOT NULL DEFAULT 'running',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.close()
+    _seed_users(conn)
+
+    # 索引 / 新表等 schema 變更由 migration 管理
+    try:
+        db_migrations.apply_migrations(conn)
+    except Exception as e:
+        st.error(f"資料庫 schema 升級失敗: {e}")
+    conn.close()
+
+
+def _seed_users(conn):
+    cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM users")
     if cursor.fetchone()[0] == 0:
         cursor.executemany(
             "INSERT INTO users (emp_id, name, password, department) VALUES (%s, %s, %s, %s)",
             [
-                ("ZZ0001", "王小明", "@Zz@0001", "業務一部"),
-                ("ZZ0002", "李大華", "@Zz@0002", "業務二部"),
-                ("admin", "管理員", "admin888", "總務部"),
+                ("ZZ0001", "王小明", auth.hash_password("@Zz@0001"), "業務一部"),
+                ("ZZ0002", "李大華", auth.hash_password("@Zz@0002"), "業務二部"),
+                ("admin", "管理員", auth.hash_password("admin888"), "總務部"),
             ],
         )
         conn.commit()
-
     cursor.close()
-    conn.close()
 
 
 # =========================
 # Auth
 # =========================
-def login_user(emp_id, password):
+def _fetch_user_row(conn, emp_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        "SELECT emp_id, name, department, password FROM users WHERE emp_id=%s",
+        (emp_id,),
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def _fetch_all_user_rows(conn, limit):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT emp_id, name, department, password FROM users LIMIT %s", (int(limit),))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _lookup_user(emp_id):
+    """
+    先查行程內快取；登入尖峰（短時間大量 miss）改成一次載入全部使用者（每個時間窗最多一次），
+    查無此帳號的結果也短暫快取
+    """
+    cache = auth.get_user_cache()
+    row = cache.get(emp_id)
+    if row is auth.MISSING:
+        return None
+    if row is not None:
+        return row
+
+    conn = get_connection()
+    if not conn:
+        return None
+    try:
+        if cache.claim_bulk_load():
+            rows = _fetch_all_user_rows(conn, cache.max_entries)
+            cache.put_many(rows)
+            row = next((r for r in rows if r["emp_id"] == emp_id), None)
+            if row is None and len(rows) >= cache.max_entries:
+                row = _fetch_user_row(conn, emp_id)
+        else:
+            row = _fetch_user_row(conn, emp_id)
+    finally:
+        conn.close()
+    if row is not None:
+        cache.put(emp_id, row)
+    else:
+        cache.put_missing(emp_id)
+    return row
+
+
+def _upgrade_password_hash(emp_id, password):
+    """明文或舊參數的密碼，登入成功後改存新雜湊"""
+    new_hash = auth.hash_password(password)
     conn = get_connection()
     if not conn:
+        return
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET password=%s WHERE emp_id=%s", (new_hash, emp_id))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    auth.get_user_cache().invalidate(emp_id)
+
+
+def login_user(emp_id, password):
+    """
+    驗證帳密，成功回傳 {emp_id, name, department}，失敗回傳 None
+    連續失敗太多次會拋 auth.LoginLocked
+    """
+    limiter = auth.get_attempt_limiter()
+    limiter.check(emp_id)
+
+    row = _lookup_user(emp_id)
+    ok = row is not None and auth.verify_password(password, row.get("password"))
+    limiter.record(emp_id, ok)
+    if not ok:
         return None
+
+    if auth.needs_rehash(row.get("password")):
+        _upgrade_password_hash(emp_id, password)
+    return {"emp_id": row["emp_id"], "name": row["name"], "department": row["department"]}
+
+
+def invalidate_user_cache(emp_id=None):
+    """users 資料異動後呼叫（emp_id=None 表示全部）"""
+    auth.get_user_cache().invalidate(emp_id)
+
+
+# =========================
+# Users（批次匯入）
+# =========================
+_IN_CHUNK = 1000
+
+
+def get_users_by_ids(emp_ids) -> dict:
+    """{emp_id: {emp_id, name, department}}，IN 清單分塊查詢"""
+    emp_ids = list(dict.fromkeys(emp_ids))
+    if not emp_ids:
+        return {}
+    conn = get_connection()
+    if not conn:
+        return {}
+    out = {}
     cursor = conn.cursor(dictionary=True)
+    for i in range(0, len(emp_ids), _IN_CHUNK):
+        part = emp_ids[i:i + _IN_CHUNK]
+        cursor.execute(
+            f"SELECT emp_id, name, department FROM users WHERE emp_id IN ({','.join(['%s'] * len(part))})",
+            part,
+        )
+        for r in cursor.fetchall():
+            out[r["emp_id"]] = r
+    cursor.close()
+    conn.close()
+    return out
+
+
+def upsert_users(rows: list[dict], batch_size: int = 500, progress_cb=None) -> int:
+    """
+    批次新增 / 更新使用者：每 batch_size 筆一個 executemany + commit
+    row: {emp_id, name, department, password_hash?}
+    - 有 password_hash：INSERT ... ON DUPLICATE KEY UPDATE（含密碼）
+    - 沒有 password_hash：只 UPDATE 既有帳號的姓名 / 部門，不會建立新帳號
+      （新帳號一律要帶雜湊密碼，不落到資料表的預設密碼）
+    """
+    if not rows:
+        return 0
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("無法連接到 MySQL 資料庫")
+    cursor = conn.cursor()
+    done = 0
+    try:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            with_pw = [(r["emp_id"], r["name"], r.get("department"), r["password_hash"])
+                       for r in batch if r.get("password_hash")]
+            without_pw = [(r["name"], r.get("department"), r["emp_id"])
+                          for r in batch if not r.get("password_hash")]
+            if without_pw:
+                cursor.executemany(
+                    "UPDATE users SET name = %s, department = %s WHERE emp_id = %s",
+                    without_pw,
+                )
+            if with_pw:
+                cursor.executemany(
+                    """
+                    INSERT INTO users (emp_id, name, department, password) VALUES (%s,%s,%s,%s)
+                    ON DUPLICATE KEY UPDATE
+                        name = VALUES(name), department = VALUES(department), password = VALUES(password)
+                    """,
+                    with_pw,
+                )
+            conn.commit()
+            done += len(batch)
+            if progress_cb is not None:
+                progress_cb(done, len(rows))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+        invalidate_user_cache()
+    return done
+
+
+# =========================
+# 錯題 (questions / exam_wrong_answers)
+# =========================
+WRONG_ITEM_COLS = [
+    "ID", "Tag", "Question", "Type",
+    "Choices", "YourAnswer", "CorrectAnswer", "Explanation",
+    "SourceFile", "SourceSheet",
+]
+
+
+def wrong_items_from_df(wrong_df) -> list[dict]:
+    """wrong_df -> list[dict]（與舊版 wrong_log JSON 相同的欄位與序列化方式）"""
+    if not isinstance(wrong_df, pd.DataFrame) or wrong_df.empty:
+        return []
+    valid_cols = [c for c in WRONG_ITEM_COLS if c in wrong_df.columns]
+    return json.loads(wrong_df[valid_cols].to_json(orient="records", force_ascii=False))
+
+
+def question_key(item: dict) -> str:
+    """
+    題目的穩定 key：題庫出處 (SourceFile / SourceSheet) + 題號 + 題幹。
+    不含選項——選項洗牌後仍是同一題，顯示順序另存在 exam_wrong_answers.choice_order
+    """
+    payload = json.dumps(
+        [item.get("SourceFile") or "", item.get("SourceSheet") or "", item.get("ID"), item.get("Question")],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _canonical_choices(choices) -> tuple[list, list]:
+    """
+    顯示的選項 [(label, text), ...] -> (標準順序 [[A, text], ...], 顯示順序 [[label, 標準 index], ...])
+    標準順序依選項文字排序，和洗牌結果無關；questions 只存標準順序
+    """
+    pairs = [(str(c[0]), c[1]) for c in (choices or []) if isinstance(c, (list, tuple)) and len(c) >= 2]
+    canon_texts = sorted((t for _, t in pairs), key=lambda t: str(t))
+    free = {}
+    for idx, t in enumerate(canon_texts):
+        free.setdefault(str(t), []).append(idx)
+    order = [[label, free[str(t)].pop(0)] for label, t in pairs]
+    canon = [[chr(ord("A") + i), t] for i, t in enumerate(canon_texts)]
+    return canon, order
+
+
+def _join_labels(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return v
+    return ",".join(str(x) for x in v)
+
+
+def _split_labels(v) -> list[str]:
+    return [x for x in (v or "").split(",") if x]
+
+
+def insert_wrong_items(cursor, record_id, items: list[dict]):
+    """把一筆成績的錯題寫入 questions（去重）與 exam_wrong_answers"""
+    insert_wrong_items_bulk(cursor, {record_id: items})
+
+
+def insert_wrong_items_bulk(cursor, items_by_record: dict):
+    """多筆成績的錯題一次寫入：{record_id: [item, ...]}（各兩個 executemany）"""
+    q_rows, a_rows = {}, []
+    for record_id, items in items_by_record.items():
+        for seq, item in enumerate(items or []):
+            key = question_key(item)
+            canon, order = _canonical_choices(item.get("Choices"))
+            q_rows.setdefault(key, (
+                key,
+                None if item.get("ID") is None else str(item.get("ID")),
+                item.get("Tag"),
+                item.get("Question"),
+                item.get("Type"),
+                json.dumps(canon, ensure_ascii=False, default=str),
+                item.get("Explanation"),
+                item.get("SourceFile") or None,
+                item.get("SourceSheet") or None,
+            ))
+            a_rows.append((
+                record_id, seq, key,
+                _join_labels(item.get("YourAnswer")),
+                _join_labels(item.get("CorrectAnswer")),
+                json.dumps(order),
+            ))
+    if not a_rows:
+        return
+    cursor.executemany(
+        """
+        INSERT IGNORE INTO questions
+        (question_key, qid, tag, question, qtype, choices, explanation, source_file, source_sheet)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """,
+        list(q_rows.values()),
+    )
+    cursor.executemany(
+        """
+        INSERT INTO exam_wrong_answers
+        (record_id, seq, question_key, your_answer, correct_answer, choice_order)
+        VALUES (%s,%s,%s,%s,%s,%s)
+        """,
+        a_rows,
+    )
+
+
+def load_wrong_items(conn, record_ids) -> dict:
+    """一次讀回多筆成績的錯題：{record_id: [item, ...]}（item 格式同舊版 wrong_log）"""
+    record_ids = [int(r) for r in record_ids]
+    if not record_ids:
+        return {}
+    cursor = conn.cursor()
+    placeholders = ",".join(["%s"] * len(record_ids))
     cursor.execute(
-        "SELECT emp_id, name, department FROM users WHERE emp_id=%s AND password=%s",
-        (emp_id, password),
+        f"""
+        SELECT w.record_id, w.your_answer, w.correct_answer, w.choice_order,
+               q.qid, q.tag, q.question, q.qtype, q.choices, q.explanation,
+               q.source_file, q.source_sheet
+        FROM exam_wrong_answers w
+        JOIN questions q ON q.question_key = w.question_key
+        WHERE w.record_id IN ({placeholders})
+        ORDER BY w.record_id, w.seq
+        """,
+        record_ids,
     )
-    user = cursor.fetchone()
+    rows = cursor.fetchall()
     cursor.close()
-    conn.close()
-    return user
+
+    out = {}
+    for r in rows:
+        rid, your, correct, order, qid, tag, question, qtype, choices, explanation, src_file, src_sheet = r
+        try:
+            choices = json.loads(choices) if choices else []
+            order = json.loads(order) if order else None
+        except (TypeError, ValueError):
+            choices, order = [], None
+        if order is not None:
+            # 依作答當時的顯示順序還原選項（your_answer / correct_answer 的代號對應這個順序）
+            choices = [[label, choices[i][1]] for label, i in order if 0 <= i < len(choices)]
+        out.setdefault(int(rid), []).append({
+            "ID": qid,
+            "Tag": tag,
+            "Question": question,
+            "Type": qtype,
+            "Choices": choices,
+            "YourAnswer": _split_labels(your),
+            "CorrectAnswer": _split_labels(correct),
+            "Explanation": explanation,
+            "SourceFile": src_file or "",
+            "SourceSheet": src_sheet or "",
+        })
+    return out
+
+
+def parse_wrong_log(v) -> list[dict]:
+    if not v:
+        return []
+    try:
+        data = json.loads(v)
+    except (TypeError, ValueError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def get_record_wrong_items(record_id) -> list[dict]:
+    """單筆成績的錯題（歷史頁面點選某一列時才讀取）"""
+    conn = get_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor()
+    try:
+        items = load_wrong_items(conn, [record_id]).get(int(record_id))
+        if items is None:
+            # 尚未搬移的舊資料仍存在 records.wrong_log
+            cursor.execute("SELECT wrong_log FROM records WHERE id=%s", (int(record_id),))
+            row = cursor.fetchone()
+            items = parse_wrong_log(row[0]) if row else []
+        return items
+    finally:
+        cursor.close()
+        conn.close()
 
 
 # =========================
 # Save Exam Record
 # =========================
+_INSERT_RECORD = """
+    INSERT INTO records
+    (emp_id, department, bank_type, score, duration_seconds, wrong_log, exam_date,
+     section_scores, total_score, passed, fail_reason, client_uuid)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+
+
+def _record_params(emp_id, department, bank_type, score, duration, exam_date, section_scores,
+                   total_score, passed, fail_reason, client_uuid=None) -> tuple:
+    return (
+        emp_id,
+        department,
+        bank_type,
+        score,
+        int(duration),
+        None,               # 錯題改存 exam_wrong_answers，不再塞進 records
+        exam_date,
+        json.dumps(section_scores, ensure_ascii=False) if section_scores else None,
+        total_score,
+        passed,
+        fail_reason,
+        client_uuid,
+    )
+
+
 def save_exam_record(
     emp_id,
     bank_type,
@@ -112,41 +629,90 @@ def save_exam_record(
         return
     cursor = conn.cursor()
 
-    if isinstance(wrong_df, pd.DataFrame) and not wrong_df.empty:
-        desired_cols = [
-            "ID", "Tag", "Question", "Type",
-            "Choices", "YourAnswer", "CorrectAnswer", "Explanation"
-        ]
-        valid_cols = [c for c in desired_cols if c in wrong_df.columns]
-        wrong_json = wrong_df[valid_cols].to_json(orient="records", force_ascii=False)
-    else:
-        wrong_json = "[]"
+    wrong_items = wrong_items_from_df(wrong_df)
+    exam_date = datetime.now()
 
-    stmt = """
-        INSERT INTO records
-        (emp_id, bank_type, score, duration_seconds, wrong_log, exam_date,
-         section_scores, total_score, passed, fail_reason)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    try:
+        with _daily_stats_lock(conn):
+            department = _departments_of(cursor, [emp_id]).get(emp_id)
+            cursor.execute(
+                _INSERT_RECORD,
+                _record_params(emp_id, department, bank_type, score, duration, exam_date, section_scores,
+                               total_score, passed, fail_reason),
+            )
+            insert_wrong_items(cursor, cursor.lastrowid, wrong_items)
+            bump_daily_stats(cursor, department, bank_type, exam_date, score, passed, section_scores)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def save_exam_records_batch(entries: list[dict]) -> int:
     """
+    一個 transaction 寫入多筆成績（寫入佇列使用），回傳實際新增的筆數
+    entry: {client_uuid, emp_id, bank_type, score, duration, exam_date,
+            section_scores, total_score, passed, fail_reason, wrong_items}
+    以 client_uuid 去重：同一批重送（例如 commit 後行程中斷）不會重複寫入
+    """
+    if not entries:
+        return 0
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("無法連接到 MySQL 資料庫")
+    cursor = conn.cursor()
+    try:
+        with _daily_stats_lock(conn):
+            return _save_records_batch(conn, cursor, entries)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
 
-    cursor.execute(
-        stmt,
-        (
-            emp_id,
-            bank_type,
-            score,
-            int(duration),
-            wrong_json,
-            datetime.now(),
-            json.dumps(section_scores, ensure_ascii=False) if section_scores else None,
-            total_score,
-            passed,
-            fail_reason,
-        ),
-    )
+
+def _save_records_batch(conn, cursor, entries: list[dict]) -> int:
+    uuids = [e["client_uuid"] for e in entries]
+    placeholders = ",".join(["%s"] * len(uuids))
+    cursor.execute(f"SELECT client_uuid FROM records WHERE client_uuid IN ({placeholders})", uuids)
+    existing = {r[0] for r in cursor.fetchall()}
+
+    new, seen = [], set(existing)
+    for e in entries:
+        if e["client_uuid"] not in seen:
+            seen.add(e["client_uuid"])
+            new.append(e)
+    if not new:
+        conn.rollback()
+        return 0
+
+    for e in new:
+        if isinstance(e["exam_date"], str):
+            e["exam_date"] = datetime.fromisoformat(e["exam_date"])
+    departments = _departments_of(cursor, [e["emp_id"] for e in new])
+    cursor.executemany(_INSERT_RECORD, [
+        _record_params(e["emp_id"], departments.get(e["emp_id"]), e["bank_type"], e["score"], e["duration"],
+                       e["exam_date"], e.get("section_scores"), e.get("total_score"), e.get("passed"),
+                       e.get("fail_reason"), e["client_uuid"])
+        for e in new
+    ])
+
+    new_uuids = [e["client_uuid"] for e in new]
+    placeholders = ",".join(["%s"] * len(new_uuids))
+    cursor.execute(f"SELECT client_uuid, id FROM records WHERE client_uuid IN ({placeholders})", new_uuids)
+    ids = {u: int(rid) for u, rid in cursor.fetchall()}
+
+    insert_wrong_items_bulk(cursor, {ids[e["client_uuid"]]: e.get("wrong_items") for e in new})
+    bump_daily_stats_bulk(cursor, [
+        (departments.get(e["emp_id"]), e["bank_type"], e["exam_date"], e["score"], e.get("passed"), e.get("section_scores"))
+        for e in new
+    ])
     conn.commit()
-    cursor.close()
-    conn.close()
+    return len(new)
 
 
 # =========================
@@ -161,7 +727,7 @@ def get_user_history(emp_id):
         SELECT
             id, bank_type, score, total_score,
             section_scores, passed, fail_reason,
-            duration_seconds, exam_date, wrong_log
+            duration_seconds, exam_date
         FROM records
         WHERE emp_id = %s
         ORDER BY exam_date DESC
@@ -191,3 +757,506 @@ def get_all_history():
     df = pd.read_sql(query, conn)
     conn.close()
     return df
+
+
+HISTORY_PAGE_SIZE = 100
+_HISTORY_COLS = """
+    r.id, u.emp_id, u.name, u.department,
+    r.bank_type, r.score, r.total_score,
+    r.passed, r.fail_reason, r.duration_seconds, r.exam_date
+"""
+
+
+def _history_where(filters: dict | None) -> tuple[list[str], list]:
+    """
+    管理員報表的篩選條件（全部在 MySQL 端過濾）
+    filters: {"departments": [...], "bank_types": [...], "date_from": date, "date_to": date, "passed": 0/1}
+    """
+    filters = filters or {}
+    where, params = [], []
+    deps = [d for d in (filters.get("departments") or []) if d]
+    if deps:
+        where.append(f"u.department IN ({','.join(['%s'] * len(deps))})")
+        params.extend(deps)
+    banks = [b for b in (filters.get("bank_types") or []) if b]
+    if banks:
+        where.append(f"r.bank_type IN ({','.join(['%s'] * len(banks))})")
+        params.extend(banks)
+    if filters.get("date_from") is not None:
+        where.append("r.exam_date >= %s")
+        params.append(filters["date_from"])
+    if filters.get("date_to") is not None:
+        # date_to 含當天：以「隔天 00:00 之前」比較
+        where.append("r.exam_date < DATE_ADD(%s, INTERVAL 1 DAY)")
+        params.append(filters["date_to"])
+    if filters.get("passed") is not None:
+        where.append("r.passed = %s")
+        params.append(int(filters["passed"]))
+    return where, params
+
+
+def get_history_page(filters=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    管理員報表分頁：以 (exam_date, id) 做 keyset（新到舊），不用 OFFSET
+    after: 上一頁最後一筆的 (exam_date, id)；None 表示第一頁
+    回傳 (DataFrame, 下一頁的 after；沒有下一頁則為 None)
+    """
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame(), None
+
+    where, params = _history_where(filters)
+    if after is not None:
+        where.append("(r.exam_date < %s OR (r.exam_date = %s AND r.id < %s))")
+        params.extend([after[0], after[0], int(after[1])])
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        f"""
+        SELECT {_HISTORY_COLS}
+        FROM records r
+        JOIN users u ON r.emp_id = u.emp_id
+        {where_sql}
+        ORDER BY r.exam_date DESC, r.id DESC
+        LIMIT %s
+        """,
+        params + [int(limit) + 1],
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = (rows[-1]["exam_date"], int(rows[-1]["id"])) if has_more else None
+    return pd.DataFrame(rows), next_after
+
+
+def iter_history_chunks(filters=None, chunk_size=1000):
+    """依相同篩選條件逐頁讀取（每次一個 DataFrame），匯出時不需一次載入全部"""
+    after = None
+    while True:
+        df, after = get_history_page(filters, after=after, limit=chunk_size)
+        if not df.empty:
+            yield df
+        if after is None:
+            return
+
+
+def count_history(filters=None) -> int:
+    """
+    符合篩選條件的筆數：與 get_history_page 使用同一組 _history_where / JOIN，總數與分頁一定一致。
+    只用到 records 的 (exam_date, emp_id, bank_type, ..., passed) 覆蓋索引與 users 主鍵，不讀資料列本身
+    """
+    conn = get_connection()
+    if not conn:
+        return 0
+    where, params = _history_where(filters)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT COUNT(*)
+        FROM records r
+        JOIN users u ON r.emp_id = u.emp_id
+        {where_sql}
+        """,
+        params,
+    )
+    n = int(cursor.fetchone()[0])
+    cursor.close()
+    conn.close()
+    return n
+
+
+def get_history_filter_options() -> dict:
+    """報表篩選器的選項（部門 / 題庫類型）"""
+    conn = get_connection()
+    if not conn:
+        return {"departments": [], "bank_types": []}
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT department FROM users WHERE department IS NOT NULL ORDER BY department")
+    departments = [r[0] for r in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT bank_type FROM records WHERE bank_type IS NOT NULL ORDER BY bank_type")
+    bank_types = [r[0] for r in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return {"departments": departments, "bank_types": bank_types}
+
+
+# =========================
+# Analytics（每日彙總：日期 x 部門 x 題庫）
+# =========================
+SECTION_BUCKET_WIDTH = 10      # 分節分數直方圖的級距（0-9, 10-19, ..., 100）
+_DAILY_STATS_LOCK = "exam_daily_stats"
+DAILY_STATS_LOCK_TIMEOUT = 120  # 秒；重建彙總表期間寫入成績最多等這麼久（寫入佇列失敗會再重試）
+
+_UPSERT_DAILY = """
+    INSERT INTO daily_exam_stats
+    (stat_date, department, bank_type, n_exams, n_passed, score_sum)
+    VALUES (%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        n_exams = n_exams + VALUES(n_exams),
+        n_passed = n_passed + VALUES(n_passed),
+        score_sum = score_sum + VALUES(score_sum)
+"""
+
+_UPSERT_SECTION = """
+    INSERT INTO daily_section_stats
+    (stat_date, department, bank_type, section, bucket, n, score_sum)
+    VALUES (%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE
+        n = n + VALUES(n),
+        score_sum = score_sum + VALUES(score_sum)
+"""
+
+
+def _section_bucket(v: float) -> int:
+    return int(max(0.0, float(v)) // SECTION_BUCKET_WIDTH) * SECTION_BUCKET_WIDTH
+
+
+def _stat_rows(stat_date, department, bank_type, score, passed, section_scores):
+    """一筆成績 -> (daily_exam_stats 列, [daily_section_stats 列, ...])"""
+    key = (stat_date, department or "", bank_type or "")
+    daily = key + (1, 1 if passed in (1, True) else 0, float(score or 0))
+    if isinstance(section_scores, str):
+        try:
+            section_scores = json.loads(section_scores)
+        except (TypeError, ValueError):
+            section_scores = None
+    sections = []
+    if isinstance(section_scores, dict):
+        for name, v in section_scores.items():
+            try:
+                v = float(v)
+            except (TypeError, ValueError):
+                continue
+            sections.append(key + (str(name), _section_bucket(v), 1, v))
+    return daily, sections
+
+
+def _accumulate(daily: dict, sections: dict, drow, srows):
+    """同一個 key 的列先在記憶體加總，寫入時每個 key 只 upsert 一次"""
+    acc = daily.get(drow[:3], (0, 0, 0.0))
+    daily[drow[:3]] = (acc[0] + drow[3], acc[1] + drow[4], acc[2] + drow[5])
+    for sr in srows:
+        acc = sections.get(sr[:5], (0, 0.0))
+        sections[sr[:5]] = (acc[0] + sr[5], acc[1] + sr[6])
+
+
+def _departments_of(cursor, emp_ids) -> dict:
+    """{emp_id: 目前部門}；寫入成績時存進 records.department，之後換部門不影響舊成績的彙總"""
+    emp_ids = sorted(set(emp_ids))
+    if not emp_ids:
+        return {}
+    placeholders = ",".join(["%s"] * len(emp_ids))
+    cursor.execute(f"SELECT emp_id, department FROM users WHERE emp_id IN ({placeholders})", emp_ids)
+    return dict(cursor.fetchall())
+
+
+@contextmanager
+def _daily_stats_lock(conn, timeout: int = DAILY_STATS_LOCK_TIMEOUT):
+    """
+    彙總表的寫入鎖（MySQL GET_LOCK，跨行程）：寫入成績 + 累加彙總表、與全量重建彙總表互斥，
+    重建期間 commit 的累加不會被重建時的 DELETE 蓋掉。
+    SQLite 本身只允許一個 writer（重建時先 DELETE 就取得寫入鎖），這裡不做事。
+    """
+    if get_backend() == "sqlite":
+        yield
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (_DAILY_STATS_LOCK, int(timeout)))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("等待彙總表寫入鎖逾時")
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_DAILY_STATS_LOCK,))
+        cursor.fetchone()
+        cursor.close()
+
+
+def bump_daily_stats(cursor, department, bank_type, exam_date, score, passed, section_scores):
+    """save_exam_record 同一個 transaction 內累加彙總表（O(分節數) 筆 upsert）"""
+    bump_daily_stats_bulk(cursor, [(department, bank_type, exam_date, score, passed, section_scores)])
+
+
+def bump_daily_stats_bulk(cursor, rows):
+    """
+    多筆成績一次累加彙總表（呼叫端需持有 _daily_stats_lock）
+    rows: [(考試當時的 department, bank_type, exam_date, score, passed, section_scores), ...]
+    """
+    if not rows:
+        return
+    daily, sections = {}, {}
+    for department, bank_type, exam_date, score, passed, section_scores in rows:
+        drow, srows = _stat_rows(exam_date.date(), department, bank_type, score, passed, section_scores)
+        _accumulate(daily, sections, drow, srows)
+    cursor.executemany(_UPSERT_DAILY, [k + v for k, v in daily.items()])
+    if sections:
+        cursor.executemany(_UPSERT_SECTION, [k + v for k, v in sections.items()])
+
+
+def rebuild_daily_stats(cursor, chunk_size: int = 2000):
+    """
+    由 records 全量重建彙總表（重新計分之後、或管理員手動重建；呼叫端需持有 _daily_stats_lock）
+    部門取 records.department（考試當時），與 bump_daily_stats 累加時相同，重建不會改變數字。
+    先 DELETE 再以 id keyset 分塊讀取，在記憶體中加總後一次寫入
+    """
+    cursor.execute("DELETE FROM daily_exam_stats")
+    cursor.execute("DELETE FROM daily_section_stats")
+
+    daily, sections = {}, {}
+    last_id = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT id, DATE(exam_date), department, bank_type,
+                   score, passed, section_scores
+            FROM records
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (last_id, chunk_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for rid, d, dep, bank, score, passed, sec in rows:
+            if d is None:
+                continue
+            drow, srows = _stat_rows(d, dep, bank, score, passed, sec)
+            _accumulate(daily, sections, drow, srows)
+        last_id = int(rows[-1][0])
+
+    if daily:
+        cursor.executemany(_UPSERT_DAILY, [k + v for k, v in daily.items()])
+    if sections:
+        cursor.executemany(_UPSERT_SECTION, [k + v for k, v in sections.items()])
+
+
+def refresh_daily_stats():
+    """重建彙總表（自成一個 transaction，期間寫入成績的一方會等待彙總表寫入鎖）"""
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("無法連接到 MySQL 資料庫")
+    cursor = conn.cursor()
+    try:
+        with _daily_stats_lock(conn):
+            rebuild_daily_stats(cursor)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _stats_where(date_from=None, date_to=None, departments=None, bank_types=None):
+    where, params = [], []
+    if date_from is not None:
+        where.append("stat_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        where.append("stat_date <= %s")
+        params.append(date_to)
+    deps = [d for d in (departments or []) if d is not None]
+    if deps:
+        where.append(f"department IN ({','.join(['%s'] * len(deps))})")
+        params.extend(deps)
+    banks = [b for b in (bank_types or []) if b]
+    if banks:
+        where.append(f"bank_type IN ({','.join(['%s'] * len(banks))})")
+        params.extend(banks)
+    return (f"WHERE {' AND '.join(where)}" if where else ""), params
+
+
+def get_pass_rate_summary(date_from=None, date_to=None, departments=None, bank_types=None):
+    """部門 x 題庫的考試次數 / 合格率 / 平均分數（只讀彙總表）"""
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame()
+    where_sql, params = _stats_where(date_from, date_to, departments, bank_types)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        f"""
+        SELECT department, bank_type,
+               SUM(n_exams) AS n_exams,
+               SUM(n_passed) AS n_passed,
+               SUM(n_passed) * 1.0 / SUM(n_exams) AS pass_rate,
+               SUM(score_sum) * 1.0 / SUM(n_exams) AS avg_score
+        FROM daily_exam_stats
+        {where_sql}
+        GROUP BY department, bank_type
+        ORDER BY department, bank_type
+        """,
+        params,
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return pd.DataFrame(rows)
+
+
+def get_section_summary(date_from=None, date_to=None, departments=None, bank_types=None):
+    """
+    分節平均分數與直方圖（只讀彙總表）
+    回傳 (平均 DataFrame[section, n, avg_score], 直方圖 DataFrame[section, bucket, n])
+    """
+    conn = get_connection()
+    if not conn:
+        return pd.DataFrame(), pd.DataFrame()
+    where_sql, params = _stats_where(date_from, date_to, departments, bank_types)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        f"""
+        SELECT section, bucket, SUM(n) AS n, SUM(score_sum) AS score_sum
+        FROM daily_section_stats
+        {where_sql}
+        GROUP BY section, bucket
+        ORDER BY section, bucket
+        """,
+        params,
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    hist = pd.DataFrame(rows, columns=["section", "bucket", "n", "score_sum"])
+    if hist.empty:
+        return pd.DataFrame(columns=["section", "n", "avg_score"]), hist[["section", "bucket", "n"]]
+    hist["n"] = hist["n"].astype(int)
+    hist["score_sum"] = hist["score_sum"].astype(float)
+    avg = hist.groupby("section", as_index=False)[["n", "score_sum"]].sum()
+    avg["avg_score"] = avg["score_sum"] / avg["n"]
+    return avg[["section", "n", "avg_score"]], hist[["section", "bucket", "n"]]
+
+
+# =========================
+# Regrade（題庫答案修正後重新計分）
+# =========================
+def create_regrade_job(bank_path, bank_sha, bank_type):
+    """同一份題庫版本若已有未完成的工作就沿用（可續跑），否則新建"""
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """
+        SELECT * FROM regrade_jobs
+        WHERE bank_path=%s AND bank_sha=%s AND bank_type=%s AND status <> 'done'
+        ORDER BY id DESC LIMIT 1
+        """,
+        (bank_path, bank_sha, bank_type),
+    )
+    job = cursor.fetchone()
+    if job is None:
+        cursor.execute(
+            "INSERT INTO regrade_jobs (bank_path, bank_sha, bank_type) VALUES (%s,%s,%s)",
+            (bank_path, bank_sha, bank_type),
+        )
+        conn.commit()
+        cursor.execute("SELECT * FROM regrade_jobs WHERE id=%s", (cursor.lastrowid,))
+        job = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return job
+
+
+def get_regrade_job(job_id):
+    conn = get_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM regrade_jobs WHERE id=%s", (job_id,))
+    job = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return job
+
+
+def get_max_record_id(bank_type) -> int:
+    """該類別最大的 record id（走 (bank_type, id) 索引，供重新計分估計進度）"""
+    conn = get_connection()
+    if not conn:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM records WHERE bank_type=%s", (bank_type,))
+    n = int(cursor.fetchone()[0])
+    cursor.close()
+    conn.close()
+    return n
+
+
+def fetch_records_after(bank_type, after_id, limit):
+    """以 id 做 keyset 分頁讀取成績紀錄（不用 OFFSET，避免越翻越慢）"""
+    conn = get_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """
+        SELECT id, section_scores, wrong_log
+        FROM records
+        WHERE bank_type=%s AND id > %s
+        ORDER BY id
+        LIMIT %s
+        """,
+        (bank_type, int(after_id), int(limit)),
+    )
+    rows = cursor.fetchall()
+    items = load_wrong_items(conn, [r["id"] for r in rows])
+    for r in rows:
+        r["wrong_items"] = items.get(int(r["id"]))
+        if r["wrong_items"] is None:
+            r["wrong_items"] = parse_wrong_log(r.pop("wrong_log", None))
+    cursor.close()
+    conn.close()
+    return rows
+
+
+def apply_regrade_chunk(job_id, updates, wrong_items, last_record_id, n_processed, done=False):
+    """
+    同一個 transaction 內寫回成績與錯題，並推進 regrade_jobs 的進度，
+    中斷後從 last_record_id 續跑不會重複計分
+    updates: [(score, section_scores_json, total_score, passed, fail_reason, record_id), ...]
+    wrong_items: {record_id: [item, ...]}（重新計分後的完整錯題清單）
+    """
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("無法連接到 MySQL 資料庫")
+    cursor = conn.cursor()
+    try:
+        if updates:
+            cursor.executemany(
+                """
+                UPDATE records
+                SET score=%s, section_scores=%s, total_score=%s, passed=%s, fail_reason=%s, wrong_log=NULL
+                WHERE id=%s
+                """,
+                updates,
+            )
+        if wrong_items:
+            ids = [int(r) for r in wrong_items]
+            placeholders = ",".join(["%s"] * len(ids))
+            cursor.execute(f"DELETE FROM exam_wrong_answers WHERE record_id IN ({placeholders})", ids)
+            insert_wrong_items_bulk(cursor, wrong_items)
+        cursor.execute(
+            """
+            UPDATE regrade_jobs
+            SET last_record_id=%s, processed=processed+%s, updated=updated+%s, status=%s
+            WHERE id=%s
+            """,
+            (int(last_record_id), int(n_processed), len(updates), "done" if done else "running", job_id),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,397 @@
+# utils/db_migrations.py
+"""
+資料庫 schema 版本管理 (Migrations)
+
+init_db 只負責建基本表；之後所有 schema 變更（索引、新表、回填資料）
+都以「版本號 + 步驟」加在 MIGRATIONS 最後面，套用過的版本記錄在 schema_migrations。
+- 步驟可以是 SQL 字串，或接收 cursor 的函式（用於回填資料）
+- 已存在的索引（手動建過）會被略過，不會讓整個 migration 失敗
+- 以 MySQL GET_LOCK 避免多個 worker 同時套用
+
+手動執行：
+    python -m utils.db_migrations
+"""
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error
+
+_LOCK_NAME = "exam_schema_migrations"
+_LOCK_TIMEOUT = 30
+
+# 與 db_handler 寫入成績 / 重建彙總表共用的鎖名稱
+_DAILY_STATS_LOCK = "exam_daily_stats"
+
+# MySQL 錯誤碼：重複的索引名稱 / 重複的欄位名稱（已套用過，可略過）
+_IGNORABLE_ERRNOS = {1061, 1060}
+
+# 搬移舊 wrong_log 時每次處理的筆數
+_BACKFILL_CHUNK = 500
+
+
+# 回填步驟不呼叫 db_handler 的寫入函式：那些函式的欄位清單會跟著之後的 migration 改變，
+# 套用較舊的版本時新欄位還不存在。這裡的 SQL 只用到該版本當時已有的欄位。
+def _backfill_wrong_answers(cursor):
+    """
+    把舊的 records.wrong_log 以 id keyset 分塊搬進 exam_wrong_answers，搬完清成 NULL
+    （v10：需要 v9 的 choice_order / source_file / source_sheet 欄位）
+    """
+    from utils import db_handler as db
+
+    last_id = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT id, wrong_log FROM records
+            WHERE id > %s AND wrong_log IS NOT NULL
+            ORDER BY id LIMIT %s
+            """,
+            (last_id, _BACKFILL_CHUNK),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        ids = [int(r[0]) for r in rows]
+        placeholders = ",".join(["%s"] * len(ids))
+        cursor.execute(f"DELETE FROM exam_wrong_answers WHERE record_id IN ({placeholders})", ids)
+
+        q_rows, a_rows = {}, []
+        for rid, wl in rows:
+            for seq, item in enumerate(db.parse_wrong_log(wl)):
+                key = db.question_key(item)
+                canon, order = db._canonical_choices(item.get("Choices"))
+                q_rows.setdefault(key, (
+                    key,
+                    None if item.get("ID") is None else str(item.get("ID")),
+                    item.get("Tag"), item.get("Question"), item.get("Type"),
+                    json.dumps(canon, ensure_ascii=False, default=str),
+                    item.get("Explanation"),
+                    item.get("SourceFile") or None, item.get("SourceSheet") or None,
+                ))
+                a_rows.append((
+                    int(rid), seq, key,
+                    db._join_labels(item.get("YourAnswer")), db._join_labels(item.get("CorrectAnswer")),
+                    json.dumps(order),
+                ))
+        if a_rows:
+            cursor.executemany(
+                """
+                INSERT IGNORE INTO questions
+                (question_key, qid, tag, question, qtype, choices, explanation, source_file, source_sheet)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                """,
+                list(q_rows.values()),
+            )
+            cursor.executemany(
+                """
+                INSERT INTO exam_wrong_answers
+                (record_id, seq, question_key, your_answer, correct_answer, choice_order)
+                VALUES (%s,%s,%s,%s,%s,%s)
+                """,
+                a_rows,
+            )
+        cursor.execute(f"UPDATE records SET wrong_log=NULL WHERE id IN ({placeholders})", ids)
+        last_id = ids[-1]
+
+
+def _section_bucket_v6(v: float) -> int:
+    return int(max(0.0, v) // 10) * 10
+
+
+def _rollup_records(cursor, select_sql: str):
+    """
+    以 id keyset 分塊讀 records，加總後寫入每日彙總表（只用 v6 彙總表的欄位）
+    select_sql 需回傳 (id, 日期, 部門, bank_type, score, passed, section_scores)，參數為 (last_id, limit)
+    """
+    daily, sections = {}, {}
+    last_id = 0
+    while True:
+        cursor.execute(select_sql, (last_id, _BACKFILL_CHUNK))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for _, d, dep, bank, score, passed, sec in rows:
+            if d is None:
+                continue
+            key = (d, dep or "", bank or "")
+            n, n_passed, total = daily.get(key, (0, 0, 0.0))
+            daily[key] = (n + 1, n_passed + (1 if passed in (1, True) else 0), total + float(score or 0))
+            try:
+                sec = json.loads(sec) if isinstance(sec, str) else sec
+            except ValueError:
+                sec = None
+            for name, v in (sec.items() if isinstance(sec, dict) else []):
+                try:
+                    v = float(v)
+                except (TypeError, ValueError):
+                    continue
+                skey = key + (str(name), _section_bucket_v6(v))
+                n, total = sections.get(skey, (0, 0.0))
+                sections[skey] = (n + 1, total + v)
+        last_id = int(rows[-1][0])
+
+    if daily:
+        cursor.executemany(
+            """
+            INSERT INTO daily_exam_stats (stat_date, department, bank_type, n_exams, n_passed, score_sum)
+            VALUES (%s,%s,%s,%s,%s,%s)
+            """,
+            [k + v for k, v in daily.items()],
+        )
+    if sections:
+        cursor.executemany(
+            """
+            INSERT INTO daily_section_stats (stat_date, department, bank_type, section, bucket, n, score_sum)
+            VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """,
+            [k + v for k, v in sections.items()],
+        )
+
+
+def _backfill_daily_stats(cursor):
+    """v6：由 records 回填每日彙總表（部門取 users 目前的部門）"""
+    _rollup_records(cursor, """
+        SELECT r.id, DATE(r.exam_date), u.department, r.bank_type,
+               r.score, r.passed, r.section_scores
+        FROM records r
+        LEFT JOIN users u ON r.emp_id = u.emp_id
+        WHERE r.id > %s
+        ORDER BY r.id
+        LIMIT %s
+    """)
+
+
+def _backfill_record_departments(cursor):
+    """v11：既有成績的 records.department 以目前的部門補上（之後的成績寫入時就記錄）"""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+    max_id = int(cursor.fetchone()[0])
+    for lo in range(0, max_id, _BACKFILL_CHUNK * 10):
+        cursor.execute(
+            """
+            UPDATE records r JOIN users u ON r.emp_id = u.emp_id
+            SET r.department = u.department
+            WHERE r.id > %s AND r.id <= %s AND r.department IS NULL
+            """,
+            (lo, lo + _BACKFILL_CHUNK * 10),
+        )
+
+
+def _rebuild_daily_stats_by_record_department(cursor):
+    """v11：彙總表改依 records.department 重建（與寫入時累加的部門一致）"""
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (_DAILY_STATS_LOCK, _LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("等待彙總表寫入鎖逾時")
+    try:
+        cursor.execute("DELETE FROM daily_exam_stats")
+        cursor.execute("DELETE FROM daily_section_stats")
+        _rollup_records(cursor, """
+            SELECT id, DATE(exam_date), department, bank_type,
+                   score, passed, section_scores
+            FROM records
+            WHERE id > %s
+            ORDER BY id
+            LIMIT %s
+        """)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_DAILY_STATS_LOCK,))
+        cursor.fetchone()
+
+
+def _hash_plaintext_passwords(cursor):
+    """
+    明文密碼改存雜湊；PBKDF2 會釋放 GIL，用 thread pool 平行計算，
+    避免大量帳號時啟動（持有 migration 鎖）卡上數分鐘。NULL 密碼維持 NULL（無法登入）
+    """
+    from utils import auth_store as auth
+
+    cursor.execute("SELECT emp_id, password FROM users")
+    plain = [(emp_id, pw) for emp_id, pw in cursor.fetchall() if pw is not None and not auth.is_hashed(pw)]
+    if not plain:
+        return
+    with ThreadPoolExecutor() as pool:
+        hashes = list(pool.map(auth.hash_password, [pw for _, pw in plain]))
+    rows = [(h, emp_id) for (emp_id, _), h in zip(plain, hashes)]
+    for i in range(0, len(rows), _BACKFILL_CHUNK):
+        cursor.executemany("UPDATE users SET password=%s WHERE emp_id=%s", rows[i:i + _BACKFILL_CHUNK])
+
+
+# =========================
+# Migration 清單（只能往後加，不要改已發佈的版本）
+# =========================
+MIGRATIONS = [
+    (1, "records: 個人歷史查詢索引 (emp_id, exam_date)", [
+        "CREATE INDEX idx_records_emp_date ON records (emp_id, exam_date)",
+    ]),
+    (2, "records: 管理員總表的覆蓋索引 (exam_date, ...)", [
+        # 依 exam_date 排序的總表只讀這個索引，不用碰帶著 wrong_log 的資料列
+        "CREATE INDEX idx_records_date_cover ON records "
+        "(exam_date, emp_id, bank_type, score, total_score, passed)",
+    ]),
+    (3, "records: 重新計分的 keyset 索引 (bank_type, id)", [
+        "CREATE INDEX idx_records_bank_id ON records (bank_type, id)",
+    ]),
+    # v4 原本在建表後直接搬移 records.wrong_log；搬移寫入的欄位要到 v9 才齊全，已移到 v10
+    (4, "錯題正規化：questions / exam_wrong_answers", [
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            question_key CHAR(40) PRIMARY KEY,
+            qid VARCHAR(100) NULL,
+            tag VARCHAR(200) NULL,
+            question TEXT,
+            qtype VARCHAR(20) NULL,
+            choices JSON NULL,
+            explanation TEXT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exam_wrong_answers (
+            record_id INT NOT NULL,
+            seq SMALLINT NOT NULL,
+            question_key CHAR(40) NOT NULL,
+            your_answer VARCHAR(50) NOT NULL DEFAULT '',
+            correct_answer VARCHAR(50) NOT NULL DEFAULT '',
+            PRIMARY KEY (record_id, seq),
+            KEY idx_wrong_question (question_key),
+            FOREIGN KEY (record_id) REFERENCES records(id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (5, "records: 管理員報表的 keyset / 篩選索引", [
+        # InnoDB 次級索引尾端自帶主鍵 id，(exam_date) 即可支援 ORDER BY exam_date, id
+        "CREATE INDEX idx_records_date_id ON records (exam_date)",
+        "CREATE INDEX idx_records_bank_date ON records (bank_type, exam_date)",
+        "CREATE INDEX idx_records_passed_date ON records (passed, exam_date)",
+    ]),
+    (6, "每日彙總表：daily_exam_stats / daily_section_stats，並由 records 回填", [
+        """
+        CREATE TABLE IF NOT EXISTS daily_exam_stats (
+            stat_date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL DEFAULT '',
+            bank_type VARCHAR(100) NOT NULL DEFAULT '',
+            n_exams INT NOT NULL DEFAULT 0,
+            n_passed INT NOT NULL DEFAULT 0,
+            score_sum DOUBLE NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, department, bank_type)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_section_stats (
+            stat_date DATE NOT NULL,
+            department VARCHAR(50) NOT NULL DEFAULT '',
+            bank_type VARCHAR(100) NOT NULL DEFAULT '',
+            section VARCHAR(50) NOT NULL,
+            bucket SMALLINT NOT NULL,
+            n INT NOT NULL DEFAULT 0,
+            score_sum DOUBLE NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, department, bank_type, section, bucket)
+        )
+        """,
+        _backfill_daily_stats,
+    ]),
+    (7, "records: 寫入佇列去重用的 client_uuid", [
+        "ALTER TABLE records ADD COLUMN client_uuid CHAR(32) NULL",
+        "CREATE UNIQUE INDEX uq_records_client_uuid ON records (client_uuid)",
+    ]),
+    (8, "users: 密碼改存加鹽雜湊", [
+        "ALTER TABLE users MODIFY COLUMN password VARCHAR(255) DEFAULT '0000'",
+        _hash_plaintext_passwords,
+    ]),
+    (9, "exam_wrong_answers: 記錄作答時的選項順序（questions 改以題庫題目為 key）", [
+        "ALTER TABLE exam_wrong_answers ADD COLUMN choice_order JSON NULL",
+        "ALTER TABLE questions ADD COLUMN source_file VARCHAR(255) NULL",
+        "ALTER TABLE questions ADD COLUMN source_sheet VARCHAR(100) NULL",
+    ]),
+    (10, "搬移 records.wrong_log 到 exam_wrong_answers", [
+        _backfill_wrong_answers,
+    ]),
+    (11, "records: 記錄考試當時的部門，彙總表改依此重建", [
+        "ALTER TABLE records ADD COLUMN department VARCHAR(50) NULL",
+        _backfill_record_departments,
+        _rebuild_daily_stats_by_record_department,
+    ]),
+    (12, "users: 密碼欄位不再有預設明文密碼", [
+        # 沒帶雜湊的 INSERT 會得到 NULL，login_user 一律拒絕
+        "ALTER TABLE users MODIFY COLUMN password VARCHAR(255) NULL DEFAULT NULL",
+    ]),
+]
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(conn) -> int:
+    cursor = conn.cursor()
+    _ensure_table(cursor)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    version = int(cursor.fetchone()[0])
+    cursor.close()
+    return version
+
+
+def _run_step(cursor, step):
+    if callable(step):
+        step(cursor)
+        return
+    try:
+        cursor.execute(step)
+    except Error as e:
+        if getattr(e, "errno", None) not in _IGNORABLE_ERRNOS:
+            raise
+
+
+def apply_migrations(conn) -> list[int]:
+    """套用尚未執行的 migration，回傳這次套用的版本號"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, _LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("等待 schema migration 鎖逾時")
+
+    applied = []
+    try:
+        _ensure_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        done = {int(r[0]) for r in cursor.fetchall()}
+
+        for version, name, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done:
+                continue
+            for step in steps:
+                _run_step(cursor, step)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+            conn.commit()
+            applied.append(version)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+        cursor.fetchone()
+        cursor.close()
+    return applied
+
+
+def main() -> None:
+    from utils import db_handler as db
+
+    db.init_db()
+    conn = db.get_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        print(f"目前 schema 版本：{current_version(conn)}（最新 {MIGRATIONS[-1][0]}）")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
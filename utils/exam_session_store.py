@@ -0,0 +1,266 @@
+# utils/exam_session_store.py
+"""
+模擬考作答進度 (Exam Session Store)
+
+作答中的模擬考只存「精簡狀態」到本機 SQLite（WAL）：
+- 每一節考卷的題目 ID 清單
+- 作答 bitmask（{題目 ID: mask}，A=1, B=2, C=4 ...）
+- 已完成各節的分數、開始時間 / 時限
+題目內容一律由題庫 DataFrame 依 ID 還原，不重複存放。
+worker 重啟或瀏覽器重新連線時，依 (emp_id, cert_type) 讀回並還原 session。
+
+作答本身走 AnswerAutosaver：頁面只把「有變動的題目」放進記憶體緩衝，
+背景 thread 每 AUTOSAVE_INTERVAL 秒最多寫一次（同一題多次點選只寫最後一次），
+連同每題停留時間 (dwell) 一起寫入 exam_answers。
+"""
+import json
+import time
+import threading
+import streamlit as st
+
+from . import sqlite_backend
+
+STORE_PATH = st.secrets.get("EXAM_SESSION_DB", ".exam_sessions.db")
+MAX_AGE_SEC = 24 * 3600        # 超過一天沒更新的進度視為放棄，不再還原
+AUTOSAVE_INTERVAL = float(st.secrets.get("EXAM_AUTOSAVE_SEC", 3))
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS exam_sessions (
+        emp_id TEXT NOT NULL,
+        cert_type TEXT NOT NULL,
+        state TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (emp_id, cert_type)
+    )
+"""
+
+_SCHEMA_ANSWERS = """
+    CREATE TABLE IF NOT EXISTS exam_answers (
+        emp_id TEXT NOT NULL,
+        cert_type TEXT NOT NULL,
+        section_idx INTEGER NOT NULL,
+        qid TEXT NOT NULL,
+        qid_json TEXT NOT NULL,
+        mask INTEGER NOT NULL,
+        dwell_ms INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (emp_id, cert_type, section_idx, qid)
+    )
+"""
+
+
+class ExamSessionStore:
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.writes = 0
+        conn = sqlite_backend.connect(self.path)
+        conn.cursor().execute(_SCHEMA)
+        conn.cursor().execute(_SCHEMA_ANSWERS)
+        conn.commit()
+        conn.close()
+
+    def _conn(self):
+        return sqlite_backend.connect(self.path)
+
+    def save(self, emp_id: str, cert_type: str, state: dict):
+        payload = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+        conn = self._conn()
+        try:
+            conn.cursor().execute(
+                """
+                INSERT INTO exam_sessions (emp_id, cert_type, state, updated_at) VALUES (%s,%s,%s,%s)
+                ON DUPLICATE KEY UPDATE state = VALUES(state), updated_at = VALUES(updated_at)
+                """,
+                (emp_id, cert_type, payload, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.writes += 1
+
+    def load(self, emp_id: str, cert_type: str) -> dict | None:
+        conn = self._conn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT state, updated_at FROM exam_sessions WHERE emp_id=%s AND cert_type=%s",
+                (emp_id, cert_type),
+            )
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if row is None or time.time() - float(row[1]) > MAX_AGE_SEC:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def save_answers(self, rows: list[tuple]):
+        """rows: [(emp_id, cert_type, section_idx, qid, mask, dwell_ms), ...]"""
+        if not rows:
+            return
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.cursor().executemany(
+                """
+                INSERT INTO exam_answers
+                (emp_id, cert_type, section_idx, qid, qid_json, mask, dwell_ms, updated_at)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+                ON DUPLICATE KEY UPDATE
+                    mask = VALUES(mask), dwell_ms = VALUES(dwell_ms), updated_at = VALUES(updated_at)
+                """,
+                [
+                    (e, c, int(sec), str(qid), json.dumps(qid, ensure_ascii=False), int(mask), int(dwell), now)
+                    for e, c, sec, qid, mask, dwell in rows
+                ],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.writes += 1
+
+    def load_answers(self, emp_id: str, cert_type: str, section_idx: int) -> tuple[dict, dict]:
+        """回傳 ({題目 ID: mask}, {題目 ID: dwell_ms})"""
+        conn = self._conn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT qid_json, mask, dwell_ms FROM exam_answers
+                WHERE emp_id=%s AND cert_type=%s AND section_idx=%s
+                """,
+                (emp_id, cert_type, int(section_idx)),
+            )
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        answers, dwell = {}, {}
+        for qid_json, mask, dwell_ms in rows:
+            qid = json.loads(qid_json)
+            answers[qid] = int(mask)
+            dwell[qid] = int(dwell_ms)
+        return answers, dwell
+
+    def clear(self, emp_id: str, cert_type: str | None = None):
+        conn = self._conn()
+        try:
+            for table in ("exam_sessions", "exam_answers"):
+                if cert_type is None:
+                    conn.cursor().execute(f"DELETE FROM {table} WHERE emp_id=%s", (emp_id,))
+                else:
+                    conn.cursor().execute(
+                        f"DELETE FROM {table} WHERE emp_id=%s AND cert_type=%s", (emp_id, cert_type)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def purge_stale(self) -> int:
+        conn = self._conn()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM exam_sessions WHERE updated_at < %s", (time.time() - MAX_AGE_SEC,))
+            n = cursor.rowcount
+            cursor.execute("DELETE FROM exam_answers WHERE updated_at < %s", (time.time() - MAX_AGE_SEC,))
+            conn.commit()
+            return n
+        finally:
+            conn.close()
+
+
+class AnswerAutosaver:
+    """
+    作答的寫入緩衝（thread-safe）：
+    put() 只更新記憶體中的 dirty 表，背景 thread 每 interval 秒把 dirty 表整批寫入 store
+    """
+
+    def __init__(self, store: ExamSessionStore, interval: float = AUTOSAVE_INTERVAL):
+        self.store = store
+        self.interval = float(interval)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()     # 一次只有一個 flush；clear() 也持有，避免清除後又被寫回
+        self._dirty: dict = {}      # (emp_id, cert_type, section_idx, qid) -> (mask, dwell_ms)
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="exam-autosave", daemon=True)
+        self._thread.start()
+
+    def put(self, emp_id: str, cert_type: str, section_idx: int, changes: dict):
+        """changes: {題目 ID: (mask, dwell_ms)}"""
+        with self._lock:
+            for qid, v in changes.items():
+                self._dirty[(emp_id, cert_type, int(section_idx), qid)] = v
+
+    def discard(self, emp_id: str, cert_type: str | None = None):
+        with self._lock:
+            for k in [k for k in self._dirty if k[0] == emp_id and (cert_type is None or k[1] == cert_type)]:
+                del self._dirty[k]
+
+    def clear(self, emp_id: str, cert_type: str | None = None):
+        """
+        丟掉緩衝並清除 store 中的進度（交卷 / 放棄時）；
+        持有 flush 鎖，已取出緩衝、正在寫入的 flush 會先寫完，不會在清除之後把進度寫回來
+        """
+        with self._flush_lock:
+            self.discard(emp_id, cert_type)
+            self.store.clear(emp_id, cert_type)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        rows = [k + v for k, v in dirty.items()]
+        try:
+            self.store.save_answers(rows)
+        except Exception:
+            # 寫入失敗：放回緩衝（期間若有更新較新的值，保留較新的）
+            with self._lock:
+                for k, v in dirty.items():
+                    self._dirty.setdefault(k, v)
+            raise
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "interval_sec": self.interval,
+                "dirty": len(self._dirty),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "last_error": self.last_error,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_exam_session_store() -> ExamSessionStore:
+    store = ExamSessionStore()
+    store.purge_stale()
+    return store
+
+
+@st.cache_resource(show_spinner=False)
+def get_answer_autosaver() -> AnswerAutosaver:
+    return AnswerAutosaver(get_exam_session_store())
@@ -0,0 +1,136 @@
+# utils/gh_blob_cache.py
+"""
+GitHub 下載的本機 blob 快取 (GitHub Blob Cache)
+
+檔案內容以 git blob sha（sha1("blob <len>\\0" + 內容)）為檔名存到磁碟，
+另外為每個 API 路徑記一筆 ref：{etag, sha}。
+- 再次下載同一路徑時帶 If-None-Match: <etag>，GitHub 回 304 就直接讀本機 blob
+  （304 不計入 rate limit，也不用重新傳整份 base64）
+- 已知 blob sha（例如由 tree listing 取得）時可直接 get_blob(sha)，完全不發 request
+blob 內容不變 => sha 不變，所以快取檔永遠不會「過期」，只會因為沒人引用而變成垃圾。
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import streamlit as st
+
+CACHE_DIR = st.secrets.get("GH_CACHE_DIR", ".gh_cache")
+
+_lock = threading.Lock()
+_stats = {"blob_hits": 0, "blob_misses": 0, "not_modified": 0, "downloads": 0}
+
+
+def git_blob_sha(data: bytes) -> str:
+    """與 GitHub tree / contents API 回傳的 sha 相同的算法"""
+    h = hashlib.sha1()
+    h.update(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _blob_path(sha: str) -> str:
+    return os.path.join(CACHE_DIR, "blobs", sha[:2], sha)
+
+
+def _ref_path(key: str) -> str:
+    name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, "refs", f"{name}.json")
+
+
+def _atomic_write(path: str, data: bytes) -> bool:
+    """先寫暫存檔再 os.replace；快取寫入失敗（例如唯讀磁碟）不影響正常流程"""
+    try:
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return True
+    except Exception:
+        return False
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+# =========================
+# blob（依內容 sha 定址）
+# =========================
+def get_blob(sha: str | None) -> bytes | None:
+    """找不到或內容與 sha 不符（檔案損毀）時回傳 None"""
+    if not sha:
+        return None
+    try:
+        with open(_blob_path(sha), "rb") as f:
+            data = f.read()
+    except OSError:
+        _count("blob_misses")
+        return None
+    if git_blob_sha(data) != sha:
+        _count("blob_misses")
+        return None
+    _count("blob_hits")
+    return data
+
+
+def has_blob(sha: str | None) -> bool:
+    return bool(sha) and os.path.exists(_blob_path(sha))
+
+
+def put_blob(data: bytes) -> str:
+    sha = git_blob_sha(data)
+    if not os.path.exists(_blob_path(sha)):
+        _atomic_write(_blob_path(sha), data)
+    return sha
+
+
+# =========================
+# ref（API 路徑 -> etag + blob sha）
+# =========================
+def get_ref(key: str) -> dict | None:
+    try:
+        with open(_ref_path(key), "r", encoding="utf-8") as f:
+            ref = json.load(f)
+        return ref if isinstance(ref, dict) and ref.get("sha") else None
+    except (OSError, ValueError):
+        return None
+
+
+def put_ref(key: str, etag: str | None, sha: str):
+    payload = json.dumps({"key": key, "etag": etag, "sha": sha}, ensure_ascii=False)
+    _atomic_write(_ref_path(key), payload.encode("utf-8"))
+
+
+def record_not_modified():
+    _count("not_modified")
+
+
+def record_download():
+    _count("downloads")
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+    blob_dir = os.path.join(CACHE_DIR, "blobs")
+    n, size = 0, 0
+    for dirpath, _, files in os.walk(blob_dir):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            try:
+                size += os.path.getsize(os.path.join(dirpath, name))
+                n += 1
+            except OSError:
+                pass
+    out.update({"blobs": n, "bytes": size, "dir": CACHE_DIR})
+    return out
@@ -0,0 +1,177 @@
+# utils/github_client.py
+"""
+GitHub REST client
+
+- 共用一個 requests.Session（keep-alive + 連線池），不必每次呼叫重新建立 TLS 連線
+- 每個 request 都有 timeout
+- GET / HEAD：5xx、429、403 rate limit、連線錯誤都有限次數重試，指數退避加隨機抖動
+  （有 Retry-After / X-RateLimit-Reset 且不會等太久時照它的時間等）
+- 寫入（POST / PUT / PATCH / DELETE）不是冪等的：只在 rate limit（請求被拒、沒有執行）
+  或連線根本沒建立 (ConnectTimeout) 時重試；5xx / 讀取逾時可能其實已經寫入，交給呼叫端處理
+- commit_files()：用 git data API（blob -> tree -> commit -> ref）一次提交多個檔案
+"""
+import time
+import base64
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+API_ROOT = "https://api.github.com"
+DEFAULT_TIMEOUT = (5, 30)        # (connect, read) 秒
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+MAX_RATE_LIMIT_WAIT = 60.0       # rate limit 重置時間超過這個就不等了，直接回報錯誤
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+
+class GitHubError(RuntimeError):
+    def __init__(self, method: str, path: str, status: int, text: str):
+        self.status = status
+        snippet = (text or "")[:300].replace("\n", " ")
+        super().__init__(f"GitHub API {method} {path} -> {status}: {snippet}")
+
+
+class GitHubConflict(GitHubError):
+    """要提交的檔案在讀取之後已被別人更新（以目前內容為準，不覆蓋）"""
+
+    def __init__(self, paths: list[str]):
+        self.paths = list(paths)
+        super().__init__("COMMIT", ", ".join(self.paths), 409, "檔案在讀取之後已被其他人更新")
+
+
+def _is_rate_limited(r: requests.Response) -> bool:
+    if r.status_code == 429:
+        return True
+    if r.status_code != 403:
+        return False
+    return r.headers.get("X-RateLimit-Remaining") == "0" or "rate limit" in r.text.lower()
+
+
+class GitHubClient:
+    def __init__(self, owner: str, repo: str, token: str | None = None,
+                 timeout=DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES, pool_size: int = 16):
+        self.owner = owner
+        self.repo = repo
+        self.timeout = timeout
+        self.max_retries = int(max_retries)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.rate_limit_remaining = None
+
+    # =========================
+    # 基礎 request
+    # =========================
+    def _url(self, path: str) -> str:
+        return f"{API_ROOT}/repos/{self.owner}/{self.repo}/{path}"
+
+    def _delay(self, attempt: int, r: requests.Response | None) -> float | None:
+        """下一次重試前要等幾秒；None 表示不值得再試"""
+        if r is not None:
+            retry_after = r.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                wait = float(retry_after)
+                return wait if wait <= MAX_RATE_LIMIT_WAIT else None
+            reset = r.headers.get("X-RateLimit-Reset")
+            if r.headers.get("X-RateLimit-Remaining") == "0" and reset and reset.isdigit():
+                wait = max(0.0, float(reset) - time.time()) + 1
+                return wait if wait <= MAX_RATE_LIMIT_WAIT else None
+        # full jitter：0 ~ min(cap, base * 2^attempt)
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        回傳最後一次的 Response（不因狀態碼丟例外，304 / 404 交給呼叫端判斷）；
+        重試用完（或寫入請求不能重試）仍連線失敗時丟出 requests.RequestException
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        url = self._url(path)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                r = None
+                # 寫入只有在連線沒建立時重送才安全（伺服器不可能收到）
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, requests.ConnectTimeout)):
+                    raise
+            else:
+                remaining = r.headers.get("X-RateLimit-Remaining")
+                if remaining is not None:
+                    self.rate_limit_remaining = int(remaining)
+                retryable = _is_rate_limited(r) or (idempotent and r.status_code >= 500)
+                if not retryable or attempt >= self.max_retries:
+                    return r
+
+            wait = self._delay(attempt, r)
+            if wait is None:
+                return r
+            with self._lock:
+                self.retries += 1
+            time.sleep(wait)
+            attempt += 1
+
+    def api(self, path: str, method: str = "GET", **kwargs):
+        r = self.request(method, path, **kwargs)
+        if r.status_code >= 400:
+            raise GitHubError(method, path, r.status_code, r.text)
+        return r.json() if r.content else {}
+
+    # =========================
+    # git data API：多檔一次 commit
+    # =========================
+    def get_head(self, branch: str) -> tuple[str, str]:
+        """回傳 (commit sha, tree sha)"""
+        ref = self.api(f"git/ref/heads/{branch}")
+        commit_sha = ref["object"]["sha"]
+        commit = self.api(f"git/commits/{commit_sha}")
+        return commit_sha, commit["tree"]["sha"]
+
+    def tree_blob_shas(self, tree_sha: str, paths) -> dict:
+        """{路徑: 該 tree 中的 blob sha}；tree 中不存在的路徑不列出"""
+        wanted = set(paths)
+        tree = self.api(f"git/trees/{tree_sha}", params={"recursive": 1})
+        return {it["path"]: it["sha"] for it in tree.get("tree", []) if it.get("path") in wanted}
+
+    def create_blob(self, content: bytes) -> str:
+        payload = {"content": base64.b64encode(content).decode("ascii"), "encoding": "base64"}
+        return self.api("git/blobs", method="POST", json=payload)["sha"]
+
+    def commit_files(self, branch: str, files: dict, message: str, head: tuple[str, str] | None = None) -> dict:
+        """
+        files: {repo 路徑: bytes}
+        建立所有 blob -> 以 HEAD 的 tree 為 base 建一個新 tree -> 一個 commit -> 更新 ref 一次。
+        head：呼叫端已取得的 (commit sha, tree sha)；None 表示現在取。
+        ref 更新不用 force：期間 branch 被別人推進時 GitHub 回 422，整批都不會生效。
+        """
+        head_sha, base_tree = head or self.get_head(branch)
+        tree = [
+            {"path": path, "mode": "100644", "type": "blob", "sha": self.create_blob(content)}
+            for path, content in files.items()
+        ]
+        new_tree = self.api("git/trees", method="POST", json={"base_tree": base_tree, "tree": tree})
+        commit = self.api(
+            "git/commits", method="POST",
+            json={"message": message, "tree": new_tree["sha"], "parents": [head_sha]},
+        )
+        self.api(f"git/refs/heads/{branch}", method="PATCH", json={"sha": commit["sha"], "force": False})
+        return commit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limit_remaining": self.rate_limit_remaining,
+            }
@@ -4,6 +4,10 @@ import base64
 import requests
 import streamlit as st
 
+from . import gh_blob_cache as blob_cache
+from .bank_catalog import get_bank_catalog
+from .github_client import GitHubClient, GitHubError, GitHubConflict
+
 # =========================================================
 # 設定讀取與模式判斷
 # =========================================================
@@ -30,11 +34,11 @@ def _type_dir(t: str) -> str:
 # =========================================================
 # GitHub API 基礎函式 (僅在非 Local Mode 時使用)
 # =========================================================
-def _gh_headers():
-    h = {"Accept": "application/vnd.github+json"}
-    if GH_TOKEN:
-        h["Authorization"] = f"Bearer {GH_TOKEN}"
-    return h
+@st.cache_resource(show_spinner=False)
+def get_gh_client() -> GitHubClient:
+    """整個行程共用一個 client（連線池 / keep-alive / 重試）"""
+    timeout = (float(st.secrets.get("GH_CONNECT_TIMEOUT", 5)), float(st.secrets.get("GH_READ_TIMEOUT", 30)))
+    return GitHubClient(GH_OWNER, GH_REPO, GH_TOKEN, timeout=timeout)
 
 def _gh_write_ready() -> tuple[bool, str]:
     if LOCAL_MODE:
@@ -59,13 +63,7 @@ def require_gh_write_or_warn():
 def _gh_api(path, method="GET", **kwargs):
     if LOCAL_MODE:
         return {} # 本機模式下不應呼叫此函式，回傳空字典防呆
-        
-    url = f"https://api.github.com/repos/{GH_OWNER}/{GH_REPO}/{path}"
-    r = requests.request(method, url, headers=_gh_headers(), **kwargs)
-    if r.status_code >= 400:
-        snippet = r.text[:300].replace("\n"," ")
-        raise RuntimeError(f"GitHub API {method} {path} -> {r.status_code}: {snippet}")
-    return r.json()
+    return get_gh_client().api(path, method=method, **kwargs)
 
 def _gh_get_sha(path):
     if LOCAL_MODE: return None
@@ -75,6 +73,45 @@ def _gh_get_sha(path):
     except Exception:
         return None
 
+def _gh_get_cached(path, params=None, raw=False) -> bytes:
+    """
+    帶 If-None-Match 的條件式 GET（內容存在 utils/gh_blob_cache）：
+    - 304：直接讀本機 blob，不重新下載、也不計入 rate limit
+    - 200：寫入本機 blob，記下新的 ETag
+    - 網路 / API 失敗但本機有舊版本：回傳舊版本（題庫仍可作答）
+    raw=True 時要求 GitHub 直接回傳檔案內容（省去 base64，也不受 1MB 限制）
+    params 預設為 {"ref": GH_BRANCH}（contents API）
+    """
+    params = {"ref": GH_BRANCH} if params is None else params
+    key = path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items())) + (":raw" if raw else "")
+    ref = blob_cache.get_ref(key)
+    cached = blob_cache.get_blob(ref["sha"]) if ref else None
+
+    headers = {}
+    if raw:
+        headers["Accept"] = "application/vnd.github.raw"
+    if cached is not None and ref.get("etag"):
+        headers["If-None-Match"] = ref["etag"]
+
+    try:
+        r = get_gh_client().request("GET", path, headers=headers, params=params)
+    except requests.RequestException:
+        if cached is not None:
+            return cached
+        raise
+    if r.status_code == 304 and cached is not None:
+        blob_cache.record_not_modified()
+        return cached
+    if r.status_code >= 400:
+        if cached is not None and r.status_code != 404:
+            return cached
+        raise GitHubError("GET", path, r.status_code, r.text)
+
+    blob_cache.record_download()
+    data = r.content
+    blob_cache.put_ref(key, r.headers.get("ETag"), blob_cache.put_blob(data))
+    return data
+
 # =========================================================
 # 核心功能：下載與寫入 (支援雙模式)
 # =========================================================
@@ -87,10 +124,80 @@ def gh_put_file(path, content_bytes, message):
         
     b64 = base64.b64encode(content_bytes).decode("ascii")
     payload = {"message": message, "content": b64, "branch": GH_BRANCH}
-    sha = _gh_get_sha(path)
+    # 既有檔案的 sha 直接取自題庫目錄（tree listing），不再先打一次 contents API；
+    # 目錄快照過期導致 sha 不符（409 / 422）時才查最新 sha 重送一次
+    sha = get_bank_catalog().blob_sha(path)
     if sha:
         payload["sha"] = sha
-    return _gh_api(f"contents/{path}", method="PUT", json=payload)
+    try:
+        res = _gh_api(f"contents/{path}", method="PUT", json=payload)
+    except GitHubError as e:
+        if e.status not in (409, 422):
+            raise
+        sha = _gh_get_sha(path)
+        if sha and sha == blob_cache.git_blob_sha(content_bytes):
+            # 目前內容已經是這份（例如先前的寫入其實已生效），不再多做一個 commit
+            res = {"content": {"path": path, "sha": sha}, "commit": None}
+        else:
+            if sha:
+                payload["sha"] = sha
+            else:
+                payload.pop("sha", None)
+            res = _gh_api(f"contents/{path}", method="PUT", json=payload)
+    get_bank_catalog().invalidate()
+    gh_download_bytes.clear()
+    return res
+
+def gh_commit_files(files: dict, message: str, base_shas: dict | None = None) -> dict:
+    """
+    多檔一次提交（git data API：一個 tree、一個 commit、一次 ref 更新）：
+    要嘛全部生效、要嘛全部不生效，不會只更新到其中幾個檔案。
+    files：{repo 路徑: bytes}；內容與目前版本相同的檔案略過。
+    base_shas：{repo 路徑: 產生新內容時讀到的 blob sha（新檔為 None）}；未提供時取題庫目錄目前的 sha。
+    每次嘗試都以當下的 HEAD 重新比對：目標檔案已不是 base 的版本（別人先更新了）就丟
+    GitHubConflict，不覆蓋對方的內容。
+    回傳 {"commit": sha 或 None, "paths": [實際變動的路徑]}（本機模式回傳 {}）
+    """
+    if LOCAL_MODE:
+        st.toast("本機模式下無法上傳檔案到 GitHub")
+        return {}
+
+    catalog = get_bank_catalog()
+    if base_shas is None:
+        base_shas = {path: catalog.blob_sha(path) for path in files}
+    new_shas = {path: blob_cache.git_blob_sha(data) for path, data in files.items()}
+
+    client = get_gh_client()
+    for attempt in range(3):
+        head = client.get_head(GH_BRANCH)
+        current = client.tree_blob_shas(head[1], files)
+        changed, conflicts = {}, []
+        for path, data in files.items():
+            cur = current.get(path)
+            if cur == new_shas[path]:
+                continue
+            if cur != base_shas.get(path):
+                conflicts.append(path)
+            else:
+                changed[path] = data
+        if conflicts:
+            raise GitHubConflict(sorted(conflicts))
+        if not changed:
+            return {"commit": None, "paths": []}
+        try:
+            commit = client.commit_files(GH_BRANCH, changed, message, head=head)
+            break
+        except GitHubError as e:
+            # 422：建 commit 期間 branch 被推進（ref 不是 fast-forward），以新的 HEAD 重新比對後重做
+            if e.status != 422 or attempt == 2:
+                raise
+
+    # 剛上傳的內容直接放進本機 blob 快取，之後依目錄 sha 讀取時不必再下載
+    for data in changed.values():
+        blob_cache.put_blob(data)
+    catalog.invalidate()
+    gh_download_bytes.clear()
+    return {"commit": commit["sha"], "paths": sorted(changed)}
 
 @st.cache_data(ttl=300)
 def gh_download_bytes(path):
@@ -120,14 +227,11 @@ def gh_download_bytes(path):
 
     # --- GitHub 模式 ---
     try:
-        j = _gh_api(f"contents/{path}", params={"ref": GH_BRANCH})
-        if j.get("encoding") == "base64":
-            return base64.b64decode(j["content"])
-        
-        # 如果不是 API 回傳內容，嘗試用 raw url 下載 (大檔處理)
-        raw_url = f"https://raw.githubusercontent.com/{GH_OWNER}/{GH_REPO}/{GH_BRANCH}/{path}"
-        h = {"Authorization": f"Bearer {GH_TOKEN}"} if GH_TOKEN else {}
-        return requests.get(raw_url, headers=h).content
+        # 題庫目錄的 sha 已在本機 blob 快取：不發任何 request
+        data = get_bank_catalog().read_cached(path)
+        if data is not None:
+            return data
+        return _gh_get_cached(f"contents/{path}", raw=True)
     except Exception:
         return b""
 
@@ -157,15 +261,10 @@ def list_bank_files(bank_type: str | None = None):
             st.error(f"本機目錄掃描失敗: {e}")
             return []
 
-    # --- GitHub 模式 ---
+    # --- GitHub 模式：由題庫目錄（一次 tree listing）提供 ---
     try:
-        if bank_type:
-            folder = _type_dir(bank_type)
-            items = _gh_api(f"contents/{folder}", params={"ref": GH_BRANCH})
-            return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(".xlsx")]
-        else:
-            items = _gh_api(f"contents/{BANKS_DIR}", params={"ref": GH_BRANCH})
-            return [it["path"] for it in items if it["type"] == "file" and it["name"].lower().endswith(".xlsx")]
+        folder = _type_dir(bank_type) if bank_type else BANKS_DIR
+        return get_bank_catalog().list_files(folder)
     except Exception:
         return []
 
@@ -177,8 +276,7 @@ def list_bank_files(bank_type: str | None = None):
 def _read_pointer():
     if LOCAL_MODE: return {}
     try:
-        data = gh_download_bytes(POINTER_FILE)
-        return json.loads(data.decode("utf-8"))
+        return get_bank_catalog().read_pointer(POINTER_FILE)
     except Exception:
         return {}
 
@@ -190,7 +288,6 @@ def _write_pointer(obj: dict):
         json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"),
         "update bank pointers"
     )
-    gh_download_bytes.clear()
 
 def get_current_bank_path(bank_type: str | None = None):
     """取得目前預設使用的題庫路徑"""
@@ -0,0 +1,173 @@
+# utils/question_store.py
+"""
+抽題用的題庫索引 (QuestionStore)
+
+每份題庫 DataFrame 只在第一次抽題時建一次：
+- 選項文字展開成 (題數 x 最多選項數) 的矩陣
+- 正解同時存成「原始位置 bitmask」（第 j 個選項是否為正解）與原始答案字串
+之後每次抽題只需 numpy 抽索引 + 逐列排列，不再 iterrows / 反查選項文字。
+
+索引以 id(df) 快取，並用 weakref.finalize 在 DataFrame 被回收時一併移除；
+題庫 DataFrame 在 BankCache 中本來就是唯讀共用的，因此可安全共用同一份索引。
+"""
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+from .answer_bits import LETTERS, INVALID_BIT, encode_many
+
+_BASE_FIELDS = ["ID", "Explanation", "Image", "Tag", "SourceFile", "SourceSheet"]
+
+
+def _column(df: pd.DataFrame, col: str, default="") -> np.ndarray:
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+
+class QuestionStore:
+    """題庫的欄式（columnar）唯讀索引"""
+
+    def __init__(self, df: pd.DataFrame):
+        choices = _column(df, "Choices", None)
+        n_choices = np.fromiter((len(c) if c else 0 for c in choices), dtype=np.int64, count=len(choices))
+
+        # 沒有選項的題目不能出題（與舊版 sample_paper 的 continue 相同）
+        rows = np.flatnonzero(n_choices > 0)
+        self.rows = rows
+        self.n_choices = n_choices[rows]
+        self.max_choices = int(self.n_choices.max()) if len(rows) else 0
+
+        # 原始答案字串（大寫、去空白，nan 視為空字串）
+        raw_ans = []
+        for a in _column(df, "Answer")[rows]:
+            s = str(a).upper().strip()
+            raw_ans.append("" if s == "NAN" else s)
+        self.raw_answers = np.array(raw_ans, dtype=object)
+        self.answer_mask = encode_many(raw_ans)
+
+        # 選項矩陣與原始位置 bitmask：label 出現在原始答案字串中即為正解（沿用舊版判斷）
+        k = len(rows)
+        self.labels = np.full((k, self.max_choices), "", dtype=object)
+        self.texts = np.full((k, self.max_choices), "", dtype=object)
+        pos_mask = np.zeros(k, dtype=np.uint32)
+        for i, (chs, ans) in enumerate(zip(choices[rows], self.raw_answers)):
+            m = 0
+            for j, (lab, txt) in enumerate(chs):
+                self.labels[i, j] = lab
+                self.texts[i, j] = txt
+                if lab and lab in ans:
+                    m |= 1 << j
+            pos_mask[i] = m
+        self.answer_pos_mask = pos_mask
+
+        # 題幹：Question 為空時改用「題目」欄
+        question = _column(df, "Question", None)[rows]
+        fallback = _column(df, "題目", "")[rows]
+        empty = pd.isna(question) | (question == "")
+        self.question = np.where(empty, fallback, question)
+
+        self.type = np.array([str(t).upper() for t in _column(df, "Type", "SC")[rows]], dtype=object)
+        self.fields = {c: _column(df, c)[rows] for c in _BASE_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # =========================
+    # 抽題
+    # =========================
+    def draw(self, n: int, random_order: bool = True, rng=None) -> np.ndarray:
+        """抽出 n 題，回傳 store 內的位置；random_order=False 時依題庫原順序排列"""
+        rng = rng or np.random.default_rng()
+        n = min(int(n), len(self))
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+        picked = rng.choice(len(self), size=n, replace=False)
+        return picked if random_order else np.sort(picked)
+
+    def shuffle_choices(self, picked: np.ndarray, rng=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        逐題洗牌選項：
+        回傳 (perm, new_mask)，perm[i, j] = 新位置 j 放的原始選項位置；
+        new_mask 為洗牌後的正解 bitmask（新位置 j 即 label A+j）
+        """
+        rng = rng or np.random.default_rng()
+        nc = self.n_choices[picked]
+        keys = rng.random((len(picked), self.max_choices))
+        keys[np.arange(self.max_choices)[None, :] >= nc[:, None]] = np.inf
+        perm = np.argsort(keys, axis=1)
+
+        bits = (self.answer_pos_mask[picked][:, None] >> perm.astype(np.uint32)) & 1
+        weights = (np.uint32(1) << np.arange(self.max_choices, dtype=np.uint32))[None, :]
+        new_mask = (bits * weights).sum(axis=1).astype(np.uint32)
+        # 原答案含非字母雜訊時保留 INVALID_BIT，避免未作答被判為答對
+        new_mask |= self.answer_mask[picked] & np.uint32(INVALID_BIT)
+        return perm, new_mask
+
+    def build_paper(self, n: int, random_order: bool = True, shuffle_options: bool = True, rng=None) -> list[dict]:
+        """產生與舊版 sample_paper 相同格式的考卷 (list of dict)"""
+        rng = rng or np.random.default_rng()
+        picked = self.draw(n, random_order=random_order, rng=rng)
+        if len(picked) == 0:
+            return []
+
+        if shuffle_options:
+            perm, masks = self.shuffle_choices(picked, rng=rng)
+            texts = self.texts[picked[:, None], perm]
+        else:
+            texts = self.texts[picked]
+            masks = self.answer_mask[picked]
+
+        questions = []
+        for i, p in enumerate(picked):
+            nc = int(self.n_choices[p])
+            if shuffle_options:
+                choices = [(LETTERS[j], texts[i, j]) for j in range(nc)]
+                answer = {LETTERS[j] for j in range(nc) if masks[i] & (1 << j)}
+            else:
+                choices = [(self.labels[p, j], texts[i, j]) for j in range(nc)]
+                answer = set(self.raw_answers[p])
+            questions.append({
+                "ID": self.fields["ID"][p],
+                "Question": self.question[p],
+                "Type": self.type[p],
+                "Choices": choices,
+                "Answer": answer,
+                "AnswerMask": int(masks[i]),
+                "Explanation": self.fields["Explanation"][p],
+                "Image": self.fields["Image"][p],
+                "Tag": self.fields["Tag"][p],
+                "SourceFile": self.fields["SourceFile"][p],
+                "SourceSheet": self.fields["SourceSheet"][p],
+            })
+        return questions
+
+
+# =========================
+# 每份 DataFrame 一個索引
+# =========================
+_STORES: dict = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_question_store(df: pd.DataFrame) -> QuestionStore:
+    key = id(df)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+    if store is not None:
+        return store
+
+    store = QuestionStore(df)
+    with _STORES_LOCK:
+        existing = _STORES.get(key)
+        if existing is not None:
+            return existing
+        _STORES[key] = store
+    weakref.finalize(df, _drop_store, key)
+    return store
+
+
+def _drop_store(key: int) -> None:
+    with _STORES_LOCK:
+        _STORES.pop(key, None)
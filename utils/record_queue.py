@@ -0,0 +1,303 @@
+# utils/record_queue.py
+"""
+成績寫入佇列 (Write-behind Queue)
+
+交卷時只把成績 append 到本機 spool 檔（fsync 後即返回），
+由背景 worker 批次以 executemany 寫進 MySQL：
+- spool 檔：{RECORD_SPOOL_DIR}/pending-{pid}.jsonl，一行一筆
+- worker 先把 pending 檔 rename 成 batch-{pid}-{n}.jsonl 再處理（n 接在既有 batch 檔之後，
+  不會覆蓋同 pid 上一個行程留下的檔案），寫入成功才刪檔；失敗就保留檔案，退避後重試
+- 一個 batch 檔失敗不影響其他檔案；同一檔連續失敗 MAX_BATCH_ATTEMPTS 次後逐半拆開重寫，
+  單筆仍因資料錯誤（外鍵、欄位過長…）寫不進去的移到 dead-letter.jsonl，不再擋住後面的成績
+- 每筆帶 client_uuid，重送時由 db_handler 去重（commit 後才當機也不會重複寫入）
+- 行程重啟後，worker 會接手已結束行程留下的 pending / batch 檔
+
+手動把 spool 全部寫入資料庫：
+    python -m utils.record_queue
+"""
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+import streamlit as st
+
+from . import db_handler as db
+
+# =========================
+# 設定
+# =========================
+SPOOL_DIR = st.secrets.get("RECORD_SPOOL_DIR", ".record_spool")
+BATCH_SIZE = 200               # 每個 transaction 最多幾筆
+LINGER_SEC = 0.5               # 收到第一筆後稍等，讓尖峰時段的多筆合成一批
+RETRY_BASE_SEC = 1.0
+RETRY_MAX_SEC = 60.0
+MAX_BATCH_ATTEMPTS = 3         # 同一個 batch 檔失敗幾次後改為拆半找出壞資料
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+_FILE_RE = re.compile(r"^(pending|batch)-(\d+)(?:-(\d+))?\.jsonl$")
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_permanent(e: Exception) -> bool:
+    """重送也不會成功的錯誤：資料本身有問題（mysql.connector / sqlite3 同名例外）"""
+    if isinstance(e, (ValueError, TypeError, KeyError)):
+        return True
+    return type(e).__name__ in ("IntegrityError", "DataError")
+
+
+class RecordQueue:
+    def __init__(self, spool_dir: str = SPOOL_DIR):
+        self.spool_dir = spool_dir
+        self.pid = os.getpid()
+        self._lock = threading.Lock()          # 保護 pending 檔的 append / rename
+        self._wake = threading.Event()
+        self._seq = 0
+        self._attempts: dict = {}              # batch 檔路徑 -> 連續失敗次數
+        self._thread = None
+        # 統計
+        self.enqueued = 0
+        self.committed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error = None
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    # ---------- 寫入端 ----------
+    @property
+    def _pending_path(self) -> str:
+        return os.path.join(self.spool_dir, f"pending-{self.pid}.jsonl")
+
+    def enqueue(self, entry: dict) -> str:
+        """append 一筆成績到 spool 檔（fsync 後返回），回傳 client_uuid"""
+        entry = dict(entry)
+        entry.setdefault("client_uuid", uuid.uuid4().hex)
+        exam_date = entry.get("exam_date") or datetime.now()
+        entry["exam_date"] = exam_date.isoformat() if isinstance(exam_date, datetime) else exam_date
+        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self._pending_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.enqueued += 1
+        self._wake.set()
+        return entry["client_uuid"]
+
+    # ---------- worker ----------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="record-queue", daemon=True)
+            self._thread.start()
+        self._wake.set()    # 啟動時先處理上次留下的檔案
+        return self
+
+    def _next_batch_path(self, names: list[str]) -> str:
+        """
+        下一個 batch 檔名：序號接在同 pid 既有 batch 檔之後。
+        容器裡 PID 常被重用（例如 PID 1），從 0 起算會覆蓋上一個行程尚未寫入的 batch 檔。
+        """
+        for name in names:
+            m = _FILE_RE.match(name)
+            if m and m.group(1) == "batch" and int(m.group(2)) == self.pid and m.group(3):
+                self._seq = max(self._seq, int(m.group(3)))
+        while True:
+            self._seq += 1
+            path = os.path.join(self.spool_dir, f"batch-{self.pid}-{self._seq:06d}.jsonl")
+            if not os.path.exists(path):
+                return path
+
+    def _claim_files(self) -> list[str]:
+        """把自己的 pending 檔與已結束行程的檔案 rename 成自己的 batch 檔，回傳待處理清單"""
+        with self._lock:
+            names = sorted(os.listdir(self.spool_dir))
+            for name in names:
+                m = _FILE_RE.match(name)
+                if not m:
+                    continue
+                pid = int(m.group(2))
+                if pid != self.pid and _pid_alive(pid):
+                    continue
+                if m.group(1) == "batch" and pid == self.pid:
+                    continue
+                os.replace(os.path.join(self.spool_dir, name), self._next_batch_path(names))
+        mine = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            m = _FILE_RE.match(name)
+            if m and m.group(1) == "batch" and int(m.group(2)) == self.pid:
+                mine.append(os.path.join(self.spool_dir, name))
+        return mine
+
+    @staticmethod
+    def _read_entries(path: str) -> list[dict]:
+        entries = []
+        with open(path, "rb") as f:
+            for raw in f:
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    entries.append(json.loads(raw))
+                except ValueError:
+                    # 當機時寫到一半的最後一行：丟棄
+                    continue
+        return entries
+
+    def _write_entries(self, entries: list[dict]) -> int:
+        n_new = 0
+        for i in range(0, len(entries), BATCH_SIZE):
+            n_new += db.save_exam_records_batch(entries[i:i + BATCH_SIZE])
+            with self._lock:
+                self.batches += 1
+        return n_new
+
+    def _dead_letter(self, entry: dict, error: Exception):
+        line = json.dumps(
+            {"failed_at": datetime.now().isoformat(), "error": f"{type(error).__name__}: {error}", "entry": entry},
+            ensure_ascii=False, default=str,
+        ) + "\n"
+        with self._lock:
+            fd = os.open(self.dead_letter_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.dead_lettered += 1
+
+    def _write_bisect(self, entries: list[dict]) -> int:
+        """
+        拆半寫入，找出寫不進去的那幾筆：
+        單筆仍失敗且屬資料錯誤 -> 移到 dead-letter；連線之類的暫時性錯誤 -> 拋出，整檔稍後重試
+        （已寫入的部分重試時由 client_uuid 去重）
+        """
+        try:
+            return self._write_entries(entries)
+        except Exception as e:
+            if len(entries) > 1:
+                mid = len(entries) // 2
+                return self._write_bisect(entries[:mid]) + self._write_bisect(entries[mid:])
+            if not _is_permanent(e):
+                raise
+            self._dead_letter(entries[0], e)
+            return 0
+
+    def flush(self) -> int:
+        """
+        把目前 spool 中的成績全部寫入資料庫，回傳新增筆數。
+        某個檔案失敗時保留該檔、繼續處理其他檔案，最後再拋出第一個錯誤（讓 worker 退避重試）
+        """
+        n_new = 0
+        errors = []
+        for path in self._claim_files():
+            entries = self._read_entries(path)
+            try:
+                if self._attempts.get(path, 0) >= MAX_BATCH_ATTEMPTS:
+                    n = self._write_bisect(entries)
+                else:
+                    n = self._write_entries(entries)
+            except Exception as e:
+                self._attempts[path] = self._attempts.get(path, 0) + 1
+                errors.append(e)
+                continue
+            self._attempts.pop(path, None)
+            n_new += n
+            os.remove(path)
+        with self._lock:
+            self.committed += n_new
+        if errors:
+            raise errors[0]
+        return n_new
+
+    def _run(self):
+        delay = RETRY_BASE_SEC
+        while True:
+            self._wake.wait()
+            time.sleep(LINGER_SEC)
+            self._wake.clear()
+            try:
+                self.flush()
+                delay = RETRY_BASE_SEC
+                with self._lock:
+                    self.last_error = None
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SEC)
+                self._wake.set()
+
+    # ---------- 狀態 ----------
+    @property
+    def dead_letter_path(self) -> str:
+        return os.path.join(self.spool_dir, DEAD_LETTER_FILE)
+
+    def dead_letter_count(self) -> int:
+        try:
+            with open(self.dead_letter_path, "rb") as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def pending_count(self) -> int:
+        n = 0
+        for name in os.listdir(self.spool_dir):
+            if not _FILE_RE.match(name):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name), "rb") as f:
+                    n += sum(1 for line in f if line.strip())
+            except FileNotFoundError:
+                # worker 剛處理完刪檔
+                continue
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {
+                "enqueued": self.enqueued,
+                "committed": self.committed,
+                "batches": self.batches,
+                "failures": self.failures,
+                "last_error": self.last_error,
+            }
+        out["pending"] = self.pending_count()
+        out["dead_letters"] = self.dead_letter_count()
+        out["dead_letter_file"] = self.dead_letter_path
+        out["worker_alive"] = bool(self._thread and self._thread.is_alive())
+        return out
+
+
+@st.cache_resource(show_spinner=False)
+def get_record_queue() -> RecordQueue:
+    return RecordQueue().start()
+
+
+def main() -> None:
+    db.init_db()
+    queue = RecordQueue()
+    n = queue.flush()
+    print(f"已寫入 {n} 筆成績")
+    if queue.dead_lettered:
+        print(f"{queue.dead_lettered} 筆無法寫入，已移到 {queue.dead_letter_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# utils/sqlite_backend.py
+"""
+SQLite 後端（單機部署 / 壓力測試用，不需要網路上的 MySQL）
+
+db_handler 的 SQL 以 MySQL 語法撰寫；這裡提供與 mysql.connector 相同介面的
+連線 / cursor 包裝（%s 參數、cursor(dictionary=True)、lastrowid ...），
+執行前把少數 MySQL 專用語法轉成 SQLite：
+- %s                              -> ?
+- INSERT IGNORE                   -> INSERT OR IGNORE
+- ON DUPLICATE KEY UPDATE / VALUES(x) -> ON CONFLICT DO UPDATE SET / excluded.x
+- DATE_ADD(x, INTERVAL n DAY)     -> datetime(x, '+n day')
+
+schema 直接以最新版本建立（SCHEMA），MySQL 的 migration 不會在 SQLite 上執行；
+之後改 schema 時請同步更新這裡的 SCHEMA。
+
+啟用方式（.streamlit/secrets.toml）：
+    DB_BACKEND = "sqlite"
+    SQLITE_PATH = "exam.db"
+"""
+import re
+import sqlite3
+from datetime import date, datetime
+
+BUSY_TIMEOUT_MS = 10_000
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        emp_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        password TEXT NULL DEFAULT NULL,
+        department TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        emp_id TEXT REFERENCES users(emp_id),
+        department TEXT NULL,
+        bank_type TEXT,
+        score REAL,
+        duration_seconds INTEGER,
+        wrong_log TEXT,
+        exam_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        section_scores TEXT NULL,
+        total_score INTEGER NULL,
+        passed INTEGER NULL,
+        fail_reason TEXT NULL,
+        client_uuid TEXT NULL UNIQUE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_records_emp_date ON records (emp_id, exam_date)",
+    "CREATE INDEX IF NOT EXISTS idx_records_date_id ON records (exam_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_records_bank_id ON records (bank_type, id)",
+    "CREATE INDEX IF NOT EXISTS idx_records_bank_date ON records (bank_type, exam_date)",
+    "CREATE INDEX IF NOT EXISTS idx_records_passed_date ON records (passed, exam_date)",
+    """
+    CREATE TABLE IF NOT EXISTS regrade_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bank_path TEXT NOT NULL,
+        bank_sha TEXT NOT NULL,
+        bank_type TEXT NOT NULL,
+        last_record_id INTEGER NOT NULL DEFAULT 0,
+        processed INTEGER NOT NULL DEFAULT 0,
+        updated INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'running',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS questions (
+        question_key TEXT PRIMARY KEY,
+        qid TEXT NULL,
+        tag TEXT NULL,
+        question TEXT,
+        qtype TEXT NULL,
+        choices TEXT NULL,
+        explanation TEXT NULL,
+        source_file TEXT NULL,
+        source_sheet TEXT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exam_wrong_answers (
+        record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        question_key TEXT NOT NULL,
+        your_answer TEXT NOT NULL DEFAULT '',
+        correct_answer TEXT NOT NULL DEFAULT '',
+        choice_order TEXT NULL,
+        PRIMARY KEY (record_id, seq)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_wrong_question ON exam_wrong_answers (question_key)",
+    """
+    CREATE TABLE IF NOT EXISTS daily_exam_stats (
+        stat_date DATE NOT NULL,
+        department TEXT NOT NULL DEFAULT '',
+        bank_type TEXT NOT NULL DEFAULT '',
+        n_exams INTEGER NOT NULL DEFAULT 0,
+        n_passed INTEGER NOT NULL DEFAULT 0,
+        score_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (stat_date, department, bank_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_section_stats (
+        stat_date DATE NOT NULL,
+        department TEXT NOT NULL DEFAULT '',
+        bank_type TEXT NOT NULL DEFAULT '',
+        section TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        score_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (stat_date, department, bank_type, section, bucket)
+    )
+    """,
+]
+
+
+# =========================
+# 型別轉換（與 mysql.connector 回傳的型別一致）
+# =========================
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+
+
+# =========================
+# MySQL 語法 -> SQLite
+# =========================
+_RE_DATE_ADD = re.compile(r"DATE_ADD\(([^,]+),\s*INTERVAL\s+(\d+)\s+DAY\)", re.IGNORECASE)
+_RE_VALUES_FN = re.compile(r"VALUES\((\w+)\)")
+
+
+def translate(sql: str) -> str:
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    if "ON DUPLICATE KEY UPDATE" in sql:
+        head, tail = sql.split("ON DUPLICATE KEY UPDATE", 1)
+        sql = head + "ON CONFLICT DO UPDATE SET" + _RE_VALUES_FN.sub(r"excluded.\1", tail)
+    sql = _RE_DATE_ADD.sub(r"datetime(\1, '+\2 day')", sql)
+    return sql
+
+
+class SQLiteCursor:
+    """mysql.connector cursor 的子集合（execute / executemany / fetch* / lastrowid）"""
+
+    def __init__(self, raw: sqlite3.Cursor, dictionary: bool = False):
+        self._raw = raw
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._raw.execute(translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._raw.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._raw.description, row)}
+
+    def fetchone(self):
+        return self._row(self._raw.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._raw.fetchall()]
+
+    def fetchmany(self, size=None):
+        rows = self._raw.fetchmany(size) if size is not None else self._raw.fetchmany()
+        return [self._row(r) for r in rows]
+
+    def __iter__(self):
+        return (self._row(r) for r in self._raw)
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    def close(self):
+        self._raw.close()
+
+
+class SQLiteConnection:
+    """mysql.connector connection 的子集合；close() 直接關閉（SQLite 開連線很便宜，不做連線池）"""
+
+    def __init__(self, path: str):
+        self._raw = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+        self._raw.execute("PRAGMA foreign_keys=ON")
+        self._raw.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+    def cursor(self, dictionary: bool = False, **_):
+        return SQLiteCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self) -> bool:
+        return True
+
+    def close(self):
+        self._raw.close()
+
+
+def connect(path: str) -> SQLiteConnection:
+    return SQLiteConnection(path)
+
+
+# 已存在的舊 SQLite 檔：CREATE TABLE IF NOT EXISTS 不會補欄位，這裡逐一補上
+# (table, column, 型別, 補上欄位後要執行的回填 SQL 或 None)
+_ADDED_COLUMNS = [
+    ("exam_wrong_answers", "choice_order", "TEXT NULL", None),
+    ("questions", "source_file", "TEXT NULL", None),
+    ("questions", "source_sheet", "TEXT NULL", None),
+    ("records", "department", "TEXT NULL",
+     "UPDATE records SET department = (SELECT department FROM users WHERE users.emp_id = records.emp_id)"),
+]
+
+
+def _drop_password_default(conn: SQLiteConnection):
+    """
+    舊 SQLite 檔的 users.password 預設為明文 '0000'；SQLite 不能改欄位預設值，
+    依 users 的最新定義重建資料表（期間暫停外鍵檢查，records 的外鍵仍指向 users）
+    """
+    raw = conn._raw
+    cols = raw.execute("PRAGMA table_info(users)").fetchall()
+    if not any(c[1] == "password" and c[4] == "'0000'" for c in cols):
+        return
+    raw.commit()
+    raw.execute("PRAGMA foreign_keys=OFF")
+    try:
+        raw.execute("DROP TABLE IF EXISTS users_new")
+        raw.execute(SCHEMA[0].replace("CREATE TABLE IF NOT EXISTS users", "CREATE TABLE users_new"))
+        raw.execute(
+            "INSERT INTO users_new (emp_id, name, password, department) "
+            "SELECT emp_id, name, password, department FROM users"
+        )
+        raw.execute("DROP TABLE users")
+        raw.execute("ALTER TABLE users_new RENAME TO users")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.execute("PRAGMA foreign_keys=ON")
+
+
+def init_schema(conn: SQLiteConnection):
+    _drop_password_default(conn)
+    cursor = conn.cursor()
+    for stmt in SCHEMA:
+        cursor.execute(stmt)
+    for table, column, decl, backfill in _ADDED_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {r[1] for r in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            if backfill:
+                cursor.execute(backfill)
+    conn.commit()
+    cursor.close()
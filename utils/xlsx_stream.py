@@ -0,0 +1,122 @@
+# utils/xlsx_stream.py
+"""
+串流讀取 Excel (openpyxl read_only + iter_rows(values_only=True))
+
+不一次把整張工作表讀成 DataFrame，而是每累積 chunk_rows 列就交給
+pandas 的 TextParser 轉成小 DataFrame（型別推斷、空值、重複欄名處理
+皆與 pd.read_excel 相同），讓呼叫端逐塊處理，峰值記憶體只跟 chunk 大小有關。
+"""
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+DEFAULT_CHUNK_ROWS = 2000
+
+# 題庫工作表略過規則（與原本 load_bank 相同，在讀取任何儲存格之前判斷）：
+# 名稱含 SKIP_SHEET_CANDIDATES 之一，且同時含 SKIP_SHEET_KEYWORDS 之一才略過；
+# 例如「修改紀錄」「空白工作表」會略過，「修改後題目」仍照常讀取
+SKIP_SHEET_CANDIDATES = ["修改紀錄", "空白", "附錄", "Sheet", "工作表"]
+SKIP_SHEET_KEYWORDS = ["空白", "附錄", "修改"]
+
+
+def should_skip_sheet(sheet_name: str) -> bool:
+    if not any(x in sheet_name for x in SKIP_SHEET_CANDIDATES):
+        return False
+    return any(k in sheet_name for k in SKIP_SHEET_KEYWORDS)
+
+
+def _convert_value(v):
+    """與 pandas 的 openpyxl reader 相同的儲存格轉換規則"""
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, float):
+        iv = int(v)
+        return iv if iv == v else v
+    if isinstance(v, str) and v in ERROR_CODES:
+        return np.nan
+    return v
+
+
+def _convert_row(row) -> list:
+    out = [_convert_value(v) for v in row]
+    # 去掉列尾空白儲存格
+    while out and out[-1] == "":
+        out.pop()
+    return out
+
+
+def _to_frame(header: list, rows: list) -> pd.DataFrame:
+    width = len(header)
+    data = [header] + [r + [""] * (width - len(r)) if len(r) < width else r[:width] for r in rows]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def iter_sheet_chunks(file_like, chunk_rows: int = DEFAULT_CHUNK_ROWS, skip_sheet=should_skip_sheet):
+    """
+    逐工作表、逐區塊產出 (sheet_name, chunk_df, row_offset)
+    - row_offset：此區塊第一列在該工作表資料列中的位置（0 起算，不含標題列）
+    - skip_sheet：傳入 None 代表所有工作表都讀
+    - 中間的空白列保留（與 pd.read_excel 一致），工作表結尾的空白列捨棄
+    """
+    wb = openpyxl.load_workbook(file_like, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if skip_sheet is not None and skip_sheet(ws.title):
+                continue
+
+            ws.reset_dimensions()
+            rows_iter = ws.iter_rows(values_only=True)
+
+            # 標題列：略過工作表開頭的空白列
+            header = []
+            for row in rows_iter:
+                header = _convert_row(row)
+                if header:
+                    break
+            if not header:
+                continue
+
+            buf, pending_blank, offset = [], [], 0
+            for row in rows_iter:
+                converted = _convert_row(row)
+                if not converted:
+                    pending_blank.append(converted)
+                    continue
+                if len(converted) > len(header):
+                    header = header + [""] * (len(converted) - len(header))
+                buf.extend(pending_blank)
+                pending_blank = []
+                buf.append(converted)
+                if len(buf) >= chunk_rows:
+                    yield ws.title, _to_frame(header, buf), offset
+                    offset += len(buf)
+                    buf = []
+            if buf:
+                yield ws.title, _to_frame(header, buf), offset
+    finally:
+        wb.close()
+
+
+def iter_sheet_records(file_like, chunk_rows: int = DEFAULT_CHUNK_ROWS, skip_sheet=should_skip_sheet):
+    """逐列產出 (sheet_name, row_index, row_dict)，row_dict 與 df.iterrows() 的 row.to_dict() 相同"""
+    for sheet, chunk, offset in iter_sheet_chunks(file_like, chunk_rows=chunk_rows, skip_sheet=skip_sheet):
+        for i, rec in enumerate(chunk.to_dict("records")):
+            yield sheet, offset + i, rec
+
+
+def estimate_data_rows(file_like, skip_sheet=should_skip_sheet) -> dict:
+    """由工作表 dimension 估計每張表的資料列數（不讀取儲存格，僅供進度條使用）"""
+    wb = openpyxl.load_workbook(file_like, read_only=True, data_only=True)
+    try:
+        out = {}
+        for ws in wb.worksheets:
+            if skip_sheet is not None and skip_sheet(ws.title):
+                continue
+            out[ws.title] = max(0, (ws.max_row or 1) - 1)
+        return out
+    finally:
+        wb.close()